@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from telemetry import count
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers.
+
+    An entry matches when the question embedding has cosine similarity of at
+    least `threshold` with a cached question of the same intent and document
+    scope. Entries are tagged with the corpus version they were generated
+    against; when the corpus changes the whole cache is dropped. Eviction is
+    LRU once `max_entries` is reached, and entries expire after `ttl_seconds`.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, vector, intent, version, scope=None):
+        """Return a cached answer for a near-duplicate question, or None."""
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            for key in [k for k, e in self._entries.items() if now - e["created"] > self.ttl_seconds]:
+                del self._entries[key]
+
+            candidates = [(k, e) for k, e in self._entries.items() if e["intent"] == intent and e["scope"] == scope]
+            if candidates:
+                scores = np.stack([e["vector"] for _, e in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    count("answer_cache.lookups", result="hit")
+                    return entry["answer"]
+            self.misses += 1
+            count("answer_cache.lookups", result="miss")
+            return None
+
+    def put(self, vector, intent, version, answer, scope=None):
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return  # generated against a corpus that has since changed
+            self._check_version(version)
+            self._entries[self._next_key] = {
+                "vector": self._normalize(vector),
+                "intent": intent,
+                "scope": scope,
+                "answer": answer,
+                "created": time.time(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+class DocumentSummaryCache:
+    """
+    Per-document summaries from the multi-document map step, keyed by source
+    and the corpus version at which that source last changed. LRU-bounded.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source, version):
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is None or entry[0] != version:
+                count("summary_cache.lookups", result="miss")
+                return None
+            self._entries.move_to_end(source)
+            count("summary_cache.lookups", result="hit")
+            return entry[1]
+
+    def put(self, source, version, value):
+        with self._lock:
+            self._entries[source] = (version, value)
+            self._entries.move_to_end(source)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def normalize_query(text):
+    """Question text with runs of whitespace collapsed, the key of the retrieval memos."""
+    return " ".join(text.split())
+
+
+class RetrievalCache:
+    """
+    LRU memos of the deterministic work done for every question before the
+    LLM call: the query embedding, keyed by the normalized question text, and
+    the retrieval plan (packed chunks and assembled prompt), keyed by the
+    normalized text, intent, k and document scope. Plans are tagged with the
+    corpus version they were built against and are all dropped when it
+    changes; query embeddings do not depend on the corpus and are kept.
+    """
+
+    def __init__(self, max_vectors=4096, max_plans=256):
+        self.max_vectors = max_vectors
+        self.max_plans = max_plans
+        self._vectors = OrderedDict()
+        self._plans = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get(entries, key, counter):
+        value = entries.get(key)
+        if value is None:
+            count(counter, result="miss")
+            return None
+        entries.move_to_end(key)
+        count(counter, result="hit")
+        return value
+
+    @staticmethod
+    def _put(entries, key, value, max_entries):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def get_vector(self, text):
+        with self._lock:
+            return self._get(self._vectors, normalize_query(text), "query_vector_cache.lookups")
+
+    def put_vector(self, text, vector):
+        with self._lock:
+            self._put(self._vectors, normalize_query(text), vector, self.max_vectors)
+
+    def get_plan(self, text, intent, k, scope, version):
+        """The memoized plan of a question against this corpus version, or None."""
+        with self._lock:
+            if version != self._version:
+                self._plans.clear()
+                self._version = version
+            return self._get(self._plans, (normalize_query(text), intent, k, scope), "retrieval_cache.lookups")
+
+    def put_plan(self, text, intent, k, scope, version, plan):
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return  # built against a corpus that has since changed
+            if version != self._version:
+                self._plans.clear()
+                self._version = version
+            self._put(self._plans, (normalize_query(text), intent, k, scope), plan, self.max_plans)
@@ -0,0 +1,153 @@
+import importlib.util
+import threading
+
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Prompt tokens available for retrieved passages, per intent.
+TOKEN_BUDGETS = {
+    "qa": 1500,
+    "metrics": 3000,
+    "summary": 3000,
+    "multi_doc_summary": 6000,
+    "document_map": 1500,
+}
+
+# Chunks retrieved per intent before reranking and packing.
+CANDIDATES = {
+    "qa": 20,
+    "metrics": 20,
+    "summary": 16,
+}
+
+# Two chunks of the same page overlapping by more than this fraction of the
+# shorter one are near-duplicates; only the better ranked one is kept.
+MAX_OVERLAP = 0.5
+
+
+def estimate_tokens(text):
+    """Rough token count for Gemini prompts: about 4 characters per token."""
+    return len(text) // 4 + 1
+
+
+class Reranker:
+    """
+    Local cross-encoder that rescores (question, passage) pairs on CPU in
+    batches. sentence-transformers (and torch) are imported and the model is
+    loaded on first use.
+    """
+
+    def __init__(self, model_name=RERANKER_MODEL, batch_size=32):
+        # Reranking is optional; fail early without paying for the import.
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise ImportError("sentence-transformers is required for reranking")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def warm_up(self):
+        """Load the model now rather than on the first question."""
+        self._get_model()
+
+    def rerank(self, question, docs):
+        """Return docs ordered by cross-encoder relevance to the question."""
+        if len(docs) < 2:
+            return list(docs)
+        scores = self._get_model().predict(
+            [(question, doc.page_content) for doc in docs],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+        order = sorted(range(len(docs)), key=lambda i: -float(scores[i]))
+        return [docs[i] for i in order]
+
+
+class ContextPacker:
+    """
+    Turns ranked retrieval candidates into the passages sent to the LLM:
+    optional reranking, removal of overlapping near-duplicate chunks, then
+    greedy packing into the token budget of the intent.
+    """
+
+    def __init__(self, budgets=None, reranker=None):
+        self.budgets = dict(TOKEN_BUDGETS, **(budgets or {}))
+        self.reranker = reranker
+
+    @staticmethod
+    def _span(doc):
+        start = doc.metadata.get("start_index")
+        if not isinstance(start, int):
+            return None
+        end = doc.metadata.get("end_index")
+        return start, end if isinstance(end, int) else start + len(doc.page_content)
+
+    def _drop_overlaps(self, docs):
+        """Keep the first of any chunks from the same text whose character ranges mostly overlap."""
+        kept = []
+        spans = {}
+        seen_texts = set()
+        for doc in docs:
+            if doc.page_content in seen_texts:
+                continue
+            # Chunks with an "end_index" carry offsets into the whole document, older ones into the page.
+            page = None if "end_index" in doc.metadata else doc.metadata.get("page")
+            key = (doc.metadata.get("source"), page)
+            span = self._span(doc)
+            if span is not None:
+                duplicate = False
+                for start, end in spans.get(key, ()):
+                    overlap = min(end, span[1]) - max(start, span[0])
+                    if overlap > MAX_OVERLAP * min(end - start, span[1] - span[0]):
+                        duplicate = True
+                        break
+                if duplicate:
+                    continue
+                spans.setdefault(key, []).append(span)
+            seen_texts.add(doc.page_content)
+            kept.append(doc)
+        return kept
+
+    def pack(self, question, docs, intent):
+        """
+        Select passages for `intent`, best first. Passages that do not fit the
+        remaining budget are skipped in favour of smaller lower-ranked ones. The
+        best passage is always kept. Multi-document intents round-robin across
+        sources so every document gets a share, and the result is grouped by source.
+        """
+        if not docs:
+            return []
+        if self.reranker is not None and intent not in ("multi_doc_summary", "document_map"):
+            docs = self.reranker.rerank(question, docs)
+        docs = self._drop_overlaps(docs)
+
+        grouped = intent == "multi_doc_summary"
+        if grouped:
+            by_source = {}
+            for doc in docs:
+                by_source.setdefault(doc.metadata.get("source"), []).append(doc)
+            docs = []
+            for rank in range(max(len(source_docs) for source_docs in by_source.values())):
+                for source_docs in by_source.values():
+                    if rank < len(source_docs):
+                        docs.append(source_docs[rank])
+
+        budget = self.budgets.get(intent, self.budgets["qa"])
+        selected = [docs[0]]
+        used = estimate_tokens(docs[0].page_content)
+        for doc in docs[1:]:
+            tokens = estimate_tokens(doc.page_content)
+            if used + tokens <= budget:
+                selected.append(doc)
+                used += tokens
+
+        if grouped:
+            order = {source: i for i, source in enumerate(by_source)}
+            selected.sort(key=lambda doc: order[doc.metadata.get("source")])
+        return selected
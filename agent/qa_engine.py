@@ -1,166 +1,576 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from .prompts import QA_PROMPT, DOCUMENT_SUMMARY_PROMPT, METRIC_EXTRACTION_PROMPT
-import os
-
-class QaEngine:
-    def __init__(self, vector_store):
-        self.vector_store = vector_store
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0,
-            convert_system_message_to_human=True
-        )
-    
-    def _get_clean_doc_name(self, source_path):
-        """Extract clean document name from full path, removing temp_ prefix."""
-        filename = os.path.basename(source_path)
-        if filename.startswith('temp_'):
-            filename = filename[5:]
-        return filename
-
-    def _detect_intent(self, question):
-        """Detect the type of query from user input."""
-        q_lower = question.lower().strip()
-        
-        multi_doc_keywords = ["both", "two docs", "two documents", "all docs", "all documents",
-                              "both files", "both pdfs", "what are the", "compare"]
-        if any(kw in q_lower for kw in multi_doc_keywords):
-            return "multi_doc_summary"
-        
-        summary_keywords = ["what is this about", "summary", "summarize", "overview", 
-                           "what's this", "explain this document", "what is this document"]
-        if any(kw in q_lower for kw in summary_keywords):
-            return "summary"
-        
-        comprehensive_keywords = ["all metrics", "extract metrics", "list all", "all results",
-                                 "all performance", "extract all", "show all metrics",
-                                 "give me all", "comprehensive metrics"]
-        if any(kw in q_lower for kw in comprehensive_keywords):
-            return "metrics"
-        
-        return "qa"
-
-    def _deduplicate_chunks(self, docs):
-        """Remove duplicate chunks from same page, but keep diversity across documents."""
-        seen = set()
-        unique_docs = []
-        doc_sources = {}
-        
-        for doc in docs:
-            source = doc.metadata.get('source', 'unknown')
-            page = doc.metadata.get('page', 0)
-            key = f"{source}_{page}"
-            
-            if source not in doc_sources:
-                doc_sources[source] = 0
-            
-            if key not in seen:
-                seen.add(key)
-                unique_docs.append(doc)
-                doc_sources[source] += 1
-        
-        return unique_docs, doc_sources
-
-    def answer_question(self, question):
-        """
-        Answer a question using RAG with Gemini LLM.
-        Includes intent detection and proper response synthesis.
-        """
-        if self.vector_store.vectorstore is None:
-            return "No documents loaded. Please upload PDF files first."
-        
-        intent = self._detect_intent(question)
-        
-        if intent == "multi_doc_summary":
-            docs = self._get_diverse_chunks(k_per_doc=5)
-        else:
-            k = 8 if intent == "summary" else 5
-            docs = self.vector_store.similarity_search(question, k=k)
-        
-        docs, doc_sources = self._deduplicate_chunks(docs)
-        
-        if not docs:
-            return "No relevant information found in the documents."
-        
-        if intent == "multi_doc_summary":
-            context_parts = []
-            current_source = None
-            for doc in docs:
-                source = doc.metadata.get('source', 'Unknown')
-                if source != current_source:
-                    clean_name = self._get_clean_doc_name(source)
-                    context_parts.append(f"\n--- Document: {clean_name} ---\n")
-                    current_source = source
-                context_parts.append(doc.page_content)
-            context = "\n\n".join(context_parts)
-        else:
-            context = "\n\n".join([doc.page_content for doc in docs])
-        
-        if intent == "multi_doc_summary":
-            prompt = f"""You are analyzing multiple documents. The user asked: "{question}"
-
-Based on the context below from different documents, provide a clear summary of EACH document separately.
-
-Format your answer like:
-**Document 1: [filename]**
-- Brief summary (2-3 sentences)
-
-**Document 2: [filename]**
-- Brief summary (2-3 sentences)
-
-Context from multiple documents:
-{context}
-
-Provide summaries for all unique documents found:"""
-        elif intent == "summary":
-            prompt = DOCUMENT_SUMMARY_PROMPT.format(context=context)
-        elif intent == "metrics":
-            prompt = METRIC_EXTRACTION_PROMPT.format(context=context)
-        else:
-            prompt = QA_PROMPT.format(context=context, question=question)
-        
-        try:
-            response = self.llm.invoke(prompt)
-            answer = response.content if hasattr(response, 'content') else str(response)
-            
-            sources = self._format_sources(docs)
-            doc_count = len(doc_sources)
-            return f"{answer}\n\n---\n**{doc_count} document(s) referenced:** {sources}"
-        except Exception as e:
-            return f"Error generating answer: {str(e)}. Please check your GOOGLE_API_KEY in .env file."
-    
-    def _get_diverse_chunks(self, k_per_doc=5):
-        """Get chunks from all documents in the vector store for comprehensive coverage."""
-        all_docs = self.vector_store.similarity_search("document overview summary", k=50)
-        
-        docs_by_source = {}
-        for doc in all_docs:
-            source = doc.metadata.get('source', 'unknown')
-            if source not in docs_by_source:
-                docs_by_source[source] = []
-            docs_by_source[source].append(doc)
-        
-        diverse_docs = []
-        for source, docs in docs_by_source.items():
-            diverse_docs.extend(docs[:k_per_doc])
-        
-        return diverse_docs
-    
-    def _format_sources(self, docs):
-        """Format source references showing all unique documents."""
-        source_refs = {}
-        for doc in docs:
-            source = doc.metadata.get('source', 'Unknown')
-            page = doc.metadata.get('page', 'N/A')
-            if source not in source_refs:
-                source_refs[source] = []
-            if page not in source_refs[source]:
-                source_refs[source].append(page)
-        
-        formatted = []
-        for source, pages in source_refs.items():
-            clean_name = self._get_clean_doc_name(source)
-            pages_str = ", ".join([str(p) for p in sorted(pages)[:3]])
-            formatted.append(f"{clean_name} (Pages: {pages_str})")
-        
+from .prompts import (QA_PROMPT, DOCUMENT_SUMMARY_PROMPT, METRIC_EXTRACTION_PROMPT,
+                      DOCUMENT_MAP_PROMPT, MULTI_DOC_REDUCE_PROMPT)
+from .answer_cache import DocumentSummaryCache, RetrievalCache
+from .context import ContextPacker, CANDIDATES, estimate_tokens
+from embeddings.vector_store import OVERVIEW_QUERY
+from telemetry import span, observe
+import asyncio
+import os
+import random
+
+# HTTP statuses of LLM errors worth retrying: rate limits and transient server failures.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (TimeoutError, ConnectionError)
+
+
+def _is_retryable(error):
+    """
+    Whether an LLM error is transient. google.api_core errors (ResourceExhausted,
+    ServiceUnavailable, ...) carry the HTTP status in `code`, HTTP clients in
+    `status_code`; LangChain may wrap them, so the cause chain is checked too.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        for attribute in ("code", "status_code"):
+            status = getattr(error, attribute, None)
+            if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+                return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class QaEngine:
+    def __init__(self, vector_store, answer_cache=None, summary_cache=None,
+                 multi_doc_mode="map_reduce", max_concurrency=4, context_packer=None, llm=None,
+                 retrieval_cache=None):
+        self.vector_store = vector_store
+        self.context_packer = context_packer if context_packer is not None else ContextPacker()
+        self.answer_cache = answer_cache
+        self.summary_cache = summary_cache if summary_cache is not None else DocumentSummaryCache()
+        self.retrieval_cache = retrieval_cache if retrieval_cache is not None else RetrievalCache()
+        self.multi_doc_mode = multi_doc_mode
+        self.max_concurrency = max_concurrency
+        # Any chat model with invoke/ainvoke/stream, e.g. an offline stub in tests.
+        self._llm = llm
+
+    @property
+    def llm(self):
+        """The chat model; the Gemini client is imported and created on first use, as it is slow to import."""
+        if self._llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            self._llm = ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash",
+                temperature=0,
+                convert_system_message_to_human=True
+            )
+        return self._llm
+    
+    def _get_clean_doc_name(self, source_path):
+        """Extract clean document name from full path, removing temp_ prefix."""
+        filename = os.path.basename(source_path)
+        if filename.startswith('temp_'):
+            filename = filename[5:]
+        return filename
+
+    def _detect_intent(self, question):
+        """Detect the type of query from user input."""
+        q_lower = question.lower().strip()
+        
+        multi_doc_keywords = ["both", "two docs", "two documents", "all docs", "all documents",
+                              "both files", "both pdfs", "what are the", "compare"]
+        if any(kw in q_lower for kw in multi_doc_keywords):
+            return "multi_doc_summary"
+        
+        summary_keywords = ["what is this about", "summary", "summarize", "overview", 
+                           "what's this", "explain this document", "what is this document"]
+        if any(kw in q_lower for kw in summary_keywords):
+            return "summary"
+        
+        comprehensive_keywords = ["all metrics", "extract metrics", "list all", "all results",
+                                 "all performance", "extract all", "show all metrics",
+                                 "give me all", "comprehensive metrics"]
+        if any(kw in q_lower for kw in comprehensive_keywords):
+            return "metrics"
+        
+        return "qa"
+
+    def _count_sources(self, docs):
+        """Number of context chunks taken from each document."""
+        doc_sources = {}
+        for doc in docs:
+            source = doc.metadata.get('source', 'unknown')
+            doc_sources[source] = doc_sources.get(source, 0) + 1
+        return doc_sources
+
+    def _prepare(self, question, sources=None):
+        """
+        Run intent detection, cache lookup, retrieval and prompt assembly.
+        Returns (answer, plan): a ready answer when no LLM call is needed,
+        otherwise None and the plan that _finish_answer completes.
+        """
+        if self.vector_store.is_empty():
+            return "No documents loaded. Please upload PDF files first.", None
+        
+        intent = self._detect_intent(question)
+        question_vector = self._embed_question(question)
+        corpus_version = self.vector_store.version
+        scope = tuple(sorted(sources)) if sources is not None else None
+
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(question_vector, intent, corpus_version, scope)
+            if cached is not None:
+                return cached, None
+
+        memo = self._memoized_plan(question, intent, scope, corpus_version)
+        if memo is None:
+            memo = self._build_plan(question, intent, question_vector, corpus_version, sources, scope)
+        return self._plan_result(memo, intent, question_vector, corpus_version, scope)
+
+    def _embed_question(self, question):
+        """Query embedding, memoized by normalized question text."""
+        vector = self.retrieval_cache.get_vector(question) if self.retrieval_cache is not None else None
+        if vector is None:
+            with span("qa.embed_query"):
+                vector = self.vector_store.embedder.embed_query(question)
+            if self.retrieval_cache is not None:
+                self.retrieval_cache.put_vector(question, vector)
+        return vector
+
+    def _memoized_plan(self, question, intent, scope, corpus_version):
+        if self.retrieval_cache is None:
+            return None
+        return self.retrieval_cache.get_plan(question, intent, CANDIDATES.get(intent), scope, corpus_version)
+
+    def _maps_documents(self, intent):
+        """Whether this intent's plan needs the map step (LLM calls) of a map-reduce summary."""
+        return intent == "multi_doc_summary" and self.multi_doc_mode == "map_reduce"
+
+    def _build_plan(self, question, intent, question_vector, corpus_version, sources, scope, retrieved=None,
+                    mapped=None):
+        """
+        Retrieval, context packing and prompt assembly for a question that missed
+        the answer cache. `retrieved` is the candidate list when the caller has
+        already searched (answer_batch does, for many questions at once), and
+        `mapped` the (summaries, docs) of the map step when the caller ran it on
+        its own event loop. Returns (prompt, docs, doc_sources), with no prompt
+        when nothing relevant was found, and memoizes it for this corpus version.
+        """
+        if self._maps_documents(intent):
+            summaries, docs = mapped if mapped is not None else asyncio.run(
+                self._amap_documents(sources, k_per_doc=5)
+            )
+            doc_sources = self._count_sources(docs)
+            prompt = MULTI_DOC_REDUCE_PROMPT.format(
+                question=question, summaries="\n\n".join(summaries)
+            ) if summaries else None
+        else:
+            if retrieved is not None:
+                docs = retrieved
+            else:
+                with span("qa.retrieve", intent=intent) as retrieve_span:
+                    if intent == "multi_doc_summary":
+                        docs = self._get_diverse_chunks(k_per_doc=5, sources=sources)
+                    elif intent == "summary":
+                        docs = [doc for doc, _ in self.vector_store.similarity_search_with_score_by_vector(
+                            question_vector, k=CANDIDATES[intent], sources=sources
+                        )]
+                    else:
+                        # Exact tokens (metric names, numbers, dataset names) need the keyword index too.
+                        docs = [doc for doc, _ in self.vector_store.hybrid_search_by_vector(
+                            question, question_vector, k=CANDIDATES[intent], sources=sources
+                        )]
+                    retrieve_span.set(candidates=len(docs))
+            
+            with span("qa.pack", candidates=len(docs)) as pack_span:
+                docs = self.context_packer.pack(question, docs, intent)
+                pack_span.set(chunks=len(docs))
+            doc_sources = self._count_sources(docs)
+            
+            prompt = None
+            if docs:
+                with span("qa.prompt"):
+                    prompt = self._build_prompt(intent, question, docs)
+
+        memo = (prompt, docs, doc_sources)
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.put_plan(question, intent, CANDIDATES.get(intent), scope, corpus_version, memo)
+        return memo
+
+    @staticmethod
+    def _plan_result(memo, intent, question_vector, corpus_version, scope):
+        """(answer, plan) as returned by _prepare, from a built or memoized plan."""
+        prompt, docs, doc_sources = memo
+        if prompt is None:
+            return "No relevant information found in the documents.", None
+        return None, {
+            "prompt": prompt,
+            "docs": docs,
+            "doc_sources": doc_sources,
+            "intent": intent,
+            "vector": question_vector,
+            "version": corpus_version,
+            "scope": scope,
+        }
+
+    def _build_prompt(self, intent, question, docs):
+        """Assemble the context and the intent-specific prompt."""
+        if intent == "multi_doc_summary":
+            context_parts = []
+            current_source = None
+            for doc in docs:
+                source = doc.metadata.get('source', 'Unknown')
+                if source != current_source:
+                    clean_name = self._get_clean_doc_name(source)
+                    context_parts.append(f"\n--- Document: {clean_name} ---\n")
+                    current_source = source
+                context_parts.append(doc.page_content)
+            context = "\n\n".join(context_parts)
+        else:
+            context = "\n\n".join([doc.page_content for doc in docs])
+        
+        if intent == "multi_doc_summary":
+            prompt = f"""You are analyzing multiple documents. The user asked: "{question}"
+
+Based on the context below from different documents, provide a clear summary of EACH document separately.
+
+Format your answer like:
+**Document 1: [filename]**
+- Brief summary (2-3 sentences)
+
+**Document 2: [filename]**
+- Brief summary (2-3 sentences)
+
+Context from multiple documents:
+{context}
+
+Provide summaries for all unique documents found:"""
+        elif intent == "summary":
+            prompt = DOCUMENT_SUMMARY_PROMPT.format(context=context)
+        elif intent == "metrics":
+            prompt = METRIC_EXTRACTION_PROMPT.format(context=context)
+        else:
+            prompt = QA_PROMPT.format(context=context, question=question)
+        return prompt
+
+    def _finish_answer(self, plan, answer):
+        """Append the sources footer and store the result in the answer cache."""
+        source_refs = self._format_sources(plan["docs"])
+        doc_count = len(plan["doc_sources"])
+        footer = f"\n\n---\n**{doc_count} document(s) referenced:** {source_refs}"
+        if self.answer_cache is not None:
+            self.answer_cache.put(plan["vector"], plan["intent"], plan["version"], answer + footer, plan["scope"])
+        return footer
+
+    @staticmethod
+    def _message_text(message):
+        """Text of a chat model message or chunk, whose content may be a list of parts."""
+        content = message.content if hasattr(message, 'content') else message
+        if isinstance(content, list):
+            return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+        return str(content)
+
+    def answer_question(self, question, sources=None):
+        """
+        Answer a question using RAG with Gemini LLM.
+        Includes intent detection and proper response synthesis.
+        `sources` limits retrieval to a set of documents (None searches all).
+        Answers to near-duplicate questions are served from the answer cache.
+        """
+        with span("qa.answer"):
+            try:
+                # The map step of a map-reduce summary already calls the LLM.
+                answer, plan = self._prepare(question, sources)
+                if plan is None:
+                    return answer
+
+                with span("llm.invoke") as llm_span:
+                    response = self.llm.invoke(plan["prompt"])
+                    answer = self._message_text(response)
+                    self._record_usage(llm_span, plan["prompt"], response, answer)
+                return answer + self._finish_answer(plan, answer)
+            except Exception as e:
+                return f"Error generating answer: {str(e)}. Please check your GOOGLE_API_KEY in .env file."
+
+    def answer_question_stream(self, question, sources=None):
+        """
+        Streaming variant of answer_question: yields answer text as the chat model
+        produces it, then the sources footer.
+        """
+        with span("qa.answer", stream=True):
+            parts = []
+            try:
+                answer, plan = self._prepare(question, sources)
+                if plan is None:
+                    yield answer
+                    return
+
+                with span("llm.stream") as llm_span:
+                    last = None
+                    for chunk in self.llm.stream(plan["prompt"]):
+                        # Usage metadata, when the model reports it, arrives on the final chunk.
+                        if getattr(chunk, "usage_metadata", None):
+                            last = chunk
+                        text = self._message_text(chunk)
+                        if text:
+                            parts.append(text)
+                            yield text
+                    self._record_usage(llm_span, plan["prompt"], last, "".join(parts))
+            except Exception as e:
+                yield f"Error generating answer: {str(e)}. Please check your GOOGLE_API_KEY in .env file."
+                return
+            yield self._finish_answer(plan, "".join(parts))
+    
+    async def aanswer_question(self, question, sources=None):
+        """
+        Async variant of answer_question, for callers that already run an event loop.
+        """
+        with span("qa.answer", mode="async"):
+            try:
+                answer, plan = await asyncio.to_thread(self._prepare, question, sources)
+                if plan is None:
+                    return answer
+
+                answer = await self._ainvoke_with_backoff(plan["prompt"])
+                return answer + self._finish_answer(plan, answer)
+            except Exception as e:
+                return f"Error generating answer: {str(e)}. Please check your GOOGLE_API_KEY in .env file."
+
+    def answer_batch(self, items):
+        """
+        Answer many questions against the loaded corpus; see aanswer_batch.
+        """
+        return asyncio.run(self.aanswer_batch(items))
+
+    async def aanswer_batch(self, items):
+        """
+        Batch variant of answer_question for offline runs. `items` are question
+        strings or dicts with a "question" and optional "sources" (plus any other
+        fields, which are passed through). Repeated (question, sources) pairs are
+        answered once, all questions are embedded in one call, questions with the
+        same intent and scope share one batched search, and the LLM calls run
+        concurrently (at most max_concurrency in flight) with retry and backoff.
+
+        Returns one dict per item, in order: the item's fields plus "answer" (as
+        answer_question would return it), "intent", "references" ([{"source",
+        "pages"}], None when the answer came from the answer cache) and "error".
+        """
+        items = [item if isinstance(item, dict) else {"question": item} for item in items]
+        keys = [
+            (item["question"], tuple(sorted(item["sources"])) if item.get("sources") is not None else None)
+            for item in items
+        ]
+        unique = list(dict.fromkeys(keys))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def complete(key, prepared):
+            answer, plan = prepared
+            if plan is not None and plan.get("map"):
+                # Map step on this loop, its LLM calls sharing the batch's concurrency limit.
+                mapped = await self._amap_documents(plan["scope"], k_per_doc=5, semaphore=semaphore)
+                memo = await asyncio.to_thread(
+                    self._build_plan, key[0], plan["intent"], plan["vector"], plan["version"],
+                    plan["scope"], plan["scope"], None, mapped
+                )
+                answer, plan = self._plan_result(memo, plan["intent"], plan["vector"], plan["version"], plan["scope"])
+            if plan is None:
+                return {"answer": answer, "references": None}
+            async with semaphore:
+                text = await self._ainvoke_with_backoff(plan["prompt"])
+            return {"answer": text + self._finish_answer(plan, text), "references": self._source_pages(plan["docs"])}
+
+        with span("qa.batch", questions=len(items), unique=len(unique)):
+            prepared = await asyncio.to_thread(self._prepare_batch, unique)
+            results = await asyncio.gather(
+                *(complete(key, prepared[key]) for key in unique if not isinstance(prepared[key], Exception)),
+                return_exceptions=True
+            )
+        by_key = {}
+        completed = iter(results)
+        for key in unique:
+            result = prepared[key] if isinstance(prepared[key], Exception) else next(completed)
+            if isinstance(result, Exception):
+                result = {"answer": None, "references": None, "error": str(result)}
+            by_key[key] = {"intent": self._detect_intent(key[0]), "error": None, **result}
+        return [{**item, **by_key[key]} for item, key in zip(items, keys)]
+
+    def _prepare_batch(self, keys):
+        """
+        _prepare for many (question, scope) pairs: one embedding call for every
+        question not embedded before, then one batched search per (intent, scope)
+        group of cache misses. Returns {key: (answer, plan) or the exception it
+        raised}. Map-reduce summaries are left to the caller's event loop: their
+        plan only has "map" set, with the question's intent, vector, version and
+        scope.
+        """
+        if self.vector_store.is_empty():
+            return {key: ("No documents loaded. Please upload PDF files first.", None) for key in keys}
+
+        questions = list(dict.fromkeys(question for question, _ in keys))
+        vectors = {}
+        if self.retrieval_cache is not None:
+            for question in questions:
+                vector = self.retrieval_cache.get_vector(question)
+                if vector is not None:
+                    vectors[question] = vector
+        new_questions = [question for question in questions if question not in vectors]
+        if new_questions:
+            embedder = self.vector_store.embedder
+            with span("qa.embed_query", questions=len(new_questions)):
+                # Not embed_documents: a CachedEmbeddings would store the questions with the chunks.
+                if hasattr(embedder, "embed_queries"):
+                    embedded = embedder.embed_queries(new_questions)
+                else:
+                    embedded = [embedder.embed_query(question) for question in new_questions]
+            for question, vector in zip(new_questions, embedded):
+                vectors[question] = vector
+                if self.retrieval_cache is not None:
+                    self.retrieval_cache.put_vector(question, vector)
+        corpus_version = self.vector_store.version
+
+        prepared, groups = {}, {}
+        for key in keys:
+            question, scope = key
+            intent = self._detect_intent(question)
+            if self.answer_cache is not None:
+                cached = self.answer_cache.get(vectors[question], intent, corpus_version, scope)
+                if cached is not None:
+                    prepared[key] = (cached, None)
+                    continue
+            memo = self._memoized_plan(question, intent, scope, corpus_version)
+            if memo is not None:
+                prepared[key] = self._plan_result(memo, intent, vectors[question], corpus_version, scope)
+                continue
+            if self._maps_documents(intent):
+                prepared[key] = (None, {
+                    "map": True, "intent": intent, "vector": vectors[question],
+                    "version": corpus_version, "scope": scope,
+                })
+                continue
+            groups.setdefault((intent, scope), []).append(key)
+
+        retrieved = {}
+        for (intent, scope), group in groups.items():
+            if intent == "multi_doc_summary":
+                continue
+            group_questions = [question for question, _ in group]
+            group_vectors = [vectors[question] for question in group_questions]
+            with span("qa.retrieve", intent=intent, questions=len(group)):
+                if intent == "summary":
+                    results = self.vector_store.similarity_search_with_score_by_vectors(
+                        group_vectors, k=CANDIDATES[intent], sources=scope
+                    )
+                else:
+                    results = self.vector_store.hybrid_search_by_vectors(
+                        group_questions, group_vectors, k=CANDIDATES[intent], sources=scope
+                    )
+            for key, hits in zip(group, results):
+                retrieved[key] = [doc for doc, _ in hits]
+
+        for (intent, scope), group in groups.items():
+            for key in group:
+                question = key[0]
+                try:
+                    memo = self._build_plan(
+                        question, intent, vectors[question], corpus_version, scope, scope, retrieved.get(key)
+                    )
+                    prepared[key] = self._plan_result(memo, intent, vectors[question], corpus_version, scope)
+                except Exception as e:
+                    prepared[key] = e
+        return prepared
+
+    @staticmethod
+    def _record_usage(llm_span, prompt, response, answer):
+        """Token counts of one LLM call, from the model's usage metadata or estimated."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        prompt_tokens = usage.get("input_tokens") or estimate_tokens(prompt)
+        response_tokens = usage.get("output_tokens") or estimate_tokens(answer)
+        llm_span.set(prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        observe("llm.prompt_tokens", prompt_tokens)
+        observe("llm.response_tokens", response_tokens)
+
+    async def _ainvoke_with_backoff(self, prompt, max_retries=4):
+        """
+        Call the LLM, backing off exponentially (with jitter) on rate-limit and
+        transient server errors.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                with span("llm.ainvoke", attempt=attempt) as llm_span:
+                    response = await self.llm.ainvoke(prompt)
+                    answer = self._message_text(response)
+                    self._record_usage(llm_span, prompt, response, answer)
+                return answer
+            except Exception as e:
+                if not _is_retryable(e) or attempt == max_retries:
+                    raise
+                await asyncio.sleep(2 ** attempt + random.random())
+
+    async def _amap_documents(self, sources=None, k_per_doc=5, semaphore=None):
+        """
+        Map step of the multi-document summary: summarize every document with
+        concurrent LLM calls (at most max_concurrency in flight, or as many as
+        a caller's `semaphore` allows). Summaries are cached until the document
+        changes. Returns (summaries, docs used).
+        """
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        sources = sources if sources is not None else self.vector_store.sources()
+        versions = {source: self.vector_store.source_version(source) for source in sources}
+        stale = [source for source in sources if self.summary_cache.get(source, versions[source]) is None]
+        chunks_by_source = await asyncio.to_thread(
+            self.vector_store.overview_chunks, k_per_doc, stale
+        ) if stale else {}
+
+        async def summarize(source):
+            version = versions[source]
+            cached = self.summary_cache.get(source, version)
+            if cached is not None:
+                return cached
+
+            docs = self.context_packer.pack(OVERVIEW_QUERY, chunks_by_source.get(source, []), "document_map")
+            if not docs:
+                return None
+            clean_name = self._get_clean_doc_name(source)
+            prompt = DOCUMENT_MAP_PROMPT.format(
+                document=clean_name,
+                context="\n\n".join(doc.page_content for doc in docs)
+            )
+            async with semaphore:
+                summary = await self._ainvoke_with_backoff(prompt)
+            result = (f"--- Document: {clean_name} ---\n{summary}", docs)
+            self.summary_cache.put(source, version, result)
+            return result
+
+        results = await asyncio.gather(*(summarize(source) for source in sources))
+        summaries, docs = [], []
+        for result in results:
+            if result is not None:
+                summaries.append(result[0])
+                docs.extend(result[1])
+        return summaries, docs
+    
+    def _get_diverse_chunks(self, k_per_doc=5, sources=None):
+        """Get chunks from all documents in the vector store for comprehensive coverage."""
+        # Picked when each document was added; this only reads them.
+        chunks_by_source = self.vector_store.overview_chunks(k_per_doc=k_per_doc, sources=sources)
+        
+        diverse_docs = []
+        for docs in chunks_by_source.values():
+            diverse_docs.extend(docs)
+        
+        return diverse_docs
+    
+    def _source_pages(self, docs):
+        """[{"source", "pages"}] of the unique documents and pages in docs, in order."""
+        source_refs = {}
+        for doc in docs:
+            source = doc.metadata.get('source', 'Unknown')
+            page = doc.metadata.get('page', 'N/A')
+            if source not in source_refs:
+                source_refs[source] = []
+            if page not in source_refs[source]:
+                source_refs[source].append(page)
+        return [{"source": source, "pages": pages} for source, pages in source_refs.items()]
+
+    def _format_sources(self, docs):
+        """Format source references showing all unique documents."""
+        formatted = []
+        for ref in self._source_pages(docs):
+            source, pages = ref["source"], ref["pages"]
+            clean_name = self._get_clean_doc_name(source)
+            pages_str = ", ".join([str(p) for p in sorted(pages)[:3]])
+            formatted.append(f"{clean_name} (Pages: {pages_str})")
+        
         return "; ".join(formatted)
\ No newline at end of file
@@ -1,190 +1,440 @@
-import streamlit as st
-from dotenv import load_dotenv
-load_dotenv()
-
-from ingest.pdf_loader import load_pdf
-from ingest.chunker import chunk_documents
-from embeddings.embedder import get_embedder
-from embeddings.vector_store import VectorStore
-from agent.qa_engine import QaEngine
-from tools.arxiv_tool import search_arxiv, download_pdf
-import os
-import time
-
-st.set_page_config(
-    page_title="DOC Agent",
-    page_icon="📄",
-    layout="wide"
-)
-
-try:
-    if 'vector_store' not in st.session_state:
-        embedder = get_embedder()
-        st.session_state.vector_store = VectorStore(embedder)
-
-    if 'qa_engine' not in st.session_state:
-        st.session_state.qa_engine = QaEngine(st.session_state.vector_store)
-    
-    if 'initialized' not in st.session_state:
-        st.session_state.initialized = True
-    
-    if 'last_arxiv_search' not in st.session_state:
-        st.session_state.last_arxiv_search = 0
-        
-except Exception as e:
-    st.error(f"Initialization failed: {str(e)}")
-    st.info("Make sure you have set up your .env file with GOOGLE_API_KEY")
-    st.stop()
-
-st.title("Document Q&A AI Agent")
-
-uploaded_files = st.file_uploader("Upload PDF files", type="pdf", accept_multiple_files=True)
-if uploaded_files:
-    success_count = 0
-    failed_files = []
-    
-    for uploaded_file in uploaded_files:
-        with st.spinner(f"Processing {uploaded_file.name}..."):
-            temp_path = os.path.join(os.getcwd(), f"temp_{uploaded_file.name}")
-            try:
-                file_size = len(uploaded_file.getvalue())
-                if file_size > 50 * 1024 * 1024:
-                    failed_files.append((uploaded_file.name, "File too large (max 50MB)"))
-                    continue
-                
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getvalue())
-                
-                docs = load_pdf(temp_path)
-                if not docs:
-                    failed_files.append((uploaded_file.name, "No text content extracted"))
-                    continue
-                
-                chunks = chunk_documents(docs)
-                if not chunks:
-                    failed_files.append((uploaded_file.name, "Failed to create chunks"))
-                    continue
-                
-                st.session_state.vector_store.add_documents(chunks)
-                success_count += 1
-                
-            except Exception as e:
-                failed_files.append((uploaded_file.name, str(e)))
-            finally:
-                try:
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-                except:
-                    pass
-    
-    if success_count > 0:
-        st.success(f"{success_count} document(s) processed successfully!")
-    if failed_files:
-        with st.expander("Failed files", expanded=True):
-            for filename, error in failed_files:
-                st.error(f"**{filename}**: {error}")
-
-st.header("Search ArXiv")
-
-cooldown_seconds = 15
-time_since_last = time.time() - st.session_state.last_arxiv_search
-remaining_cooldown = max(0, cooldown_seconds - time_since_last)
-
-if remaining_cooldown > 0:
-    st.warning(f"Cooldown active: Wait {int(remaining_cooldown)} seconds before next search to avoid rate limits.")
-
-arxiv_query = st.text_input("Enter search query for ArXiv")
-
-col1, col2 = st.columns([1, 1])
-
-with col1:
-    if st.button("Search and Add"):
-        if arxiv_query:
-            time_since_last = time.time() - st.session_state.last_arxiv_search
-            if time_since_last < cooldown_seconds:
-                remaining = int(cooldown_seconds - time_since_last)
-                st.error(f" Please wait {remaining} more seconds. This prevents rate limiting!")
-            else:
-                st.session_state.last_arxiv_search = time.time()
-                
-                with st.spinner("Searching ArXiv (this may take 10+ seconds due to rate limiting)..."):
-                    results, error = search_arxiv(arxiv_query, max_results=3)
-                    
-                    if error:
-                        st.error(error)
-                    elif results:
-                        result_titles = [f"{i+1}. {r.title} ({r.published.year})" for i, r in enumerate(results)]
-                        selected_idx = 0
-                        
-                        if len(results) > 1:
-                            st.write(f"Found {len(results)} papers:")
-                            for i, r in enumerate(results):
-                                st.write(f"{i+1}. **{r.title}** ({r.published.year})")
-                                st.caption(f"ArXiv ID: {r.get_short_id()} | PDF: {r.pdf_url}")
-                            st.info("Adding the first result. Future version will allow selection.")
-                        
-                        result = results[selected_idx]
-                        
-                        with st.spinner(f"Downloading: {result.title}..."):
-                            pdf_path, dl_error = download_pdf(result)
-                            
-                            if dl_error:
-                                st.error(dl_error)
-                            elif pdf_path:
-                                try:
-                                    with st.spinner("Processing paper..."):
-                                        docs = load_pdf(pdf_path)
-                                        chunks = chunk_documents(docs)
-                                        st.session_state.vector_store.add_documents(chunks)
-                                    st.success(f"Paper '{result.title}' added successfully!")
-                                except Exception as e:
-                                    st.error(f"Failed to process PDF: {str(e)}")
-                                finally:
-                                    if os.path.exists(pdf_path):
-                                        os.remove(pdf_path)
-        else:
-            st.warning("Please enter a search query.")
-
-with col2:
-    st.markdown("**Alternative: Add by URL**")
-    pdf_url_input = st.text_input("ArXiv PDF URL (e.g., https://arxiv.org/pdf/2401.12345.pdf)", key="pdf_url")
-    if st.button("Add PDF from URL"):
-        if pdf_url_input:
-            from tools.arxiv_tool import download_pdf_from_url
-            with st.spinner("Downloading from URL..."):
-                pdf_path, error = download_pdf_from_url(pdf_url_input)
-                
-                if error:
-                    st.error(error)
-                elif pdf_path:
-                    try:
-                        with st.spinner("Processing paper..."):
-                            docs = load_pdf(pdf_path)
-                            chunks = chunk_documents(docs)
-                            st.session_state.vector_store.add_documents(chunks)
-                        st.success(f"PDF added successfully!")
-                    except Exception as e:
-                        st.error(f"Failed to process PDF: {str(e)}")
-                    finally:
-                        if os.path.exists(pdf_path):
-                            os.remove(pdf_path)
-        else:
-            st.warning("Please enter a PDF URL.")
-
-st.header("Ask a Question")
-question = st.text_input("Enter your question")
-if st.button("Ask"):
-    if question:
-        if st.session_state.vector_store.vectorstore is None:
-            st.warning("No documents loaded. Please upload PDF files or add papers from ArXiv first.")
-        else:
-            try:
-                with st.spinner("Thinking..."):
-                    answer = st.session_state.qa_engine.answer_question(question)
-                st.markdown("**Answer:**")
-                st.markdown(answer)
-            except Exception as e:
-                st.error(f"Failed to generate answer: {str(e)}")
-                st.info("Tip: Make sure your GOOGLE_API_KEY is correctly set in the .env file.")
-    else:
+import streamlit as st
+from dotenv import load_dotenv
+load_dotenv()
+
+# Only light modules here; the model, FAISS and the LLM client are imported by
+# the warm-up thread (see load_resources) so the first paint does not wait.
+from ingest.chunker import CHUNK_SIZE, CHUNK_OVERLAP
+from ingest.ledger import IngestionLedger
+from ingest.jobs import ACTIVE as ACTIVE_JOB_STATES, RETRYABLE as RETRYABLE_JOB_STATES
+from embeddings.embedder import MODEL_NAME, BATCH_SIZE
+from agent.answer_cache import AnswerCache, DocumentSummaryCache, RetrievalCache
+from tools.arxiv_tool import search_arxiv, get_fetch_cache, API_LIMITER
+import telemetry
+import itertools
+import os
+import threading
+import time
+
+INDEX_DIR = os.getenv("INDEX_DIR", "data/index")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+INDEX_VECTOR_DTYPE = os.getenv("INDEX_VECTOR_DTYPE", "float16")
+INDEX_COMPACT_RATIO = float(os.getenv("INDEX_COMPACT_RATIO", "0.2"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", MODEL_NAME)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", str(BATCH_SIZE)))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "256"))
+MULTI_DOC_MODE = os.getenv("MULTI_DOC_MODE", "map_reduce")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+ARXIV_MAX_RESULTS = int(os.getenv("ARXIV_MAX_RESULTS", "10"))
+ARXIV_DELAY_SECONDS = float(os.getenv("ARXIV_DELAY_SECONDS", "3"))
+ARXIV_CACHE_DIR = os.getenv("ARXIV_CACHE_DIR", "data/arxiv_cache")
+ARXIV_CACHE_MAX_MB = int(os.getenv("ARXIV_CACHE_MAX_MB", "2048"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_JOB_BATCH_SIZE = int(os.getenv("INGEST_JOB_BATCH_SIZE", "8"))
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+TELEMETRY_LOG = os.getenv("TELEMETRY_LOG", "")
+TELEMETRY_PROMETHEUS_PORT = int(os.getenv("TELEMETRY_PROMETHEUS_PORT", "0"))
+TELEMETRY_PROMETHEUS_HOST = os.getenv("TELEMETRY_PROMETHEUS_HOST", "127.0.0.1")
+# e.g. "qa=1500,metrics=3000"; intents not listed keep their defaults
+CONTEXT_TOKEN_BUDGETS = {
+    intent.strip(): int(tokens)
+    for intent, tokens in (
+        item.split("=") for item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",") if item.strip()
+    )
+}
+
+INGEST_SETTINGS = {
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "embedder": EMBEDDING_MODEL,
+    "embedding_backend": EMBEDDING_BACKEND,
+}
+
+st.set_page_config(
+    page_title="DOC Agent",
+    page_icon="📄",
+    layout="wide"
+)
+
+@st.cache_resource
+def configure_telemetry():
+    """Span log and /metrics endpoint, set up once per process."""
+    telemetry.configure(log_path=TELEMETRY_LOG or None, prometheus_port=TELEMETRY_PROMETHEUS_PORT or None,
+                        prometheus_host=TELEMETRY_PROMETHEUS_HOST)
+
+
+def show_spans(spans):
+    """Span trees as an indented table of durations and attributes."""
+    rows = []
+    for root in spans:
+        for depth, node in root.flatten():
+            rows.append({
+                "span": "\u2003" * depth + node.name,
+                "ms": round(node.seconds * 1000, 1),
+                "details": ", ".join(f"{key}={value}" for key, value in node.attributes.items()),
+            })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+
+def hit_rate(name):
+    """"hits/lookups (rate)" of a cache lookup counter."""
+    hits = telemetry.counter_value(name, result="hit")
+    total = hits + telemetry.counter_value(name, result="miss")
+    return f"{hits}/{total}" + (f" ({hits / total:.0%})" if total else "")
+
+
+class Warmup:
+    """
+    Runs `load` once on a background thread, so the page renders while the
+    embedding model and the index load. `ready()` tells whether it finished;
+    `result()` waits for it and re-raises its error.
+    """
+
+    def __init__(self, load):
+        self.started = time.time()
+        self.seconds = None
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        threading.Thread(target=self._run, args=(load,), name="warmup", daemon=True).start()
+
+    def _run(self, load):
+        started = time.perf_counter()
+        try:
+            self._result = load()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.seconds = time.perf_counter() - started
+            self._done.set()
+
+    def ready(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        self._done.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def load_fetch_cache():
+    """Cache of downloaded PDFs and ArXiv searches, shared by every session (None when disabled)."""
+    API_LIMITER.set_interval(ARXIV_DELAY_SECONDS)
+    if not ARXIV_CACHE_DIR:
+        return None
+    return get_fetch_cache(ARXIV_CACHE_DIR, max_bytes=ARXIV_CACHE_MAX_MB * 1024 * 1024)
+
+
+def load_resources():
+    """
+    Everything that needs the embedding model or the index, shared by every
+    session: vector store, ledger, ingestion queue, caches and context packer.
+    Runs on the warm-up thread, which is also where the heavy modules (torch,
+    FAISS, the Gemini client) are first imported.
+    """
+    with telemetry.span("app.warmup"):
+        from embeddings.embedder import get_embedder
+        from embeddings.vector_store import VectorStore
+        from ingest.jobs import IngestionJobQueue
+        from agent.context import ContextPacker, Reranker
+        from agent.qa_engine import QaEngine  # noqa: F401  (loaded here for the sessions)
+
+        with telemetry.span("app.load_embedder", backend=EMBEDDING_BACKEND):
+            embedder = get_embedder(
+                EMBEDDING_MODEL,
+                backend=EMBEDDING_BACKEND,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                cache_path=EMBEDDING_CACHE_PATH or None,
+                cache_max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            embedder.warm_up()
+        with telemetry.span("app.load_index") as index_span:
+            vector_store = VectorStore(
+                embedder,
+                index_dir=INDEX_DIR or None,
+                index_type=INDEX_TYPE,
+                nprobe=INDEX_NPROBE,
+                ef_search=INDEX_EF_SEARCH,
+                vector_dtype=INDEX_VECTOR_DTYPE,
+                compact_ratio=INDEX_COMPACT_RATIO
+            )
+            index_span.set(chunks=len(vector_store))
+        ledger = IngestionLedger(os.path.join(INDEX_DIR, "ledger.sqlite") if INDEX_DIR else None)
+
+        reranker = None
+        if RERANKER_MODEL:
+            with telemetry.span("app.load_reranker"):
+                reranker = Reranker(RERANKER_MODEL)
+                reranker.warm_up()
+
+        resources = {
+            "vector_store": vector_store,
+            "ledger": ledger,
+            "answer_cache": AnswerCache(
+                threshold=ANSWER_CACHE_THRESHOLD,
+                max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=ANSWER_CACHE_TTL_SECONDS
+            ),
+            "summary_cache": DocumentSummaryCache(),
+            "retrieval_cache": RetrievalCache(max_plans=RETRIEVAL_CACHE_MAX_ENTRIES),
+            "context_packer": ContextPacker(budgets=CONTEXT_TOKEN_BUDGETS, reranker=reranker),
+        }
+        fetch_cache = load_fetch_cache()
+        # Started last: its workers write to the index, and a failed warm-up is
+        # run again from scratch, so nothing may raise after this.
+        # Jobs are kept next to the index.
+        resources["job_queue"] = IngestionJobQueue(
+            vector_store,
+            ledger,
+            path=os.path.join(INDEX_DIR, "jobs.sqlite") if INDEX_DIR else None,
+            spool_dir=os.path.join(INDEX_DIR, "spool") if INDEX_DIR else None,
+            workers=INGEST_WORKERS,
+            batch_size=INGEST_JOB_BATCH_SIZE,
+            settings=INGEST_SETTINGS,
+            model_name=EMBEDDING_MODEL,
+            fetch_cache=fetch_cache
+        )
+        return resources
+
+
+@st.cache_resource
+def start_warmup():
+    """Start loading the shared resources, once per process, without blocking the first paint."""
+    return Warmup(load_resources)
+
+
+@st.fragment(run_every=1)
+def show_warmup_progress():
+    """Readiness indicator; reruns the page once the model and the index are loaded."""
+    warmup = start_warmup()
+    if warmup.ready():
+        st.rerun()
+    st.info(f"Loading the embedding model and the document index... ({time.time() - warmup.started:.0f}s)")
+
+
+configure_telemetry()
+warmup = start_warmup()
+
+if 'arxiv_results' not in st.session_state:
+    st.session_state.arxiv_results = []
+if 'submitted_uploads' not in st.session_state:
+    st.session_state.submitted_uploads = set()
+
+def show_init_error(error):
+    st.error(f"Initialization failed: {str(error)}")
+    st.info("Make sure you have set up your .env file with GOOGLE_API_KEY")
+    st.stop()
+
+
+if 'qa_engine' not in st.session_state and warmup.ready():
+    try:
+        resources = warmup.result()
+    except Exception as e:
+        # The warm-up failed before starting the job queue; load again on the next rerun.
+        start_warmup.clear()
+        show_init_error(e)
+    try:
+        from agent.qa_engine import QaEngine  # already imported by the warm-up thread
+        st.session_state.vector_store = resources["vector_store"]
+        st.session_state.ledger = resources["ledger"]
+        st.session_state.job_queue = resources["job_queue"]
+        st.session_state.qa_engine = QaEngine(
+            st.session_state.vector_store,
+            answer_cache=resources["answer_cache"],
+            summary_cache=resources["summary_cache"],
+            retrieval_cache=resources["retrieval_cache"],
+            multi_doc_mode=MULTI_DOC_MODE,
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            context_packer=resources["context_packer"]
+        )
+        st.session_state.initialized = True
+    except Exception as e:
+        # The shared store and job queue stay loaded; only this session's engine is retried.
+        show_init_error(e)
+
+ready = 'qa_engine' in st.session_state
+
+
+st.title("Document Q&A AI Agent")
+
+if not ready:
+    show_warmup_progress()
+
+embedding_cache = getattr(st.session_state.vector_store.embedder, "cache", None) if ready else None
+if embedding_cache is not None:
+    cache_stats = embedding_cache.stats()
+    st.sidebar.caption(
+        f"Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries"
+    )
+
+show_timings = st.sidebar.checkbox("Show timings", help="Per-stage timings of answers and ingestion runs")
+if show_timings:
+    st.sidebar.caption(
+        f"Answer cache: {hit_rate('answer_cache.lookups')} hits  \n"
+        f"Summary cache: {hit_rate('summary_cache.lookups')} hits  \n"
+        f"Retrieval cache: {hit_rate('retrieval_cache.lookups')} hits  \n"
+        f"Query vector cache: {hit_rate('query_vector_cache.lookups')} hits"
+    )
+    if warmup.ready():
+        st.sidebar.caption(f"Warm-up: {warmup.seconds:.1f}s")
+
+# Uploads, paper downloads and questions need the model and the index; searching ArXiv does not.
+uploaded_files = st.file_uploader("Upload PDF files", type="pdf", accept_multiple_files=True, disabled=not ready)
+if uploaded_files and ready:
+    # The uploader keeps its files across reruns; only a new upload is submitted,
+    # and it retries a failed, cancelled or removed job for the same file.
+    for uploaded_file in uploaded_files:
+        if uploaded_file.size > 50 * 1024 * 1024:
+            st.error(f"**{uploaded_file.name}**: File too large (max 50MB)")
+            continue
+        if uploaded_file.file_id in st.session_state.submitted_uploads:
+            continue
+        st.session_state.job_queue.submit_file(uploaded_file.name, uploaded_file.getvalue(), retry=True)
+        st.session_state.submitted_uploads.add(uploaded_file.file_id)
+
+st.header("Search ArXiv")
+
+arxiv_query = st.text_input("Enter search query for ArXiv")
+
+col1, col2 = st.columns([1, 1])
+
+with col1:
+    if st.button("Search"):
+        if arxiv_query:
+            # Paced by the process-wide ArXiv rate limiter; repeated queries come from the cache.
+            with st.spinner("Searching ArXiv..."):
+                results, error = search_arxiv(arxiv_query, max_results=ARXIV_MAX_RESULTS, cache=load_fetch_cache())
+            st.session_state.arxiv_results = results or []
+            if error:
+                st.error(error)
+        else:
+            st.warning("Please enter a search query.")
+
+    results = st.session_state.arxiv_results
+    if results:
+        selected = st.multiselect(
+            f"Found {len(results)} papers; choose the ones to add",
+            range(len(results)),
+            format_func=lambda i: f"{results[i].title} ({results[i].published.year}, {results[i].get_short_id()})"
+        )
+        if st.button("Add selected papers", disabled=not selected or not ready):
+            # All selected papers are downloaded concurrently by the ingestion workers.
+            for result in (results[i] for i in selected):
+                st.session_state.job_queue.submit_url(result.pdf_url, name=f"{result.get_short_id()}.pdf", retry=True)
+            st.success(f"{len(selected)} paper(s) queued for download and processing.")
+
+with col2:
+    st.markdown("**Alternative: Add by URL**")
+    pdf_url_input = st.text_input("ArXiv PDF URL (e.g., https://arxiv.org/pdf/2401.12345.pdf)", key="pdf_url")
+    if st.button("Add PDF from URL", disabled=not ready):
+        if pdf_url_input:
+            st.session_state.job_queue.submit_url(pdf_url_input, retry=True)
+            st.success("PDF queued for download and processing.")
+        else:
+            st.warning("Please enter a PDF URL.")
+
+
+@st.fragment(run_every=2)
+def show_ingestion_jobs():
+    """Job list, refreshed every two seconds without rerunning the rest of the page."""
+    job_queue = st.session_state.job_queue
+    jobs = job_queue.jobs()
+    if not jobs:
+        return
+    active = sum(1 for job in jobs if job.status in ACTIVE_JOB_STATES)
+    with st.expander(f"Ingestion jobs ({active} in progress)", expanded=active > 0):
+        for job in jobs:
+            name_col, status_col, action_col = st.columns([3, 3, 1])
+            name_col.write(job.name)
+            if job.status == "running":
+                detail = f"{job.embedded}/{job.chunks} chunks" if job.chunks else "parsing"
+                status_col.progress(job.progress, text=detail)
+            elif job.status == "failed":
+                status_col.error(job.error or "failed")
+            else:
+                status_col.caption(job.status)
+            if job.status in ACTIVE_JOB_STATES and action_col.button("Cancel", key=f"cancel_{job.id}"):
+                job_queue.cancel(job.id)
+            elif job.status in RETRYABLE_JOB_STATES and action_col.button("Retry", key=f"retry_{job.id}"):
+                if not job_queue.retry(job.id):
+                    st.warning(f"{job.name} is no longer spooled; upload it again to add it.")
+        if active == 0 and st.button("Clear finished jobs"):
+            job_queue.clear_finished()
+            st.rerun()
+
+
+@st.fragment
+def show_documents():
+    """Indexed documents with their chunk counts; removing one reruns only this list."""
+    vector_store = st.session_state.vector_store
+    documents = sorted(vector_store.source_chunks().items())
+    if not documents:
+        return
+    with st.expander(f"Documents ({len(documents)})"):
+        for source, chunks in documents:
+            name_col, chunks_col, action_col = st.columns([3, 3, 1])
+            name_col.write(os.path.basename(source).replace("temp_", "", 1))
+            chunks_col.caption(f"{chunks} chunks")
+            if action_col.button("Remove", key=f"remove_{source}"):
+                if st.session_state.job_queue.remove_document(source) is None:
+                    st.warning(f"{source} is being ingested; remove it when its job has finished.")
+                else:
+                    st.rerun(scope="fragment")
+        ratio = vector_store.tombstone_ratio()
+        if ratio:
+            st.caption(f"{ratio:.0%} of the index snapshot is removed chunks; compacted above {INDEX_COMPACT_RATIO:.0%}.")
+
+
+if ready:
+    show_ingestion_jobs()
+    show_documents()
+
+if show_timings:
+    ingest_traces = [trace for trace in telemetry.recent_traces() if trace.name == "ingest.files"]
+    if ingest_traces:
+        with st.expander("Recent ingestion timings"):
+            show_spans(ingest_traces[:3])
+    warmup_traces = [trace for trace in telemetry.recent_traces() if trace.name == "app.warmup"]
+    if warmup_traces:
+        with st.expander("Startup timings"):
+            show_spans(warmup_traces[:1])
+
+st.header("Ask a Question")
+search_scope = None
+if not st.checkbox("Search all documents", value=True, disabled=not ready):
+    search_scope = st.multiselect(
+        "Documents to search",
+        st.session_state.vector_store.sources(),
+        format_func=lambda source: os.path.basename(source).replace("temp_", "", 1)
+    )
+question = st.text_input("Enter your question")
+if st.button("Ask", disabled=not ready):
+    if question:
+        if st.session_state.vector_store.is_empty():
+            st.warning("No documents loaded. Please upload PDF files or add papers from ArXiv first.")
+        else:
+            try:
+                st.markdown("**Answer:**")
+                with telemetry.capture() as spans:
+                    with st.spinner("Thinking..."):
+                        answer_stream = st.session_state.qa_engine.answer_question_stream(question, sources=search_scope)
+                        first_part = next(answer_stream, "")
+                    st.write_stream(itertools.chain([first_part], answer_stream))
+                if show_timings and spans:
+                    with st.expander("Timings", expanded=True):
+                        show_spans(spans)
+            except Exception as e:
+                st.error(f"Failed to generate answer: {str(e)}")
+                st.info("Tip: Make sure your GOOGLE_API_KEY is correctly set in the .env file.")
+    else:
         st.warning("Please enter a question.")
\ No newline at end of file
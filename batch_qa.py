@@ -0,0 +1,119 @@
+"""
+Answer a file of questions against the persisted index, without Streamlit.
+
+    python batch_qa.py questions.jsonl answers.jsonl
+
+Each input line is a JSON object with a "question" and optionally "sources"
+(document names to search; all documents when absent). Other fields, such as
+an "id", are copied to the output line, which adds "answer", "intent",
+"references" (the documents and pages the answer drew on) and "error". The
+index is opened read-only, so this can run while the app keeps ingesting.
+Settings come from the same environment variables (.env) as the app.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+import telemetry
+from embeddings.embedder import get_embedder, MODEL_NAME, BATCH_SIZE
+from embeddings.vector_store import VectorStore
+from agent.qa_engine import QaEngine
+from agent.context import ContextPacker, Reranker
+
+
+def read_questions(path):
+    items = []
+    with (contextlib.nullcontext(sys.stdin) if path == "-" else open(path, encoding="utf-8")) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            if not item.get("question"):
+                raise ValueError(f"{path}:{line_number}: missing \"question\"")
+            items.append(item)
+    return items
+
+
+def resolve_sources(items, vector_store):
+    """Let "sources" name documents by file name, as the app lists them, as well as by stored source."""
+    stored = vector_store.sources()
+    by_name = {}
+    for source in stored:
+        by_name.setdefault(os.path.basename(source).replace("temp_", "", 1), []).append(source)
+    stored = set(stored)
+    for item in items:
+        if item.get("sources") is not None:
+            item["sources"] = sorted({
+                resolved
+                for name in item["sources"]
+                for resolved in ([name] if name in stored else by_name.get(name, [name]))
+            })
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL file of questions ('-' for stdin)")
+    parser.add_argument("answers", nargs="?", default="-", help="JSONL file to write answers to (default stdout)")
+    parser.add_argument("--index-dir", default=os.getenv("INDEX_DIR", "data/index"))
+    parser.add_argument("--nprobe", type=int, default=int(os.getenv("INDEX_NPROBE", "16")))
+    parser.add_argument("--ef-search", type=int, default=int(os.getenv("INDEX_EF_SEARCH", "64")))
+    parser.add_argument("--vector-dtype", default=os.getenv("INDEX_VECTOR_DTYPE", "float16"))
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", MODEL_NAME))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", str(BATCH_SIZE))))
+    parser.add_argument("--embedding-cache", default=os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite"))
+    parser.add_argument("--multi-doc-mode", default=os.getenv("MULTI_DOC_MODE", "map_reduce"))
+    parser.add_argument("--max-concurrency", type=int, default=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+                        help="LLM calls in flight at once")
+    parser.add_argument("--reranker", default=os.getenv("RERANKER_MODEL", ""))
+    parser.add_argument("--telemetry-log", default=os.getenv("TELEMETRY_LOG", ""),
+                        help="append spans to this JSONL file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    telemetry.configure(log_path=args.telemetry_log or None)
+    if not os.path.exists(os.path.join(args.index_dir, "manifest.json")):
+        sys.exit(f"No index found in {args.index_dir}")
+    items = read_questions(args.questions)
+
+    started = time.perf_counter()
+    embedder = get_embedder(args.model, backend=args.backend, batch_size=args.batch_size,
+                            cache_path=args.embedding_cache or None)
+    vector_store = VectorStore(embedder, index_dir=args.index_dir, nprobe=args.nprobe,
+                               ef_search=args.ef_search, vector_dtype=args.vector_dtype, read_only=True)
+    engine = QaEngine(
+        vector_store,
+        multi_doc_mode=args.multi_doc_mode,
+        max_concurrency=args.max_concurrency,
+        context_packer=ContextPacker(reranker=Reranker(args.reranker) if args.reranker else None)
+    )
+    loaded = time.perf_counter()
+    resolve_sources(items, vector_store)
+
+    results = engine.answer_batch(items)
+    with (contextlib.nullcontext(sys.stdout) if args.answers == "-"
+          else open(args.answers, "w", encoding="utf-8")) as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+
+    errors = sum(1 for result in results if result["error"])
+    print(
+        f"{len(results)} questions ({len({(item['question'], str(item.get('sources'))) for item in items})} unique) "
+        f"over {len(vector_store)} chunks: loaded in {loaded - started:.1f}s, "
+        f"answered in {time.perf_counter() - loaded:.1f}s, {errors} errors",
+        file=sys.stderr
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
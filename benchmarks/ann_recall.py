@@ -0,0 +1,114 @@
+"""
+Recall-vs-latency report for the ANN index types against the exact flat baseline.
+
+    python -m benchmarks.ann_recall --vectors 200000 --dim 384 --queries 500
+
+Vectors are synthetic (clustered Gaussian, normalized) unless --vectors-file
+points at the vector file of an index directory (vectors.f32, .f16 or .i8);
+its manifest supplies the dimension and precision.
+"""
+import argparse
+import itertools
+import json
+import time
+import numpy as np
+import faiss
+from embeddings.index_factory import INDEX_TYPES, VECTOR_DTYPES, build_index, search_parameters
+from embeddings.vector_store import read_vector_file
+
+
+def synthetic_vectors(count, dim, clusters=256, seed=0):
+    """Clustered, normalized vectors; uniform random data makes every ANN look bad."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, count)
+    vectors = centers[assignment] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _recall(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def run(vectors, queries, k=10, index_types=INDEX_TYPES, nprobes=(1, 4, 16, 64), ef_searches=(16, 64, 256),
+        vector_dtypes=("float32",)):
+    """Build every index type and vector precision; return one result row per tuning setting."""
+    ids = np.arange(len(vectors), dtype=np.int64)
+    baseline = build_index("flat", vectors.shape[1], vectors, ids)
+    _, truth = baseline.search(queries, k)
+
+    rows = []
+    for index_type, vector_dtype in itertools.product(index_types, vector_dtypes):
+        if index_type == "ivf_pq" and vector_dtype != vector_dtypes[0]:
+            continue  # PQ codes do not depend on the vector precision
+        started = time.perf_counter()
+        index = build_index(index_type, vectors.shape[1], vectors, ids, vector_dtype)
+        build_seconds = time.perf_counter() - started
+
+        if index_type.startswith("ivf"):
+            settings = [{"nprobe": nprobe} for nprobe in nprobes]
+        elif index_type == "hnsw":
+            settings = [{"ef_search": ef} for ef in ef_searches]
+        else:
+            settings = [{}]
+
+        for setting in settings:
+            params = search_parameters(index, **setting)
+            latencies = []
+            found = []
+            for query in queries:
+                started = time.perf_counter()
+                _, labels = index.search(query[None, :], k, params=params)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found.append(labels[0])
+            rows.append({
+                "index_type": index_type,
+                "vector_dtype": vector_dtype,
+                **setting,
+                "build_seconds": round(build_seconds, 3),
+                f"recall@{k}": round(_recall(found, truth, k), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                "index_bytes": int(faiss.serialize_index(index).nbytes),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--vectors-file", help="a store's vector file, e.g. data/index/vectors.f16")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--vector-dtypes", default="float32", help=f"comma-separated, from {VECTOR_DTYPES}")
+    parser.add_argument("--json", action="store_true", help="print JSON lines instead of a table")
+    args = parser.parse_args()
+
+    if args.vectors_file:
+        vectors = read_vector_file(args.vectors_file, args.dim)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    rows = run(vectors, queries, k=args.k, index_types=args.index_types.split(","),
+               vector_dtypes=args.vector_dtypes.split(","))
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    columns = list(dict.fromkeys(["index_type", "vector_dtype", "nprobe", "ef_search"]
+                                 + [key for row in rows for key in row]))
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(c, '')):>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
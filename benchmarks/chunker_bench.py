@@ -0,0 +1,97 @@
+"""
+Throughput and chunk-size report: token-aware chunker vs the character splitter.
+
+    python -m benchmarks.chunker_bench --pages 300
+    python -m benchmarks.chunker_bench --pdf paper.pdf --pdf thesis.pdf
+
+Chunk sizes are measured in tokens of the embedding model; "truncated" counts
+chunks longer than the model's 256-token input, whose tail is never embedded.
+"""
+import argparse
+import json
+import random
+import time
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from embeddings.embedder import get_tokenizer
+from ingest.chunker import CHUNK_SIZE, CHUNK_OVERLAP, chunk_documents
+from ingest.pdf_loader import load_pdf
+
+MODEL_MAX_TOKENS = 256
+
+WORDS = ("model", "attention", "layer", "dataset", "accuracy", "training", "baseline", "transformer",
+         "we", "the", "of", "and", "results", "table", "F1", "0.87", "BLEU", "proposed", "method")
+
+
+def synthetic_pages(count, seed=0):
+    """Paper-like pages: paragraphs of sentences, about 3000 characters each."""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(count):
+        paragraphs = []
+        while sum(len(p) for p in paragraphs) < 3000:
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(8, 25))).capitalize() + "."
+                         for _ in range(rng.randint(2, 6))]
+            paragraphs.append(" ".join(sentences))
+        pages.append(Document(page_content="\n\n".join(paragraphs),
+                              metadata={"source": "synthetic.pdf", "page": page}))
+    return pages
+
+
+def _token_counts(tokenizer, chunks):
+    encodings = tokenizer([chunk.page_content for chunk in chunks], add_special_tokens=True, verbose=False)
+    return [len(ids) for ids in encodings["input_ids"]]
+
+
+def run(pages, tokenizer, repeats=3):
+    """Time both chunkers over the pages and describe the chunks they produce."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200,
+                                              separators=["\n\n", "\n", " ", ""])
+    chunkers = {
+        "character_2000": lambda: splitter.split_documents(pages),
+        f"token_{CHUNK_SIZE}": lambda: chunk_documents(pages, CHUNK_SIZE, CHUNK_OVERLAP, tokenizer),
+    }
+
+    rows = []
+    for name, chunk in chunkers.items():
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            chunks = chunk()
+            timings.append(time.perf_counter() - started)
+        seconds = min(timings)
+        tokens = _token_counts(tokenizer, chunks)
+        rows.append({
+            "chunker": name,
+            "seconds": round(seconds, 4),
+            "pages_per_s": round(len(pages) / seconds, 1),
+            "chunks": len(chunks),
+            "mean_tokens": round(sum(tokens) / len(tokens), 1),
+            "max_tokens": max(tokens),
+            "truncated": sum(1 for t in tokens if t > MODEL_MAX_TOKENS),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300, help="synthetic pages when no --pdf is given")
+    parser.add_argument("--pdf", action="append", default=[], help="PDF to chunk (repeatable)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print JSON lines instead of a table")
+    args = parser.parse_args()
+
+    pages = [page for path in args.pdf for page in load_pdf(path)] if args.pdf else synthetic_pages(args.pages)
+    rows = run(pages, get_tokenizer(), repeats=args.repeats)
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    columns = list(rows[0])
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
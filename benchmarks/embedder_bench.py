@@ -0,0 +1,82 @@
+"""
+Embedding throughput per backend, with cosine agreement against fp32 PyTorch.
+
+    python -m benchmarks.embedder_bench --chunks 2000
+    python -m benchmarks.embedder_bench --backends torch,onnx_int8 --batch-sizes 32,64,128
+
+Chunks are synthetic paper-like text of mixed lengths. "cosine_mean" and
+"cosine_min" compare each backend's vectors with the fp32 "torch" reference;
+values below ~0.99 mean the backend changes retrieval noticeably.
+"""
+import argparse
+import json
+import random
+import time
+import numpy as np
+from embeddings.embedder import BACKENDS, MODEL_NAME, LocalEmbeddings
+from benchmarks.chunker_bench import WORDS
+
+
+def synthetic_chunks(count, seed=0):
+    """Chunks from a few words up to about 250 tokens, like the tail and body chunks of a PDF."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.choice((8, 40, 120, 200)))) for _ in range(count)]
+
+
+def run(texts, model_name=MODEL_NAME, backends=BACKENDS, batch_sizes=(64,)):
+    """Embed the texts with every backend and batch size; one result row each."""
+    reference = None
+    rows = []
+    for backend in backends:
+        embedder = LocalEmbeddings(model_name, backend=backend)
+        embedder.embed_documents(texts[:32])  # warm-up
+        for batch_size in batch_sizes:
+            embedder.batch_size = batch_size
+            started = time.perf_counter()
+            vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+            seconds = time.perf_counter() - started
+            if reference is None and backend == "torch":
+                reference = vectors
+            row = {
+                "backend": backend,
+                "batch_size": batch_size,
+                "seconds": round(seconds, 3),
+                "chunks_per_s": round(len(texts) / seconds, 1),
+            }
+            if reference is not None:
+                cosine = np.sum(vectors * reference, axis=1)
+                row["cosine_mean"] = round(float(cosine.mean()), 5)
+                row["cosine_min"] = round(float(cosine.min()), 5)
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="torch is run first as the reference")
+    parser.add_argument("--batch-sizes", default="64")
+    parser.add_argument("--json", action="store_true", help="print JSON lines instead of a table")
+    args = parser.parse_args()
+
+    backends = args.backends.split(",")
+    backends = ["torch"] + [backend for backend in backends if backend != "torch"]
+    rows = run(
+        synthetic_chunks(args.chunks),
+        model_name=args.model,
+        backends=backends,
+        batch_sizes=[int(size) for size in args.batch_sizes.split(",")]
+    )
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(c, '')):>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+End-to-end benchmark: synthetic corpus -> PDF parsing -> chunking -> embedding
+-> indexing -> search -> answering, with the LLM replaced by a local
+deterministic stub so it runs offline.
+
+    python -m benchmarks.pipeline_bench --chunks 10000 --out results/base.json
+    python -m benchmarks.pipeline_bench --chunks 1000000 --index-type ivf_pq --answers 0
+    python -m benchmarks.pipeline_bench --embedder torch --tokenizer model --chunks 5000
+    python -m benchmarks.pipeline_bench --compare results/base.json results/new.json
+
+By default text is embedded with a hashed bag-of-words model and tokenized with
+a regex, so 1M-chunk runs finish on a laptop and numbers only move when our code
+does; pass an embedding backend and `--tokenizer model` to measure the real model.
+
+Reported per stage: throughput, latency percentiles (ms), recall@k of the store
+against exact search over the same vectors, and the process memory high-water
+mark after the stage. Results are written as JSON together with the git commit,
+and `--compare` prints the relative change of every metric between two runs.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+from benchmarks.chunker_bench import WORDS
+from embeddings.embedder import BACKENDS, MODEL_NAME, get_embedder, get_tokenizer
+from embeddings.index_factory import INDEX_TYPES, VECTOR_DTYPES
+from embeddings.sparse_index import TOKEN_PATTERN
+from embeddings.vector_store import VectorStore
+from ingest.chunker import CHUNK_SIZE, CHUNK_OVERLAP, chunk_documents
+from ingest.pdf_loader import iter_pdf_pages
+from agent.context import ContextPacker
+from agent.qa_engine import QaEngine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PAGES_PER_DOCUMENT = 10
+DOCUMENT_BATCH = 32
+TOPICS = 64
+
+
+def memory_high_water_mb():
+    """Peak resident memory of this process so far, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(seconds):
+    values = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+class SyntheticCorpus:
+    """
+    Paper-like documents of PAGES_PER_DOCUMENT pages of about 3000 characters.
+    Every document has one of TOPICS topics, whose vocabulary is mixed with
+    common paper words, so embeddings cluster and keyword search has something
+    to find. Deterministic for a given seed.
+    """
+
+    def __init__(self, seed=0, vocabulary=4000, topic_words=80):
+        self.seed = seed
+        rng = random.Random(seed)
+        syllables = ["ka", "lo", "mi", "ren", "tas", "vo", "qui", "zen", "dar", "pel", "sor", "nu", "bri", "gam"]
+        words = set()
+        while len(words) < vocabulary:
+            words.add("".join(rng.choices(syllables, k=rng.randint(2, 4))))
+        self.vocabulary = sorted(words)
+        self.topics = [rng.sample(self.vocabulary, topic_words) for _ in range(TOPICS)]
+
+    def _sentence(self, rng, topic):
+        words = [rng.choice(topic) if rng.random() < 0.4 else rng.choice(WORDS) for _ in range(rng.randint(8, 25))]
+        if rng.random() < 0.1:
+            words += ["F1", "=", f"0.{rng.randint(10, 99)}"]
+        return " ".join(words).capitalize() + "."
+
+    def document(self, number):
+        """The pages of document `number` as Documents."""
+        rng = random.Random(self.seed * 1000003 + number)
+        topic = self.topics[number % TOPICS]
+        source = f"synthetic-{number:06d}.pdf"
+        pages = []
+        for page in range(PAGES_PER_DOCUMENT):
+            paragraphs = []
+            while sum(len(p) for p in paragraphs) < 3000:
+                paragraphs.append(" ".join(self._sentence(rng, topic) for _ in range(rng.randint(2, 6))))
+            pages.append(Document(page_content="\n\n".join(paragraphs),
+                                  metadata={"source": source, "page": page, "total_pages": PAGES_PER_DOCUMENT}))
+        return pages
+
+    def write_pdf(self, number, path):
+        """Write document `number` as a real PDF, one page per page of text."""
+        import pymupdf
+        pdf = pymupdf.open()
+        for page_doc in self.document(number):
+            page = pdf.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), page_doc.page_content, fontsize=7)
+        pdf.save(path)
+        pdf.close()
+
+
+class RegexTokenizer:
+    """Offline stand-in for a fast HuggingFace tokenizer: words and punctuation with offsets."""
+
+    def __init__(self):
+        import re
+        self.pattern = re.compile(r"\w+|[^\w\s]")
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True, verbose=False):
+        return {"offset_mapping": [[m.span() for m in self.pattern.finditer(text)] for text in texts]}
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words embeddings: every word owns a fixed random
+    vector and a text is the normalized sum of its words' vectors. Cheap enough
+    for 1M chunks, and texts sharing words end up close, like a real model.
+    """
+
+    def __init__(self, dim=384, buckets=8192, seed=0):
+        self.dim = dim
+        self.buckets = buckets
+        self._table = np.random.default_rng(seed).standard_normal((buckets, dim)).astype(np.float32)
+        self._bucket_of = {}
+
+    def _bucket(self, word):
+        bucket = self._bucket_of.get(word)
+        if bucket is None:
+            import zlib
+            bucket = self._bucket_of[word] = zlib.crc32(word.encode("utf-8")) % self.buckets
+        return bucket
+
+    def embed_documents(self, texts):
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+    def _embed(self, texts):
+        rows, buckets = [], []
+        for row, text in enumerate(texts):
+            words = TOKEN_PATTERN.findall(text.lower())
+            rows.extend([row] * len(words))
+            buckets.extend(self._bucket(word) for word in words)
+        counts = np.zeros((len(texts), self.buckets), dtype=np.float32)
+        np.add.at(counts, (np.asarray(rows, dtype=np.int64), np.asarray(buckets, dtype=np.int64)), 1.0)
+        vectors = counts @ self._table
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+class StubLLM:
+    """
+    Local deterministic chat model for QaEngine: echoes the last words of the
+    prompt, so every call costs the same and the answer path runs without
+    network calls or variance. Prompt sizes are recorded.
+    """
+
+    def __init__(self, answer_words=60):
+        self.answer_words = answer_words
+        self.prompt_chars = 0
+        self.calls = 0
+
+    def _answer(self, prompt):
+        self.calls += 1
+        self.prompt_chars += len(str(prompt))
+        return " ".join(str(prompt).split()[-self.answer_words:])
+
+    def invoke(self, prompt):
+        return AIMessage(content=self._answer(prompt))
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+    def stream(self, prompt):
+        for word in self._answer(prompt).split():
+            yield AIMessageChunk(content=word + " ")
+
+
+def exact_top_k(vectors, queries, k, block=65536):
+    """Exact inner-product top-k row ids per query, scanning the float16 vectors in blocks."""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = queries @ vectors[start:start + block].astype(np.float32).T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_ids = np.concatenate([best_ids, ids], axis=1)
+        top = np.argsort(-all_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, top, axis=1)
+        best_ids = np.take_along_axis(all_ids, top, axis=1)
+    return best_ids
+
+
+def bench_pdf(corpus, documents, workdir):
+    """Parse real PDFs of the first `documents` synthetic documents."""
+    paths = []
+    for number in range(documents):
+        path = os.path.join(workdir, f"synthetic-{number:06d}.pdf")
+        corpus.write_pdf(number, path)
+        paths.append(path)
+    size = sum(os.path.getsize(path) for path in paths)
+
+    started = time.perf_counter()
+    pages = sum(1 for path in paths for _ in iter_pdf_pages(path))
+    seconds = time.perf_counter() - started
+    return {
+        "documents": documents,
+        "pages": pages,
+        "seconds": round(seconds, 3),
+        "pages_per_s": round(pages / seconds, 1),
+        "mb_per_s": round(size / seconds / 1e6, 2),
+        "memory_high_water_mb": memory_high_water_mb(),
+    }
+
+
+def bench_ingest(corpus, store, embedder, tokenizer, target_chunks):
+    """
+    Chunk, embed and add documents until `target_chunks` chunks are indexed,
+    timing each stage separately. Returns (stage results, vectors, chunk keys).
+    """
+    timings = {"generate": 0.0, "chunk": 0.0, "embed": 0.0, "index_add": 0.0}
+    vectors = []
+    keys = {}  # (source, start_index) -> row, to map returned Documents back to rows
+    pages = chunks = 0
+    number = 0
+    while chunks < target_chunks:
+        started = time.perf_counter()
+        batch = [page for n in range(number, number + DOCUMENT_BATCH) for page in corpus.document(n)]
+        number += DOCUMENT_BATCH
+        timings["generate"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch_chunks = chunk_documents(batch, CHUNK_SIZE, CHUNK_OVERLAP, tokenizer)[:target_chunks - chunks]
+        timings["chunk"] += time.perf_counter() - started
+        texts = [chunk.page_content for chunk in batch_chunks]
+
+        started = time.perf_counter()
+        batch_vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+        timings["embed"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        ids = store.add_embeddings(texts, batch_vectors, [chunk.metadata for chunk in batch_chunks])
+        timings["index_add"] += time.perf_counter() - started
+
+        vectors.append(batch_vectors.astype(np.float16))
+        for doc_id, chunk in zip(ids, batch_chunks):
+            keys[(chunk.metadata["source"], chunk.metadata["start_index"])] = doc_id
+        pages += len(batch)
+        chunks += len(batch_chunks)
+
+    results = {
+        "chunk": {"documents": number, "pages": pages, "chunks": chunks, "seconds": round(timings["chunk"], 3),
+                  "pages_per_s": round(pages / timings["chunk"], 1),
+                  "chunks_per_s": round(chunks / timings["chunk"], 1)},
+        "embed": {"chunks": chunks, "seconds": round(timings["embed"], 3),
+                  "chunks_per_s": round(chunks / timings["embed"], 1)},
+        "index_add": {"chunks": chunks, "seconds": round(timings["index_add"], 3),
+                      "chunks_per_s": round(chunks / timings["index_add"], 1),
+                      "memory_high_water_mb": memory_high_water_mb()},
+    }
+    return results, np.concatenate(vectors), keys
+
+
+def make_queries(store, count, seed=0):
+    """
+    Spans of 6-12 words from random indexed chunks, drawn from the whole corpus
+    (the last document batch is usually only partly indexed, so pages are not
+    sampled directly).
+    """
+    rng = random.Random(seed)
+    rows = [rng.randrange(len(store.docstore)) for _ in range(count)]
+    queries = []
+    for chunk in store.docstore.get(rows):
+        words = chunk.page_content.split()
+        length = rng.randint(6, 12)
+        start = rng.randrange(max(1, len(words) - length))
+        queries.append(" ".join(words[start:start + length]))
+    return queries
+
+
+def bench_search(store, embedder, queries, vectors, keys, k):
+    """Query embedding, dense and hybrid search latency, and dense recall@k against exact search."""
+    embed_times, dense_times, hybrid_times = [], [], []
+    query_vectors, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        vector = embedder.embed_query(query)
+        embed_times.append(time.perf_counter() - started)
+        query_vectors.append(vector)
+
+        started = time.perf_counter()
+        hits = store.similarity_search_with_score_by_vector(vector, k=k)
+        dense_times.append(time.perf_counter() - started)
+        found.append([keys[(doc.metadata["source"], doc.metadata["start_index"])] for doc, _ in hits])
+
+        started = time.perf_counter()
+        store.hybrid_search_by_vector(query, vector, k=k)
+        hybrid_times.append(time.perf_counter() - started)
+
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+    query_vectors /= np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+    truth = exact_top_k(vectors, query_vectors, k)
+    hits = sum(len(set(f) & set(t.tolist())) for f, t in zip(found, truth))
+    return {
+        "embed_query": {"queries": len(queries), **percentiles(embed_times)},
+        "dense_search": {"queries": len(queries), "k": k, **percentiles(dense_times),
+                         f"recall_at_{k}": round(hits / (len(queries) * k), 4)},
+        "hybrid_search": {"queries": len(queries), "k": k, **percentiles(hybrid_times),
+                          "memory_high_water_mb": memory_high_water_mb()},
+    }
+
+
+def bench_answer(store, queries):
+    """QaEngine.answer_question end to end (retrieval, packing, prompt) with the stub LLM."""
+    llm = StubLLM()
+    engine = QaEngine(store, context_packer=ContextPacker(), llm=llm)
+    questions = [f"What does the paper report about {query}?" for query in queries]
+    # Every fourth question asks for a summary, which takes the dense retrieval path.
+    questions[::4] = [f"Give me a summary of {query}" for query in queries[::4]]
+    times = []
+    for question in questions:
+        started = time.perf_counter()
+        engine.answer_question(question)
+        times.append(time.perf_counter() - started)
+    return {"answer": {"questions": len(questions), **percentiles(times),
+                       "mean_prompt_tokens": round(llm.prompt_chars / 4 / max(llm.calls, 1), 1),
+                       "memory_high_water_mb": memory_high_water_mb()}}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    corpus = SyntheticCorpus(seed=args.seed)
+    if args.embedder == "hash":
+        embedder = HashEmbeddings()
+    else:
+        embedder = get_embedder(args.model, backend=args.embedder)
+    tokenizer = RegexTokenizer() if args.tokenizer == "regex" else get_tokenizer(args.model)
+
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    results = {}
+    try:
+        if args.pdf_documents:
+            results["pdf_parse"] = bench_pdf(corpus, args.pdf_documents, workdir)
+
+        # Snapshots are built once, explicitly, so index_add only measures appends.
+        store = VectorStore(embedder, index_dir=os.path.join(workdir, "index"), index_type=args.index_type,
+                            checkpoint_every=args.chunks + 1, vector_dtype=args.vector_dtype,
+                            nprobe=args.nprobe, ef_search=args.ef_search)
+        ingest, vectors, keys = bench_ingest(corpus, store, embedder, tokenizer, args.chunks)
+        results.update(ingest)
+
+        started = time.perf_counter()
+        store.checkpoint()
+        results["index_build"] = {"chunks": len(store), "index_type": store._base_type,
+                                  "seconds": round(time.perf_counter() - started, 3),
+                                  "memory_high_water_mb": memory_high_water_mb()}
+
+        queries = make_queries(store, args.queries, seed=args.seed + 1)
+        results.update(bench_search(store, embedder, queries, vectors, keys, args.k))
+        if args.answers:
+            results.update(bench_answer(store, queries[:args.answers]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "config": vars(args),
+        "results": results,
+    }
+
+
+def compare(base, new, threshold=0.1):
+    """Print every numeric metric of two result files with its relative change."""
+    lower_is_better = ("seconds", "_ms", "memory")
+    for key in sorted(set(base["config"]) | set(new["config"])):
+        if base["config"].get(key) != new["config"].get(key):
+            print(f"note: {key} differs ({base['config'].get(key)} vs {new['config'].get(key)})")
+    print(f"commits: {base['meta']['commit']} -> {new['meta']['commit']}")
+    print(f"{'stage':>14}  {'metric':>22}  {'base':>12}  {'new':>12}  {'change':>8}")
+    for stage, metrics in new["results"].items():
+        for metric, value in metrics.items():
+            old = base["results"].get(stage, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = change > threshold if any(tag in metric for tag in lower_is_better) else change < -threshold
+            flag = "  REGRESSION" if worse and metric not in ("documents", "chunks", "pages", "queries", "questions") else ""
+            print(f"{stage:>14}  {metric:>22}  {old:>12}  {value:>12}  {change:>+8.1%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000, help="corpus size in chunks (1k to 1M)")
+    parser.add_argument("--embedder", default="hash", choices=("hash",) + BACKENDS,
+                        help="hash (offline, deterministic) or an embedding backend")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--tokenizer", default="regex", choices=("regex", "model"))
+    parser.add_argument("--index-type", default="auto", choices=("auto",) + INDEX_TYPES)
+    parser.add_argument("--vector-dtype", default="float16", choices=VECTOR_DTYPES)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--pdf-documents", type=int, default=20, help="documents written and parsed as real PDFs")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=50, help="questions answered with the stub LLM")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f, open(args.compare[1], encoding="utf-8") as g:
+            compare(json.load(f), json.load(g))
+        return
+
+    config = {key: value for key, value in vars(args).items() if key not in ("out", "compare")}
+    report = run(argparse.Namespace(**config))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        directory = os.path.dirname(args.out)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
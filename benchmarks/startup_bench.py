@@ -0,0 +1,169 @@
+"""
+Startup profile: what `app.py` imports before its first paint, and how long
+the background warm-up (embedding model, index) takes.
+
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --warmup --out results/startup.json
+    python -m benchmarks.startup_bench --compare results/base.json results/new.json
+
+The import profile runs `python -X importtime` in a fresh interpreter over the
+modules app.py imports at top level (read from its source, so it follows the
+app) and reports the total and the slowest packages. Modules that must only be
+imported lazily (torch, FAISS, the Gemini client, ...) are listed when they
+show up there, and the exit status is 1, so the check can run in CI.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Loaded by the warm-up thread or on first use; never before the first paint.
+LAZY_MODULES = (
+    "torch", "sentence_transformers", "transformers", "onnxruntime", "faiss",
+    "langchain_google_genai", "google.genai", "arxiv", "pymupdf",
+)
+
+
+def top_level_imports(path=APP):
+    """Modules imported at module level of a script (not inside functions)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def import_profile(modules):
+    """
+    Import `modules` in a fresh interpreter under -X importtime.
+    Returns {module: (self_us, cumulative_us)} for every module imported.
+    """
+    statement = "\n".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, cwd=os.path.dirname(APP)
+    )
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    profile = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def package_times(profile):
+    """Self time summed per top-level package, in ms, slowest first."""
+    totals = {}
+    for name, (self_us, _) in profile.items():
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return {package: round(us / 1000, 1) for package, us in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+def measure_warmup(args):
+    """The warm-up app.py runs in the background: load and warm the model, open the index."""
+    from embeddings.embedder import get_embedder
+    from embeddings.vector_store import VectorStore
+    started = time.perf_counter()
+    embedder = get_embedder(args.model, backend=args.backend)
+    loaded = time.perf_counter()
+    embedder.warm_up()
+    warmed = time.perf_counter()
+    store = VectorStore(embedder, index_dir=args.index_dir, read_only=True) if args.index_dir else None
+    opened = time.perf_counter()
+    return {
+        "model_load_seconds": round(loaded - started, 3),
+        "first_encode_seconds": round(warmed - loaded, 3),
+        "index_load_seconds": round(opened - warmed, 3),
+        "index_chunks": len(store) if store is not None else 0,
+    }
+
+
+def run(args):
+    modules = top_level_imports()
+    # Best of a few runs: the first one also pays for cold disk caches.
+    profiles = [import_profile(modules) for _ in range(args.repeat)]
+    totals = [sum(self_us for self_us, _ in profile.values()) for profile in profiles]
+    profile = profiles[totals.index(min(totals))]
+    report = {
+        "imports": {
+            "modules": modules,
+            "total_ms": round(min(totals) / 1000, 1),
+            "by_module_ms": {module: round(profile[module][1] / 1000, 1) for module in modules if module in profile},
+            "by_package_ms": dict(list(package_times(profile).items())[:args.top]),
+            "lazy_modules_imported": [module for module in LAZY_MODULES if module in profile],
+        }
+    }
+    if args.warmup:
+        report["warmup"] = measure_warmup(args)
+    return report
+
+
+def compare(base, new, threshold=0.2):
+    """Print the import and warm-up times of two result files with their relative change."""
+    def flatten(report):
+        values = {"imports.total_ms": report["imports"]["total_ms"]}
+        values.update({f"imports.{key}": value for key, value in report["imports"]["by_module_ms"].items()})
+        values.update({f"warmup.{key}": value for key, value in report.get("warmup", {}).items()})
+        return values
+
+    old_values, new_values = flatten(base), flatten(new)
+    for key, value in new_values.items():
+        old = old_values.get(key)
+        if not isinstance(old, (int, float)) or not old:
+            continue
+        change = (value - old) / old
+        flag = "  REGRESSION" if change > threshold and "chunks" not in key else ""
+        print(f"{key:>40}  {old:>10}  {value:>10}  {change:>+8.1%}{flag}")
+    added = set(new["imports"]["lazy_modules_imported"]) - set(base["imports"]["lazy_modules_imported"])
+    if added:
+        print(f"now imported before the first paint: {', '.join(sorted(added))}  REGRESSION")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="import runs; the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="packages listed")
+    parser.add_argument("--warmup", action="store_true", help="also time loading the embedding model and index")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--index-dir", default=os.getenv("INDEX_DIR", ""), help="persisted index to open (read-only)")
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f, open(args.compare[1], encoding="utf-8") as g:
+            compare(json.load(f), json.load(g))
+        return 0
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        directory = os.path.dirname(args.out)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    lazy = report["imports"]["lazy_modules_imported"]
+    if lazy:
+        print(f"imported before the first paint, should be lazy: {', '.join(lazy)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import json
+import os
+import numpy as np
+from langchain_core.documents import Document
+
+TEXTS = "texts.utf8"
+ROWS = "rows.bin"
+METADATA = "metadata.jsonl"
+
+# Integer metadata stored as columns; everything else in a row's metadata is
+# interned, so rows of one document share a single dict.
+INT_COLUMNS = ("page", "page_end", "start_index", "end_index", "tokens")
+MISSING = -1
+
+ROW_DTYPE = np.dtype(
+    [("text_end", "<i8"), ("metadata_id", "<i4")] + [(name, "<i4") for name in INT_COLUMNS]
+)
+
+
+class DocStore:
+    """
+    Chunk text and metadata addressed by vector id (the row number), in a
+    compact columnar layout:
+      texts.utf8      all chunk text, one contiguous UTF-8 buffer
+      rows.bin        one fixed-width record per row: text end offset,
+                      interned metadata id and the INT_COLUMNS values
+      metadata.jsonl  the distinct remaining metadata dicts, one per line
+    Only the row records and the distinct metadata dicts stay resident; text is
+    read back for the rows a search returns, and Documents are built only then.
+    Without a directory the text buffer is kept in memory instead.
+
+    All files are append-only; `state()` gives the committed sizes, which
+    `DocStore(directory, state)` truncates back to after a crash. With
+    `read_only` the files are read up to the committed sizes and never modified,
+    so another process may keep appending to them.
+    """
+
+    def __init__(self, directory=None, state=None, read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        self._rows = np.zeros(1024, dtype=ROW_DTYPE)
+        self._count = 0
+        self._metadata = []
+        self._metadata_ids = {}
+        self._text = bytearray()
+        self._text_size = 0
+        self._metadata_size = 0
+        if directory:
+            if not read_only:
+                os.makedirs(directory, exist_ok=True)
+            self._load(state or {})
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self, state):
+        if not self.read_only:
+            for name in (TEXTS, ROWS, METADATA):
+                open(self._path(name), "ab").close()
+        rows = np.fromfile(self._path(ROWS), dtype=ROW_DTYPE, count=state.get("rows", -1))
+        count = min(len(rows), state.get("rows", len(rows)))
+        self._grow(count)
+        self._rows[:count] = rows[:count]
+        self._count = count
+        self._text_size = int(rows[count - 1]["text_end"]) if count else 0
+
+        with open(self._path(METADATA), "rb") as f:
+            data = f.read(state.get("metadata_bytes", -1))
+        self._metadata_size = len(data)
+        for line in data.splitlines():
+            self._intern(json.loads(line))
+
+        if self.read_only:
+            return
+        # Anything past the committed sizes is a torn write from a crash.
+        os.truncate(self._path(ROWS), count * ROW_DTYPE.itemsize)
+        os.truncate(self._path(TEXTS), self._text_size)
+        os.truncate(self._path(METADATA), self._metadata_size)
+
+    def _grow(self, needed):
+        if needed > len(self._rows):
+            rows = np.zeros(max(needed, 2 * len(self._rows)), dtype=ROW_DTYPE)
+            rows[:self._count] = self._rows[:self._count]
+            self._rows = rows
+
+    def _intern(self, metadata):
+        """Id of a metadata dict, adding it to the table if new. Returns (id, JSON line or None)."""
+        key = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+        metadata_id = self._metadata_ids.get(key)
+        if metadata_id is not None:
+            return metadata_id, None
+        metadata_id = self._metadata_ids[key] = len(self._metadata)
+        self._metadata.append(json.loads(key))
+        return metadata_id, key
+
+    def state(self):
+        """Committed sizes, for the store manifest."""
+        return {"rows": self._count, "metadata_bytes": self._metadata_size}
+
+    def append(self, texts, metadatas):
+        """Append rows; ids continue from the current length."""
+        if self.read_only:
+            raise RuntimeError("DocStore was opened read-only")
+        start = self._count
+        self._grow(start + len(texts))
+        rows = self._rows[start:start + len(texts)]
+        encoded = [text.encode("utf-8") for text in texts]
+        rows["text_end"] = self._text_size + np.cumsum([len(data) for data in encoded])
+
+        for key in INT_COLUMNS:
+            rows[key] = MISSING
+
+        new_metadata = []
+        for row, metadata in enumerate(metadatas):
+            shared = {}
+            for key, value in metadata.items():
+                if key in INT_COLUMNS and type(value) is int and 0 <= value < 2 ** 31:
+                    rows[key][row] = value
+                else:
+                    shared[key] = value
+            rows["metadata_id"][row], line = self._intern(shared)
+            if line is not None:
+                new_metadata.append(line.encode("utf-8") + b"\n")
+
+        buffer = b"".join(encoded)
+        metadata_buffer = b"".join(new_metadata)
+        if self.directory is None:
+            self._text += buffer
+        else:
+            for name, data in ((METADATA, metadata_buffer), (TEXTS, buffer), (ROWS, rows.tobytes())):
+                with open(self._path(name), "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+        self._text_size += len(buffer)
+        self._metadata_size += len(metadata_buffer)
+        self._count += len(texts)
+
+    def _text_range(self, doc_id):
+        start = int(self._rows[doc_id - 1]["text_end"]) if doc_id else 0
+        return start, int(self._rows[doc_id]["text_end"])
+
+    def metadata(self, doc_id):
+        """Metadata dict of a row, rebuilt from the interned dict and the columns."""
+        row = self._rows[doc_id]
+        metadata = dict(self._metadata[row["metadata_id"]])
+        for key in INT_COLUMNS:
+            if row[key] != MISSING:
+                metadata[key] = int(row[key])
+        return metadata
+
+    def column(self, name):
+        """Read-only view of an integer column (or "metadata_id") over all rows."""
+        view = self._rows[name][:self._count]
+        view.flags.writeable = False
+        return view
+
+    def metadata_dicts(self):
+        """The distinct interned metadata dicts, indexed by metadata_id."""
+        return self._metadata
+
+    def get(self, ids):
+        """Build Document objects for the given ids."""
+        docs = []
+        if self.directory is None:
+            for i in ids:
+                start, end = self._text_range(i)
+                docs.append(Document(page_content=self._text[start:end].decode("utf-8"),
+                                     metadata=self.metadata(i)))
+            return docs
+
+        with open(self._path(TEXTS), "rb") as f:
+            for i in ids:
+                start, end = self._text_range(i)
+                docs.append(Document(page_content=os.pread(f.fileno(), end - start, start).decode("utf-8"),
+                                     metadata=self.metadata(i)))
+        return docs
+
+    def import_jsonl(self, path, size):
+        """Copy rows from the older one-JSON-line-per-row docstore format."""
+        batch_texts, batch_metadatas = [], []
+        read = 0
+        with open(path, "rb") as f:
+            for line in f:
+                read += len(line)
+                if read > size:
+                    break
+                record = json.loads(line)
+                batch_texts.append(record["text"])
+                batch_metadatas.append(record["metadata"])
+                if len(batch_texts) == 10000:
+                    self.append(batch_texts, batch_metadatas)
+                    batch_texts, batch_metadatas = [], []
+        if batch_texts:
+            self.append(batch_texts, batch_metadatas)
+
+    @property
+    def size(self):
+        """Bytes of chunk text stored."""
+        return self._text_size
+
+    def __len__(self):
+        return self._count
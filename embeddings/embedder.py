@@ -1,11 +1,140 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-
-def get_embedder():
-    """
-    Return a local HuggingFace embeddings instance (offline, no API needed).
-    Uses 'all-MiniLM-L6-v2' - a small, fast model.
-    """
-    return HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
\ No newline at end of file
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from telemetry import span, observe
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# torch: fp32 PyTorch (the reference); torch_int8: Linear layers dynamically
+# quantized to int8; onnx / onnx_int8: ONNX Runtime with the fp32 or the
+# int8-quantized export (needs `pip install "sentence-transformers[onnx]"`).
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+BATCH_SIZE = 64
+# Upper bound on padded tokens per forward pass (batch size x longest text).
+MAX_BATCH_TOKENS = 16384
+# Batches are planned from character lengths at this rate rather than by
+# tokenizing every text once more before encode() tokenizes it.
+CHARS_PER_TOKEN = 4
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+_tokenizers = {}
+
+def _load_model(model_name, backend):
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+    if backend == "torch_int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+    if backend == "onnx_int8":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                   model_kwargs={"file_name": ONNX_INT8_FILE})
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+class LocalEmbeddings(Embeddings):
+    """
+    A sentence-transformers model run on CPU through one of BACKENDS.
+
+    Texts are sorted by length and grouped into batches of at most
+    `batch_size` texts and about `max_batch_tokens` padded tokens (estimated
+    from character counts), so short chunks are not padded to the length of
+    long ones and batches of short chunks grow larger. Vectors come back
+    normalized, in input order.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, backend="torch", batch_size=BATCH_SIZE,
+                 max_batch_tokens=MAX_BATCH_TOKENS):
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.model = _load_model(model_name, backend)
+
+    def _batches(self, texts):
+        """Index lists of texts to encode together, longest texts first."""
+        max_chars = self.model.max_seq_length * CHARS_PER_TOKEN
+        max_batch_chars = self.max_batch_tokens * CHARS_PER_TOKEN
+        lengths = [min(len(text), max_chars) for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: -lengths[i])
+        batches, batch = [], []
+        for i in order:
+            # The first text of a batch is its longest, so it sets the padded width.
+            if batch and (len(batch) >= self.batch_size
+                          or (len(batch) + 1) * lengths[batch[0]] > max_batch_chars):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _encode(self, texts):
+        with span("embedder.encode", backend=self.backend, texts=len(texts)) as encode_span:
+            vectors = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+            batches = self._batches(texts)
+            for batch in batches:
+                observe("embedder.batch_size", len(batch), backend=self.backend)
+                vectors[batch] = self.model.encode(
+                    [texts[i] for i in batch],
+                    batch_size=len(batch),
+                    normalize_embeddings=True,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+            encode_span.set(batches=len(batches))
+        return vectors
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+    def embed_queries(self, texts):
+        """Embed several questions in one batch; same vectors as embed_query."""
+        return self.embed_documents(texts)
+
+    def warm_up(self):
+        """Run one forward pass; the first is much slower than later ones."""
+        self._encode(["warm-up"])
+
+def get_embedder(model_name=MODEL_NAME, backend="torch", batch_size=BATCH_SIZE,
+                 cache_path=None, cache_max_entries=500000):
+    """
+    Return a local sentence-transformers embeddings instance (offline, no API needed).
+    Uses 'all-MiniLM-L6-v2' - a small, fast model - on the fp32 "torch" backend by default.
+    The model is loaded once per process and shared by every session.
+    With a cache_path, vectors are cached on disk by text hash and reused.
+    """
+    key = (model_name, backend, batch_size, cache_path)
+    with _embedders_lock:
+        if key not in _embedders:
+            embedder = LocalEmbeddings(model_name, backend=backend, batch_size=batch_size)
+            if cache_path:
+                cache = EmbeddingCache(cache_path, max_entries=cache_max_entries)
+                # Quantized backends give slightly different vectors, so they get their own keys.
+                cache_model = model_name if backend == "torch" else f"{model_name}:{backend}"
+                embedder = CachedEmbeddings(embedder, cache, cache_model)
+            _embedders[key] = embedder
+        return _embedders[key]
+
+def get_tokenizer(model_name=MODEL_NAME):
+    """
+    Return the fast HuggingFace tokenizer of an embedding model, loaded once per
+    process. The chunker uses it to measure chunks in the model's own tokens.
+    """
+    with _embedders_lock:
+        if model_name not in _tokenizers:
+            from transformers import AutoTokenizer
+            repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            _tokenizers[model_name] = AutoTokenizer.from_pretrained(repo_id, use_fast=True)
+        return _tokenizers[model_name]
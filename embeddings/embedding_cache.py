@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from telemetry import count
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of embedding vectors in SQLite.
+
+    Rows are keyed by a hash of the model name and the chunk text, so the same
+    text embedded by a different model never collides. Once the table holds more
+    than `max_entries` rows the least recently used tenth is evicted.
+    """
+
+    def __init__(self, path, max_entries=500000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model_name, text):
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        count("embedding_cache.lookups", len(found), result="hit")
+        count("embedding_cache.lookups", len(set(keys)) - len(found), result="miss")
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs and evict if the cache is over its bound."""
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                evict = self._count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (evict,)
+                )
+                self._count -= evict
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._count,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an embeddings model so cached chunk texts skip the forward pass
+    entirely. Queries are passed through uncached.
+    """
+
+    def __init__(self, embedder, cache, model_name):
+        self.embedder = embedder
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        keys = [EmbeddingCache.key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embedder.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed.items())
+            found.update({key: np.asarray(vector, dtype=np.float32) for key, vector in computed.items()})
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        # Questions rarely repeat verbatim and would evict chunk vectors; QaEngine
+        # memoizes its query vectors in memory (answer_cache.RetrievalCache).
+        return self.embedder.embed_query(text)
+
+    def embed_queries(self, texts):
+        """Batched embed_query, also uncached."""
+        if hasattr(self.embedder, "embed_queries"):
+            return self.embedder.embed_queries(texts)
+        return [self.embedder.embed_query(text) for text in texts]
+
+    def warm_up(self):
+        """Warm up the wrapped model, bypassing the cache."""
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
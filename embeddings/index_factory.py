@@ -0,0 +1,118 @@
+import math
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# How flat, hnsw and ivf_flat indexes store vectors: raw float32, half precision,
+# or one byte per dimension (scalar quantization, trained on the data).
+VECTOR_DTYPES = ("float32", "float16", "int8")
+SCALAR_QUANTIZERS = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+# "auto" picks an exact index for small corpora and trained approximate ones as they grow.
+AUTO_IVF_THRESHOLD = 50000
+AUTO_PQ_THRESHOLD = 500000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+TRAINING_POINTS_PER_LIST = 64
+
+
+def choose_index_type(index_type, count):
+    """Resolve "auto" to a concrete index type for a corpus of `count` vectors."""
+    if index_type != "auto":
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected auto or one of {INDEX_TYPES}")
+        return index_type
+    if count < AUTO_IVF_THRESHOLD:
+        return "flat"
+    if count < AUTO_PQ_THRESHOLD:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _nlist(count):
+    """Number of IVF lists: about 4 * sqrt(n), bounded so every list gets training points."""
+    return int(max(1, min(4 * math.sqrt(count), count // TRAINING_POINTS_PER_LIST, 65536)))
+
+
+def _pq_subquantizers(dim):
+    """Largest PQ sub-quantizer count dividing dim with at least 4 dimensions each."""
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dim % m == 0 and dim // m >= 4:
+            return m
+    return 1
+
+
+def new_flat_index(dim, vector_dtype="float32"):
+    """Exact inner-product index, with float16 codes unless vector_dtype is float32 (needs no training)."""
+    if vector_dtype == "float32":
+        return faiss.IndexFlatIP(dim)
+    return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+
+
+def build_index(index_type, dim, vectors, ids, vector_dtype="float32"):
+    """
+    Build an IndexIDMap2-wrapped inner-product index over normalized vectors.
+    `ids` are the rows of `vectors` to index (anything returning float32 rows
+    for an array of row numbers) and become the FAISS ids. Indexes that need
+    training (IVF, int8 codes) are trained on a sample of those rows first.
+    """
+    count = len(ids)
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype '{vector_dtype}', expected one of {VECTOR_DTYPES}")
+    qtype = SCALAR_QUANTIZERS.get(vector_dtype)
+    nlist = _nlist(count)
+    if index_type == "flat":
+        inner = faiss.IndexFlatIP(dim) if qtype is None \
+            else faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT) if qtype is None \
+            else faiss.IndexHNSWSQ(dim, qtype, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dim)
+        inner = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT) if qtype is None \
+            else faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dim)
+        inner = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'")
+
+    if not inner.is_trained:
+        sample_size = min(count, max(nlist * TRAINING_POINTS_PER_LIST, 256 * 40))
+        sample_ids = np.sort(np.random.default_rng(0).choice(ids, sample_size, replace=False)) \
+            if sample_size < count else ids
+        sample = vectors[sample_ids]
+        inner.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    index = faiss.IndexIDMap2(inner)
+    batch = 65536
+    for start in range(0, count, batch):
+        batch_ids = np.ascontiguousarray(ids[start:start + batch], dtype=np.int64)
+        index.add_with_ids(np.ascontiguousarray(vectors[batch_ids], dtype=np.float32), batch_ids)
+    return index
+
+
+def search_parameters(index, selector=None, nprobe=None, ef_search=None):
+    """SearchParameters matching the index type, with tuning knobs and an optional id filter."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    kwargs = {"sel": selector} if selector is not None else {}
+    if isinstance(inner, faiss.IndexIVF) and nprobe:
+        return faiss.SearchParametersIVF(nprobe=nprobe, **kwargs)
+    if isinstance(inner, faiss.IndexHNSW) and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=ef_search, **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
+
+def index_type_of(index):
+    """Name of the INDEX_TYPES entry an index was built as."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, (faiss.IndexIVFFlat, faiss.IndexIVFScalarQuantizer)):
+        return "ivf_flat"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
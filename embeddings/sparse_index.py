@@ -0,0 +1,237 @@
+import json
+import math
+import os
+import re
+from array import array
+import numpy as np
+
+# Keeps numbers, versions and hyphenated names whole: "0.87", "f1", "gpt-4o", "squad2.0".
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-_][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SparseIndex:
+    """
+    BM25 keyword index kept next to the vector index.
+
+    Posting lists are compact per-term arrays of uint32 doc ids and uint16 term
+    frequencies, appended as documents arrive. Ids are the vector store's row
+    numbers, so the same filters and tombstones apply to both indexes.
+
+    Searches are exact but pruned MaxScore-style: query terms are visited from
+    the highest score bound down, and once the k-th best score beats the
+    bounds of all terms left, documents only those terms contain cannot make
+    the top k, so their (long, low-idf) posting lists are only probed for the
+    candidates found so far instead of being scored in full.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._doc_lengths = array("I")
+        self._total_length = 0
+        # Documents with at least one token; removed documents are not counted.
+        self._doc_count = 0
+        # term -> (ids array, postings seen, max tf, min document length), for score bounds
+        self._bounds = {}
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, doc_id, text):
+        """Index one document. Ids must be added in increasing order."""
+        while len(self._doc_lengths) < doc_id:
+            self._doc_lengths.append(0)
+        tokens = tokenize(text)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("I"), array("H"))
+            postings[0].append(doc_id)
+            postings[1].append(min(count, 65535))
+        self._doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        if tokens:
+            self._doc_count += 1
+
+    def remove(self, doc_ids, texts=None):
+        """
+        Drop the postings of deleted documents and zero their lengths, so they
+        no longer count toward the average length. Ids stay allocated.
+        """
+        self.apply_removal(self.plan_removal(doc_ids, texts))
+
+    def plan_removal(self, doc_ids, texts=None):
+        """
+        Compute the posting lists of remove() without changing the index, so the
+        slow part can run under a shared lock and only apply_removal() needs an
+        exclusive one. Without the documents' `texts` every term is scanned.
+        """
+        doc_ids = np.unique(np.asarray(doc_ids, dtype=np.int64))
+        doc_ids = doc_ids[doc_ids < len(self._doc_lengths)]
+        if texts is None:
+            terms = list(self._postings) if len(doc_ids) else []
+        else:
+            terms = {term for text in texts for term in tokenize(text) if term in self._postings}
+        postings = {}
+        for term in terms:
+            ids, tfs = self._postings[term]
+            keep = np.isin(np.frombuffer(ids, dtype=np.uint32), doc_ids, invert=True)
+            if not keep.all():
+                # Postings appended after the plan are carried over by apply_removal().
+                postings[term] = (len(ids), array("I", np.frombuffer(ids, dtype=np.uint32)[keep].tobytes()),
+                                  array("H", np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes()))
+        return doc_ids, postings
+
+    def apply_removal(self, plan):
+        """Install a plan_removal() result; documents added since the plan are kept."""
+        doc_ids, postings = plan
+        if not len(doc_ids):
+            return
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)[doc_ids]
+        self._total_length -= int(lengths.sum())
+        self._doc_count -= int(np.count_nonzero(lengths))
+        for doc_id in doc_ids.tolist():
+            self._doc_lengths[doc_id] = 0
+        for term, (planned, ids, tfs) in postings.items():
+            current_ids, current_tfs = self._postings[term]
+            self._bounds.pop(term, None)
+            ids.extend(current_ids[planned:])
+            tfs.extend(current_tfs[planned:])
+            if ids:
+                self._postings[term] = (ids, tfs)
+            else:
+                del self._postings[term]
+
+    def indexed(self, doc_ids):
+        """Boolean mask of the ids that have postings, i.e. were added and not removed."""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        mask = doc_ids < len(self._doc_lengths)
+        mask[mask] = np.frombuffer(self._doc_lengths, dtype=np.uint32)[doc_ids[mask]] > 0
+        return mask
+
+    def _term_bound(self, term, ids, tfs, doc_lengths, average_length):
+        """
+        Upper bound of a term's BM25 weight (before idf) in any document: its
+        highest tf in its shortest document. The extremes are cached per term and
+        updated from postings appended since; remove() invalidates them.
+        """
+        ids_array = self._postings[term][0]
+        cached = self._bounds.get(term)
+        if cached is None or cached[0] is not ids_array:
+            cached = (ids_array, 0, 0, np.iinfo(np.uint32).max)
+        _, seen, max_tf, min_length = cached
+        if seen < len(ids):
+            max_tf = max(max_tf, int(tfs[seen:].max()))
+            min_length = min(min_length, int(doc_lengths[ids[seen:]].min()))
+            self._bounds[term] = (ids_array, len(ids), max_tf, min_length)
+        return max_tf * (self.k1 + 1) / (max_tf + self.k1 * (1 - self.b + self.b * min_length / average_length))
+
+    def search(self, query, k=10, allowed=None, excluded=None):
+        """
+        Return [(score, doc_id)] of the top k BM25 matches. `allowed` restricts
+        the result to an array of ids; `excluded` removes ids (e.g. tombstones).
+        """
+        if not self._doc_count or k <= 0:
+            return []
+        doc_count = self._doc_count
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        average_length = self._total_length / doc_count or 1.0
+
+        terms = []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            ids = np.frombuffer(postings[0], dtype=np.uint32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint16)
+            idf = math.log(1 + (doc_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            bound = idf * self._term_bound(term, ids, tfs, doc_lengths, average_length)
+            terms.append((bound, idf, ids, tfs))
+        if not terms:
+            return []
+        terms.sort(key=lambda item: -item[0])
+        # remaining[j]: the most a document found in none of terms[:j] can score
+        remaining = np.cumsum([bound for bound, _, _, _ in terms][::-1])[::-1]
+
+        def weights(idf, tfs, lengths):
+            tfs = tfs.astype(np.float32)
+            return idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lengths / average_length))
+
+        candidates = np.empty(0, dtype=np.uint32)
+        scores = np.empty(0, dtype=np.float64)
+        threshold = 0.0
+        for j, (_, idf, ids, tfs) in enumerate(terms):
+            if len(candidates) >= k and remaining[j] <= threshold:
+                break
+            # Ids are appended in increasing order, so posting lists are sorted.
+            new = ids[~np.isin(ids, candidates, assume_unique=True)] if len(candidates) else ids
+            if allowed is not None:
+                new = new[np.isin(new, allowed)]
+            if excluded is not None and len(excluded):
+                new = new[np.isin(new, excluded, invert=True)]
+            if not len(new):
+                continue
+            # New candidates are in none of the earlier terms; score them in this and every later one.
+            new_scores = np.zeros(len(new), dtype=np.float64)
+            lengths = doc_lengths[new]
+            for _, later_idf, later_ids, later_tfs in terms[j:]:
+                positions = np.searchsorted(later_ids, new)
+                found = positions < len(later_ids)
+                found[found] = later_ids[positions[found]] == new[found]
+                new_scores[found] += weights(later_idf, later_tfs[positions[found]], lengths[found])
+            candidates = np.concatenate([candidates, new])
+            scores = np.concatenate([scores, new_scores])
+            if len(scores) >= k:
+                threshold = float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+        if not len(candidates):
+            return []
+        top = np.argsort(-scores, kind="stable")[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), int(candidates[i])) for i in top]
+
+    def save(self, path):
+        """Write a snapshot atomically: term list plus concatenated posting arrays."""
+        terms = list(self._postings)
+        lengths = np.asarray([len(self._postings[t][0]) for t in terms], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        ids = np.concatenate([np.frombuffer(self._postings[t][0], dtype=np.uint32) for t in terms]) \
+            if terms else np.empty(0, dtype=np.uint32)
+        tfs = np.concatenate([np.frombuffer(self._postings[t][1], dtype=np.uint16) for t in terms]) \
+            if terms else np.empty(0, dtype=np.uint16)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.frombuffer(json.dumps(terms).encode("utf-8"), dtype=np.uint8),
+                offsets=offsets,
+                ids=ids,
+                tfs=tfs,
+                doc_lengths=np.frombuffer(self._doc_lengths, dtype=np.uint32),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, k1=1.2, b=0.75):
+        index = cls(k1=k1, b=b)
+        with np.load(path) as data:
+            terms = json.loads(data["terms"].tobytes().decode("utf-8"))
+            offsets, ids, tfs = data["offsets"], data["ids"], data["tfs"]
+            for i, term in enumerate(terms):
+                start, stop = offsets[i], offsets[i + 1]
+                index._postings[term] = (array("I", ids[start:stop].tobytes()), array("H", tfs[start:stop].tobytes()))
+            index._doc_lengths = array("I", data["doc_lengths"].tobytes())
+        doc_lengths = np.frombuffer(index._doc_lengths, dtype=np.uint32)
+        index._total_length = int(doc_lengths.sum())
+        index._doc_count = int(np.count_nonzero(doc_lengths))
+        del doc_lengths
+        return index
@@ -1,29 +1,862 @@
-from langchain_community.vectorstores import FAISS
-import numpy as np
-
-class VectorStore:
-    def __init__(self, embedder):
-        self.embedder = embedder
-        self.vectorstore = None
-
-    def add_documents(self, documents):
-        """
-        Add documents to the vector store.
-        """
-        if not documents:
-            return
-            
-        if self.vectorstore is None:
-            self.vectorstore = FAISS.from_documents(documents, self.embedder)
-        else:
-            texts = [doc.page_content for doc in documents]
-            metadatas = [doc.metadata for doc in documents]
-            self.vectorstore.add_texts(texts, metadatas=metadatas)
-
-    def similarity_search(self, query, k=5):
-        """
-        Search for similar documents.
-        """
-        if self.vectorstore is None:
-            return []
-        return self.vectorstore.similarity_search(query, k=k)
\ No newline at end of file
+import json
+import os
+import re
+import threading
+from array import array
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from .docstore import DocStore, MISSING
+from .index_factory import build_index, choose_index_type, index_type_of, new_flat_index, search_parameters
+from .sparse_index import SparseIndex
+from telemetry import span
+
+MANIFEST = "manifest.json"
+# Raw vectors are stored in the same precision as the index codes.
+VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+DOCSTORE = "docstore"
+LEGACY_DOCSTORE = "docstore.jsonl"
+TOMBSTONES = "tombstones.i64"
+BASE_INDEX = "base-{}.faiss"
+SPARSE_INDEX = "sparse.npz"
+
+# Filters with at most this many ids use an IDSelectorBatch, larger ones a bitmap.
+BATCH_SELECTOR_LIMIT = 4096
+
+# Rebuild the base snapshot once this fraction of its rows has been deleted.
+COMPACT_RATIO = 0.2
+
+ARXIV_ID_PATTERN = re.compile(r"(\d{4}\.\d{4,5})(v\d+)?")
+
+# Reciprocal-rank fusion constant: each list contributes 1 / (RRF_K + rank).
+RRF_K = 60
+
+# Per-document summaries are built from the chunks closest to this query; they
+# are picked when a document is added rather than on every summary request.
+OVERVIEW_QUERY = "document overview summary"
+OVERVIEW_CHUNKS = 5
+
+
+def _atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _new_index(dim, vector_dtype):
+    return faiss.IndexIDMap2(new_flat_index(dim, vector_dtype))
+
+
+class _StoredVectors:
+    """Rows of the raw vector file, decoded to float32 on access."""
+
+    def __init__(self, path, dim, vector_dtype):
+        storage = np.int8 if vector_dtype == "int8" else np.dtype(vector_dtype)
+        self._rows = np.memmap(path, dtype=storage, mode="r").reshape(-1, dim)
+        self._scale = 1 / 127 if vector_dtype == "int8" else None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        rows = np.asarray(self._rows[index], dtype=np.float32)
+        return rows * np.float32(self._scale) if self._scale else rows
+
+
+def read_vector_file(path, dim=None):
+    """All rows of a store's vector file as float32, in the precision its extension names.
+
+    The manifest next to the file, when there is one, supplies the dimension
+    and the committed row count; a torn tail past it is ignored.
+    """
+    dtypes = {name: dtype for dtype, name in VECTOR_FILES.items()}
+    vector_dtype = dtypes.get(os.path.basename(path))
+    if vector_dtype is None:
+        raise ValueError(f"{path}: expected one of {sorted(dtypes)}")
+    count = None
+    manifest_path = os.path.join(os.path.dirname(path), MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("vector_dtype", "float32") == vector_dtype:
+            dim, count = manifest["dim"], manifest["count"]
+    if dim is None:
+        raise ValueError(f"{path}: no manifest, so the dimension must be given")
+    return np.ascontiguousarray(_StoredVectors(path, dim, vector_dtype)[:count])
+
+
+def _encode_vectors(vectors, vector_dtype):
+    """Normalized float32 rows in the on-disk precision; int8 maps [-1, 1] to [-127, 127]."""
+    if vector_dtype == "int8":
+        return np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+    return vectors.astype(vector_dtype, copy=False)
+
+
+def _arxiv_id(metadata):
+    """ArXiv id from the metadata, or from a file name like 2401.12345v2.pdf."""
+    if metadata.get("arxiv_id"):
+        return metadata["arxiv_id"]
+    match = ARXIV_ID_PATTERN.search(os.path.basename(str(metadata.get("source", ""))))
+    return match.group(1) if match else None
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class VectorStore:
+    """
+    FAISS vector store, optionally persisted to index_dir.
+
+    Vector ids are row numbers. On disk the store is append-only:
+      vectors.f16     raw normalized rows (.f32 / .i8 for the other vector_dtypes)
+      docstore/       chunk text and columnar metadata (see docstore.DocStore)
+      tombstones.i64  ids removed by delete(), in deletion order
+      base-N.faiss    index snapshot of the first base_count rows, memory-mapped on load
+      sparse.npz      BM25 posting lists as of the last snapshot; newer rows are replayed
+      manifest.json   committed counts, replaced atomically after every append
+    Rows added after the snapshot live in a small in-memory flat delta index.
+
+    Deleted rows are removed from the delta index outright; the memory-mapped
+    snapshot keeps them, and a bitmap of tombstones filters them out of its
+    searches. The snapshot is rebuilt without them (compacted) once more than
+    `compact_ratio` of its rows are dead. Row ids stay stable, so the ledger's
+    ids remain valid; the raw vector and docstore files keep the deleted rows.
+
+    The snapshot is rebuilt on a background thread every `checkpoint_every` rows,
+    when too many of its rows were deleted, or when the corpus outgrows its index type. `index_type` is flat, hnsw,
+    ivf_flat, ivf_pq or auto (see index_factory.choose_index_type); approximate
+    indexes are retrained on every rebuild and tuned with `nprobe`/`ef_search`.
+    `vector_dtype` (float32, float16 or int8) sets the precision of the stored
+    vectors and index codes of new stores; existing stores keep theirs.
+    Without an index_dir everything stays in one in-memory flat index.
+
+    Every row is also added to a BM25 keyword index (sparse_index.SparseIndex);
+    hybrid_search_by_vector fuses both rankings for exact-token lookups.
+
+    One instance can be shared by every session in the process: searches take a
+    shared lock and run concurrently, writes take an exclusive one. With
+    `read_only` a persisted store is opened for searching only and its files are
+    left untouched, so a separate process (e.g. a batch job) can search the
+    index while the app keeps writing to it.
+    """
+
+    def __init__(self, embedder, index_dir=None, index_type="auto", checkpoint_every=50000,
+                 nprobe=16, ef_search=64, vector_dtype="float16", read_only=False,
+                 compact_ratio=COMPACT_RATIO):
+        self.embedder = embedder
+        self.index_dir = index_dir
+        self.read_only = read_only
+        self.index_type = index_type
+        self.checkpoint_every = checkpoint_every
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.vector_dtype = vector_dtype
+        self.compact_ratio = compact_ratio
+        self.dim = None
+        self._base = None
+        self._base_count = 0
+        self._base_generation = 0
+        self._base_type = None
+        self._rebuild_thread = None
+        self._rebuild_lock = threading.Lock()
+        self._delta = None
+        self._sparse = SparseIndex()
+        # Tombstones as a little-endian bitmap over row ids, for IDSelectorBitmap.
+        self._deleted_bits = np.zeros(0, dtype=np.uint8)
+        self._tombstones = 0
+        # Deleted rows still in the keyword index; the next rebuild removes them.
+        self._sparse_dead = np.empty(0, dtype=np.int64)
+        # Tombstones left out of the base snapshot (a prefix of the file), and
+        # deleted rows still in it.
+        self._compacted = 0
+        self._base_dead = 0
+        self._source_ids = {}
+        self._source_versions = {}
+        self._arxiv_sources = {}
+        self._overviews = {}
+        self._overview_vector = None
+        self._lock = ReadWriteLock()
+        # Bumped on every change to the corpus; caches key their entries on it.
+        self.version = 0
+
+        if index_dir:
+            if not read_only:
+                os.makedirs(index_dir, exist_ok=True)
+            self._load()
+        else:
+            self.docstore = DocStore()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _load(self):
+        manifest_path = self._path(MANIFEST)
+        if not os.path.exists(manifest_path):
+            self.docstore = DocStore() if self.read_only else DocStore(
+                self._path(DOCSTORE), {"rows": 0, "metadata_bytes": 0}
+            )
+            return
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        self.vector_dtype = manifest.get("vector_dtype", "float32")
+        count = manifest["count"]
+        if "docstore" in manifest:
+            self.docstore = DocStore(self._path(DOCSTORE), manifest["docstore"], read_only=self.read_only)
+        elif self.read_only:
+            raise RuntimeError(f"{self.index_dir} uses the old docstore format; open it once for writing to convert it")
+        else:
+            # Stores written before the columnar docstore: convert once.
+            self.docstore = DocStore(self._path(DOCSTORE), {"rows": 0, "metadata_bytes": 0})
+            self.docstore.import_jsonl(self._path(LEGACY_DOCSTORE), manifest["docstore_bytes"])
+            self._commit_manifest(manifest)
+            os.remove(self._path(LEGACY_DOCSTORE))
+
+        vectors_path = self._vectors_path()
+        row_bytes = self.dim * np.dtype(np.int8 if self.vector_dtype == "int8" else self.vector_dtype).itemsize
+        if not self.read_only and os.path.getsize(vectors_path) > count * row_bytes:
+            os.truncate(vectors_path, count * row_bytes)
+
+        tombstones = np.empty(0, dtype=np.int64)
+        tombstones_path = self._path(TOMBSTONES)
+        if os.path.exists(tombstones_path):
+            if not self.read_only:
+                os.truncate(tombstones_path, manifest["tombstones"] * 8)
+            tombstones = np.fromfile(tombstones_path, dtype=np.int64, count=manifest["tombstones"])
+            self._tombstones = len(tombstones)
+            self._mark_deleted(tombstones)
+
+        self._base_count = manifest["base_count"]
+        self._base_generation = manifest.get("base_generation", 0)
+        self._compacted = manifest.get("compacted", 0)
+        self._base_dead = int((tombstones[self._compacted:] < self._base_count).sum())
+        if self._base_count:
+            self._base = self._read_base(self._base_generation)
+            self._base_type = index_type_of(self._base)
+
+        self._index_rows()
+
+        self._delta = _new_index(self.dim, self.vector_dtype)
+        if count > self._base_count:
+            self._fill_delta(self._base_count, count)
+        self._load_sparse(count)
+        # The snapshot may predate the last compaction's removals.
+        self._sparse_dead = tombstones[self._sparse.indexed(tombstones)]
+
+    def _load_sparse(self, count):
+        """Load the keyword index snapshot and replay the live rows appended after it."""
+        sparse_path = self._path(SPARSE_INDEX)
+        if os.path.exists(sparse_path):
+            self._sparse = SparseIndex.load(sparse_path)
+            if len(self._sparse) > count:
+                self._sparse = SparseIndex()
+        replay_from = len(self._sparse)
+        for start in range(replay_from, count, 1024):
+            stop = min(start + 1024, count)
+            deleted = self._is_deleted(np.arange(start, stop, dtype=np.int64))
+            for doc_id, doc, dead in zip(range(start, stop), self.docstore.get(range(start, stop)), deleted):
+                self._sparse.add(doc_id, "" if dead else doc.page_content)
+        if count > replay_from and not self.read_only:
+            self._sparse.save(sparse_path)
+
+    def _read_base(self, generation):
+        return faiss.read_index(
+            self._path(BASE_INDEX.format(generation)),
+            faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+
+    def _vectors_path(self):
+        return self._path(VECTOR_FILES[self.vector_dtype])
+
+    def _stored_vectors(self):
+        return _StoredVectors(self._vectors_path(), self.dim, self.vector_dtype)
+
+    def _read_vectors(self, start, stop):
+        return np.ascontiguousarray(self._stored_vectors()[start:stop])
+
+    def _commit_manifest(self, manifest):
+        manifest = dict(manifest)
+        manifest.pop("docstore_bytes", None)
+        manifest["docstore"] = self.docstore.state()
+        _atomic_write_json(self._path(MANIFEST), manifest)
+
+    def _commit(self):
+        self._commit_manifest({
+            "dim": self.dim,
+            "vector_dtype": self.vector_dtype,
+            "count": len(self.docstore),
+            "base_count": self._base_count,
+            "base_generation": self._base_generation,
+            "tombstones": self._tombstones,
+            "compacted": self._compacted,
+        })
+
+    def _index_rows(self):
+        """Group all live rows by source from the docstore's interned metadata ids."""
+        metadata_ids = np.asarray(self.docstore.column("metadata_id"))
+        live = np.arange(len(metadata_ids), dtype=np.int64)
+        if self._tombstones:
+            live = live[~self._is_deleted(live)]
+        order = np.argsort(metadata_ids[live], kind="stable")
+        live, grouped_ids = live[order], metadata_ids[live][order]
+        boundaries = np.flatnonzero(np.diff(grouped_ids)) + 1
+        for rows in np.split(live, boundaries) if len(live) else []:
+            metadata = self.docstore.metadata_dicts()[metadata_ids[rows[0]]]
+            source = metadata.get("source", "unknown")
+            self._source_ids.setdefault(source, array("q")).extend(rows.tolist())
+            arxiv_id = _arxiv_id(metadata)
+            if arxiv_id:
+                self._arxiv_sources.setdefault(arxiv_id, set()).add(source)
+        for source, ids in self._source_ids.items():
+            self._source_ids[source] = array("q", sorted(ids))
+
+    def _index_row(self, doc_id, metadata):
+        """Record the filterable metadata of a new row: its source and arXiv id."""
+        source = metadata.get("source", "unknown")
+        self._source_ids.setdefault(source, array("q")).append(doc_id)
+        arxiv_id = _arxiv_id(metadata)
+        if arxiv_id:
+            self._arxiv_sources.setdefault(arxiv_id, set()).add(source)
+
+    def sources(self):
+        """Return the sources of all live documents."""
+        return list(self._source_ids)
+
+    def source_version(self, source):
+        """Corpus version at which this source last changed (0 if unchanged since load)."""
+        return self._source_versions.get(source, 0)
+
+    def is_empty(self):
+        return len(self) == 0
+
+    def __len__(self):
+        return len(self.docstore) - self._tombstones
+
+    def source_chunks(self):
+        """{source: number of live chunks} of every document."""
+        with self._lock.read():
+            return {source: len(ids) for source, ids in self._source_ids.items()}
+
+    def tombstone_ratio(self):
+        """Fraction of the base snapshot's rows that are deleted; compaction resets it."""
+        indexed = self._base.ntotal if self._base is not None else 0
+        return self._base_dead / indexed if indexed else 0.0
+
+    def add_documents(self, documents):
+        """
+        Add documents to the vector store.
+        Returns the ids assigned to the new vectors.
+        """
+        if not documents:
+            return []
+
+        texts = [doc.page_content for doc in documents]
+        vectors = np.asarray(self.embedder.embed_documents(texts), dtype=np.float32)
+        return self.add_embeddings(texts, vectors, [doc.metadata for doc in documents])
+
+    def add_embeddings(self, texts, vectors, metadatas, replace_ids=None):
+        """
+        Add precomputed embeddings with their text and metadata. `replace_ids`
+        are deleted in the same write, so searches never see both the old and
+        the new chunks of a replaced document, nor neither of them.
+        """
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        with span("vector_store.add", rows=len(texts), replaced=len(replace_ids or ())), self._lock.write():
+            ids = self._append(texts, vectors, metadatas)
+            if replace_ids:
+                self._delete(replace_ids)
+            if self.index_dir:
+                self._commit()
+                if self._needs_rebuild():
+                    self._start_rebuild()
+            return ids
+
+    def _append(self, texts, vectors, metadatas):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._delta = _new_index(self.dim, self.vector_dtype)
+
+        start = len(self.docstore)
+        ids = np.arange(start, start + len(texts), dtype=np.int64)
+
+        if self.index_dir:
+            with open(self._vectors_path(), "ab") as f:
+                f.write(_encode_vectors(vectors, self.vector_dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.docstore.append(texts, metadatas)
+        self._delta.add_with_ids(vectors, ids)
+        for doc_id, text in zip(ids.tolist(), texts):
+            self._sparse.add(doc_id, text)
+        for doc_id, metadata in zip(ids.tolist(), metadatas):
+            self._index_row(doc_id, metadata)
+        self.version += 1
+        touched = {metadata.get("source", "unknown") for metadata in metadatas}
+        for source in touched:
+            self._source_versions[source] = self.version
+        self._update_overviews(touched)
+        return ids.tolist()
+
+    def delete(self, ids):
+        """
+        Remove vectors by id, e.g. the chunks of a document being replaced.
+        Deleted ids are filtered out of every search. Returns the number of
+        rows deleted (ids deleted before are ignored).
+        """
+        return self._delete_and_commit(ids=ids)
+
+    def delete_source(self, source):
+        """Remove every chunk of one document. Returns the number of chunks removed."""
+        return self._delete_and_commit(source=source)
+
+    def _delete_and_commit(self, ids=None, source=None):
+        if self.read_only:
+            raise RuntimeError("VectorStore was opened read-only")
+        with span("vector_store.delete") as delete_span, self._lock.write():
+            if source is not None:
+                ids = list(self._source_ids.get(source, ()))
+            deleted = self._delete(ids)
+            delete_span.set(rows=deleted, tombstone_ratio=round(self.tombstone_ratio(), 4))
+            if deleted and self.index_dir:
+                self._commit()
+                if self._needs_rebuild():
+                    self._start_rebuild()
+            return deleted
+
+    def _delete(self, ids):
+        """Tombstone ids and drop them from the delta index; callers hold the write lock."""
+        ids_array = np.asarray(list(dict.fromkeys(int(i) for i in ids)), dtype=np.int64)
+        ids_array = ids_array[~self._is_deleted(ids_array)]
+        if not len(ids_array):
+            return 0
+        ids = ids_array.tolist()
+        if self.index_dir:
+            with open(self._path(TOMBSTONES), "ab") as f:
+                f.write(ids_array.tobytes())
+        self._tombstones += len(ids)
+        self._mark_deleted(ids_array)
+        self._sparse_dead = np.concatenate([self._sparse_dead, ids_array])
+        self._base_dead += int((ids_array < self._base_count).sum())
+        in_delta = ids_array[ids_array >= self._base_count]
+        if len(in_delta):
+            self._delta.remove_ids(faiss.IDSelectorBatch(in_delta))
+        self.version += 1
+        removed = {}
+        for doc_id in ids:
+            source = self.docstore.metadata(doc_id).get("source", "unknown")
+            removed.setdefault(source, set()).add(doc_id)
+        for source, doc_ids in removed.items():
+            self._source_versions[source] = self.version
+            remaining = array("q", (i for i in self._source_ids.get(source, ()) if i not in doc_ids))
+            if remaining:
+                self._source_ids[source] = remaining
+            else:
+                self._source_ids.pop(source, None)
+        self._update_overviews(removed)
+        return len(ids)
+
+    def _mark_deleted(self, ids):
+        if not len(ids):
+            return
+        size = (int(ids.max()) >> 3) + 1
+        if size > len(self._deleted_bits):
+            # Grow geometrically; the bitmap is replaced, never resized in place, under the write lock.
+            grown = np.zeros(max(size, 2 * len(self._deleted_bits)), dtype=np.uint8)
+            grown[:len(self._deleted_bits)] = self._deleted_bits
+            self._deleted_bits = grown
+        np.bitwise_or.at(self._deleted_bits, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+    def _is_deleted(self, ids):
+        """Boolean mask of the tombstoned entries of an id array."""
+        bits = self._deleted_bits
+        mask = np.zeros(len(ids), dtype=bool)
+        in_range = ids < len(bits) * 8
+        covered = ids[in_range]
+        mask[in_range] = (bits[covered >> 3] >> (covered & 7)) & 1
+        return mask
+
+    def _fill_delta(self, start, stop):
+        """Load rows [start, stop) from the vector file into the delta index, except deleted ones."""
+        ids = np.arange(start, stop, dtype=np.int64)
+        live = ~self._is_deleted(ids)
+        self._delta.add_with_ids(np.ascontiguousarray(self._read_vectors(start, stop)[live]), ids[live])
+
+    def _needs_rebuild(self):
+        if self._delta.ntotal >= self.checkpoint_every:
+            return True
+        if self._base is not None and self.tombstone_ratio() > self.compact_ratio:
+            return True
+        wanted = choose_index_type(self.index_type, len(self))
+        return self._base_type is not None and wanted != self._base_type
+
+    def _start_rebuild(self):
+        """Rebuild the base snapshot on a background thread unless one is running."""
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(target=self._rebuild, daemon=True)
+        self._rebuild_thread.start()
+
+    def checkpoint(self, index_type=None):
+        """
+        Fold the delta rows into a new base snapshot now, optionally forcing an
+        index type. Waits for a running background rebuild first.
+        """
+        if self._rebuild_thread is not None:
+            self._rebuild_thread.join()
+        self._rebuild(index_type)
+
+    def _rebuild(self, index_type=None):
+        """
+        Build (and for IVF, train) a new base index over all live rows, write it
+        to a new generation file and swap it in. Only the swap holds the write
+        lock; searches keep using the old snapshot while the new one is built.
+        """
+        if not self.index_dir or self.dim is None or self.read_only:
+            return
+        with self._rebuild_lock:
+            with self._lock.read():
+                count = len(self.docstore)
+                tombstones = self._tombstones
+                live = np.flatnonzero(~self._is_deleted(np.arange(count, dtype=np.int64)))
+                dropped = self._sparse_dead
+                compacting = self._base_dead
+            if count == self._base_count and not compacting and index_type is None:
+                return
+            kind = choose_index_type(index_type or self.index_type, len(live))
+
+            vectors = self._stored_vectors()
+            with span("vector_store.build_index", index_type=kind, rows=len(live), compacted=compacting):
+                index = build_index(kind, self.dim, vectors, live, self.vector_dtype)
+            generation = self._base_generation + 1
+            tmp_path = self._path(BASE_INDEX.format(generation) + ".tmp")
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, self._path(BASE_INDEX.format(generation)))
+            del index, vectors
+            base = self._read_base(generation)
+            # Rows deleted before the snapshot leave the keyword index too; only the swap installs it.
+            with self._lock.read():
+                texts = [doc.page_content for doc in self.docstore.get(dropped.tolist())]
+                sparse_removal = self._sparse.plan_removal(dropped, texts)
+
+            with self._lock.write():
+                old_generation = self._base_generation
+                self._base = base
+                self._base_count = count
+                self._base_generation = generation
+                self._base_type = kind
+                self._delta = _new_index(self.dim, self.vector_dtype)
+                total = len(self.docstore)
+                if total > count:
+                    self._fill_delta(count, total)
+                # Tombstones written since the snapshot was taken may still be in the new base.
+                self._compacted = tombstones
+                newer = self._sparse_dead[len(dropped):]
+                self._base_dead = int((newer < count).sum())
+                self._sparse.apply_removal(sparse_removal)
+                self._sparse_dead = newer
+                self._commit()
+
+            with self._lock.read():
+                self._sparse.save(self._path(SPARSE_INDEX))
+
+            try:
+                os.remove(self._path(BASE_INDEX.format(old_generation)))
+            except OSError:
+                pass  # never written, or still mapped on Windows
+
+    def _filter_ids(self, sources=None, pages=None, arxiv_ids=None):
+        """
+        Live ids matching the filters, or None when no filter is given.
+        `pages` is an inclusive (first, last) range of 0-based page numbers;
+        a chunk matches when its pages (page to page_end) overlap it.
+        """
+        if sources is None and pages is None and arxiv_ids is None:
+            return None
+        if arxiv_ids is not None:
+            arxiv_sources = set()
+            for arxiv_id in arxiv_ids:
+                arxiv_sources.update(self._arxiv_sources.get(ARXIV_ID_PATTERN.sub(r"\1", arxiv_id), ()))
+            sources = arxiv_sources if sources is None else arxiv_sources.intersection(sources)
+
+        if sources is not None:
+            id_lists = [self._source_ids[source] for source in sources if source in self._source_ids]
+            ids = np.concatenate(id_lists).astype(np.int64) if id_lists else np.empty(0, dtype=np.int64)
+        else:
+            ids = np.arange(len(self.docstore), dtype=np.int64)
+            if self._tombstones:
+                ids = ids[~self._is_deleted(ids)]
+
+        if pages is not None:
+            first, last = pages
+            page_numbers = self.docstore.column("page")[ids]
+            page_ends = self.docstore.column("page_end")[ids]
+            page_ends = np.where(page_ends == MISSING, page_numbers, page_ends)
+            ids = ids[(page_numbers <= last) & (page_ends >= first) & (page_numbers != MISSING)]
+        return ids
+
+    def _search(self, vectors, k, allowed=None):
+        """
+        Search base and delta segments and merge into (score, id) hits per query.
+        `allowed` (from _filter_ids) is applied inside FAISS through an IDSelector.
+        Without it, only the base needs a filter: the tombstone bitmap, negated.
+        """
+        selector = base_selector = None
+        if allowed is not None:
+            if not len(allowed):
+                return [[] for _ in range(len(vectors))]
+            if len(allowed) <= BATCH_SELECTOR_LIMIT:
+                selector = faiss.IDSelectorBatch(allowed)
+            else:
+                mask = np.zeros(len(self.docstore), dtype=bool)
+                mask[allowed] = True
+                bitmap = np.packbits(mask, bitorder="little")  # must outlive the search
+                selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+            base_selector = selector
+        elif self._base_dead:
+            deleted_bits = self._deleted_bits  # must outlive the search
+            deleted_selector = faiss.IDSelectorBitmap(len(deleted_bits) * 8, faiss.swig_ptr(deleted_bits))
+            base_selector = faiss.IDSelectorNot(deleted_selector)
+
+        results = []
+        for index, index_selector in ((self._base, base_selector), (self._delta, selector)):
+            if index is None or index.ntotal == 0:
+                continue
+            index_params = search_parameters(index, index_selector, nprobe=self.nprobe, ef_search=self.ef_search)
+            scores, ids = index.search(vectors, min(k, index.ntotal), params=index_params)
+            results.append((scores, ids))
+
+        merged = []
+        for row in range(len(vectors)):
+            hits = []
+            for scores, ids in results:
+                hits.extend((float(s), int(i)) for s, i in zip(scores[row], ids[row]) if i != -1)
+            hits.sort(key=lambda hit: -hit[0])
+            merged.append(hits[:k])
+        return merged
+
+    def _documents(self, id_lists):
+        """Documents for several hit lists, reading each distinct id from the docstore once."""
+        unique = list(dict.fromkeys(doc_id for ids in id_lists for doc_id in ids))
+        by_id = dict(zip(unique, self.docstore.get(unique)))
+        return [[by_id[doc_id] for doc_id in ids] for ids in id_lists]
+
+    @staticmethod
+    def _query_matrix(vectors):
+        queries = np.array(vectors, dtype=np.float32, ndmin=2)
+        faiss.normalize_L2(queries)
+        return queries
+
+    def similarity_search_with_score_by_vector(self, vector, k=5, sources=None, pages=None, arxiv_ids=None):
+        """
+        Return (Document, cosine score) pairs. The search can be restricted to
+        `sources` (e.g. the set a session has selected), an inclusive `pages`
+        range, or a list of `arxiv_ids`.
+        """
+        return self.similarity_search_with_score_by_vectors([vector], k, sources, pages, arxiv_ids)[0]
+
+    def similarity_search_with_score_by_vectors(self, vectors, k=5, sources=None, pages=None, arxiv_ids=None):
+        """
+        Batched similarity_search_with_score_by_vector: all query vectors go
+        through one FAISS search and every distinct hit is read once.
+        Returns one list of (Document, score) pairs per vector.
+        """
+        if not len(vectors):
+            return []
+        queries = self._query_matrix(vectors)
+        with span("vector_store.search", queries=len(queries), k=k) as search_span:
+            with self._lock.read():
+                if self.dim is None:
+                    return [[] for _ in range(len(queries))]
+                hits = self._search(queries, k, self._filter_ids(sources, pages, arxiv_ids))
+                docs = self._documents([[doc_id for _, doc_id in row] for row in hits])
+            search_span.set(hits=sum(len(row) for row in hits))
+        return [[(doc, score) for doc, (score, _) in zip(row_docs, row)] for row_docs, row in zip(docs, hits)]
+
+    def hybrid_search_by_vector(self, query, vector, k=5, fetch_k=None, sources=None, pages=None,
+                                arxiv_ids=None):
+        """
+        Fuse the dense ranking for `vector` with the BM25 ranking for the `query`
+        text by reciprocal-rank fusion. Each side contributes its top `fetch_k`
+        hits (default 4 * k). Returns (Document, fused score) pairs and accepts
+        the same filters as similarity_search_with_score_by_vector.
+        """
+        return self.hybrid_search_by_vectors([query], [vector], k, fetch_k, sources, pages, arxiv_ids)[0]
+
+    def hybrid_search_by_vectors(self, queries, vectors, k=5, fetch_k=None, sources=None, pages=None,
+                                 arxiv_ids=None):
+        """
+        Batched hybrid_search_by_vector for parallel lists of query texts and
+        vectors: one FAISS search for all dense rankings, one BM25 search per
+        query, and each distinct hit read once. Returns one list per query.
+        """
+        if not len(queries):
+            return []
+        fetch_k = fetch_k or max(4 * k, 20)
+        query_vectors = self._query_matrix(vectors)
+        with span("vector_store.hybrid_search", queries=len(queries), k=k, fetch_k=fetch_k):
+            with self._lock.read():
+                if self.dim is None:
+                    return [[] for _ in queries]
+                allowed = self._filter_ids(sources, pages, arxiv_ids)
+                if allowed is not None and not len(allowed):
+                    return [[] for _ in queries]
+                dense = self._search(query_vectors, fetch_k, allowed)
+                excluded = self._sparse_dead if allowed is None and len(self._sparse_dead) else None
+
+                tops = []
+                for query, dense_hits in zip(queries, dense):
+                    sparse_hits = self._sparse.search(query, fetch_k, allowed=allowed, excluded=excluded)
+                    fused = {}
+                    for hits in (dense_hits, sparse_hits):
+                        for rank, (_, doc_id) in enumerate(hits):
+                            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+                    tops.append(sorted(fused.items(), key=lambda item: -item[1])[:k])
+                docs = self._documents([[doc_id for doc_id, _ in top] for top in tops])
+        return [[(doc, score) for doc, (_, score) in zip(row_docs, top)] for row_docs, top in zip(docs, tops)]
+
+    def hybrid_search(self, query, k=5, **filters):
+        """Hybrid keyword + vector search for a query string."""
+        if self.is_empty():
+            return []
+        vector = self.embedder.embed_query(query)
+        return [doc for doc, _ in self.hybrid_search_by_vector(query, vector, k=k, **filters)]
+
+    def similarity_search_with_score(self, query, k=5, **filters):
+        if self.is_empty():
+            return []
+        vector = self.embedder.embed_query(query)
+        return self.similarity_search_with_score_by_vector(vector, k=k, **filters)
+
+    def similarity_search(self, query, k=5, **filters):
+        """
+        Search for similar documents.
+        Accepts the same `sources`, `pages` and `arxiv_ids` filters.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **filters)]
+
+    def _vectors_for(self, ids):
+        if self.index_dir:
+            return self._stored_vectors()[ids]
+        return self._delta.reconstruct_batch(ids)
+
+    def _embed_unit(self, query):
+        query_vector = np.asarray(self.embedder.embed_query(query), dtype=np.float32)
+        return query_vector / (np.linalg.norm(query_vector) or 1.0)
+
+    def _top_of_source(self, source, query_vector, k):
+        """Ids of the `k` rows of one document closest to a unit query vector."""
+        ids = np.asarray(self._source_ids[source], dtype=np.int64)
+        scores = self._vectors_for(ids) @ query_vector
+        return ids[np.argsort(-scores)[:k]].tolist()
+
+    def _update_overviews(self, sources):
+        """Pick the overview chunks of changed documents; callers hold the write lock."""
+        if self._overview_vector is None:
+            self._overview_vector = self._embed_unit(OVERVIEW_QUERY)
+        for source in sources:
+            if source in self._source_ids:
+                self._overviews[source] = self._top_of_source(source, self._overview_vector, OVERVIEW_CHUNKS)
+            else:
+                self._overviews.pop(source, None)
+
+    def similarity_search_by_source(self, query, k_per_doc=5, sources=None):
+        """
+        Top `k_per_doc` chunks of every document, as {source: [Document, ...]}.
+        Each document is scored against its own rows only, so the cost depends
+        on the document's size, not the corpus size, and no document is dropped.
+        """
+        if self.is_empty():
+            return {}
+        query_vector = self._embed_unit(query)
+
+        with self._lock.read():
+            selected = self._selected_sources(sources)
+            id_lists = [self._top_of_source(source, query_vector, k_per_doc) for source in selected]
+            return dict(zip(selected, self._documents(id_lists)))
+
+    def overview_chunks(self, k_per_doc=OVERVIEW_CHUNKS, sources=None):
+        """
+        similarity_search_by_source(OVERVIEW_QUERY, ...) without the search: the
+        overview chunks of a document are picked when it is added, so this only
+        reads them. Documents loaded from disk get theirs on first use.
+        """
+        if k_per_doc > OVERVIEW_CHUNKS:
+            return self.similarity_search_by_source(OVERVIEW_QUERY, k_per_doc, sources)
+        if self.is_empty():
+            return {}
+        with self._lock.read():
+            missing = [source for source in self._selected_sources(sources) if source not in self._overviews]
+        if missing:
+            self._pick_overviews(missing)
+        with self._lock.read():
+            selected = [source for source in self._selected_sources(sources) if source in self._overviews]
+            id_lists = [self._overviews[source][:k_per_doc] for source in selected]
+            return dict(zip(selected, self._documents(id_lists)))
+
+    def _selected_sources(self, sources):
+        return [source for source in (sources if sources is not None else list(self._source_ids))
+                if self._source_ids.get(source)]
+
+    def _pick_overviews(self, sources):
+        """
+        Pick the overview chunks of documents loaded from disk. They are scored
+        under the read lock and published under the write lock, unless the
+        document changed in between and a write picked them already.
+        """
+        overview_vector = self._overview_vector
+        if overview_vector is None:
+            overview_vector = self._embed_unit(OVERVIEW_QUERY)
+        with self._lock.read():
+            picked = {
+                source: (self.source_version(source), self._top_of_source(source, overview_vector, OVERVIEW_CHUNKS))
+                for source in sources if self._source_ids.get(source)
+            }
+        with self._lock.write():
+            if self._overview_vector is None:
+                self._overview_vector = overview_vector
+            for source, (version, ids) in picked.items():
+                if self.source_version(source) == version:
+                    self._overviews.setdefault(source, ids)
@@ -1,14 +1,180 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-def chunk_documents(documents, chunk_size=2000, chunk_overlap=200):
-    """
-    Split documents into chunks using character-based splitting.
-    Chunk size is in characters (roughly 500 tokens = 2000 characters).
-    """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, 
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", " ", ""]
-    )
-    chunks = text_splitter.split_documents(documents)
-    return chunks
\ No newline at end of file
+import bisect
+import itertools
+import time
+import numpy as np
+from langchain_core.documents import Document
+from telemetry import record_span
+
+# Sizes are in tokens of the embedding model's tokenizer. MiniLM reads at most
+# 256 tokens including [CLS] and [SEP], so longer chunks would be truncated.
+CHUNK_SIZE = 254
+CHUNK_OVERLAP = 32
+
+# Pages tokenized per batch call.
+PAGE_BATCH = 16
+
+# A chunk ends at a paragraph or sentence break when one falls in this final
+# fraction of the token window; otherwise it is cut at the window edge.
+BOUNDARY_WINDOW = 0.3
+
+SENTENCE_ENDS = (".", "!", "?", ":", ";")
+
+
+class _DocumentChunker:
+    """
+    Token windows over the pages of one document, treated as one continuous
+    text so paragraphs crossing a page break stay together. Only the tokens
+    and text not yet emitted are kept in memory.
+    """
+
+    def __init__(self, metadata, chunk_size, chunk_overlap):
+        self.source = metadata.get("source")
+        self.metadata = {k: v for k, v in metadata.items() if k != "page"}
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._text = ""
+        self._text_offset = 0   # document offset of self._text[0]
+        self._length = 0        # document length so far
+        self._starts = np.empty(0, dtype=np.int64)  # document offsets of the pending tokens
+        self._ends = np.empty(0, dtype=np.int64)
+        self._page_offsets = []
+        self._page_numbers = []
+
+    def add_page(self, page, offsets):
+        """Append a page's text and its tokenizer offset mapping."""
+        separator = "\n" if self._page_offsets else ""
+        page_offset = self._length + len(separator)
+        self._page_offsets.append(page_offset)
+        self._page_numbers.append(page.metadata.get("page", len(self._page_numbers)))
+        self._text += separator + page.page_content
+        self._length = page_offset + len(page.page_content)
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        offsets = offsets[offsets[:, 1] > offsets[:, 0]] + page_offset
+        self._starts = np.concatenate([self._starts, offsets[:, 0]])
+        self._ends = np.concatenate([self._ends, offsets[:, 1]])
+
+    def _cut(self, limit):
+        """Number of tokens to put in the next chunk, preferring structural breaks."""
+        earliest = max(1, int(limit * (1 - BOUNDARY_WINDOW)))
+        starts = (self._starts[earliest:limit + 1] - self._text_offset).tolist()
+        ends = (self._ends[earliest:limit + 1] - self._text_offset).tolist()
+        text = self._text
+        gaps = [text[ends[j]:starts[j + 1]] for j in range(len(starts) - 1)]
+        for j in range(len(gaps) - 1, -1, -1):
+            if "\n\n" in gaps[j]:
+                return earliest + j + 1
+        for j in range(len(gaps) - 1, -1, -1):
+            if text[ends[j] - 1:ends[j]] in SENTENCE_ENDS and gaps[j][:1].isspace():
+                return earliest + j + 1
+        return limit
+
+    def _page_at(self, offset):
+        return self._page_numbers[bisect.bisect_right(self._page_offsets, offset) - 1]
+
+    def emit(self, final=False):
+        """
+        Cut full windows off the pending tokens. A window is only cut once a
+        token past it has been seen, so breaks can be chosen; `final` also
+        flushes the remainder.
+        """
+        chunks = []
+        while len(self._starts) > self.chunk_size or (final and len(self._starts)):
+            if len(self._starts) > self.chunk_size:
+                count = self._cut(self.chunk_size)
+            else:
+                count = len(self._starts)
+            start, end = int(self._starts[0]), int(self._ends[count - 1])
+            chunks.append(Document(
+                page_content=self._text[start - self._text_offset:end - self._text_offset],
+                metadata={
+                    **self.metadata,
+                    "page": self._page_at(start),
+                    "page_end": self._page_at(end - 1),
+                    "start_index": start,
+                    "end_index": end,
+                    "tokens": count,
+                }
+            ))
+            if count == len(self._starts):
+                self._starts, self._ends = self._starts[:0], self._ends[:0]
+                break
+            drop = count - self.chunk_overlap if count > self.chunk_overlap else count
+            self._starts, self._ends = self._starts[drop:], self._ends[drop:]
+
+        trim_to = int(self._starts[0]) if len(self._starts) else self._length
+        self._text = self._text[trim_to - self._text_offset:]
+        self._text_offset = trim_to
+        return chunks
+
+
+def iter_chunks(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, tokenizer=None, model_name=None):
+    """
+    Chunk a stream of page documents lazily into windows of at most
+    `chunk_size` tokenizer tokens, overlapping by `chunk_overlap` tokens.
+    Consecutive pages of the same source are chunked as one text. Pages are
+    tokenized in batches with a fast tokenizer's offset mapping, and each
+    batch's finished chunks are yielded as a list before more pages are read.
+
+    Chunk metadata keeps the page metadata and adds the page span ("page" and
+    "page_end") and character offsets into the document ("start_index" and
+    "end_index", with pages joined by a newline).
+
+    Without a `tokenizer`, the one of embedding model `model_name` is used
+    (default embedder.MODEL_NAME).
+    """
+    if tokenizer is None:
+        from embeddings.embedder import get_tokenizer
+        tokenizer = get_tokenizer(model_name) if model_name else get_tokenizer()
+
+    documents = iter(documents)
+    chunker = None
+    # Time spent in this generator only, not in reading pages or in the consumer.
+    timings = {"tokenize": 0.0, "chunk": 0.0}
+    pages = emitted = 0
+    try:
+        while True:
+            batch = list(itertools.islice(documents, PAGE_BATCH))
+            if not batch:
+                break
+            started = time.perf_counter()
+            encodings = tokenizer(
+                [doc.page_content for doc in batch],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                verbose=False
+            )["offset_mapping"]
+            tokenized = time.perf_counter()
+            timings["tokenize"] += tokenized - started
+
+            chunks = []
+            for doc, offsets in zip(batch, encodings):
+                if chunker is None or doc.metadata.get("source") != chunker.source:
+                    if chunker is not None:
+                        chunks.extend(chunker.emit(final=True))
+                    chunker = _DocumentChunker(doc.metadata, chunk_size, chunk_overlap)
+                chunker.add_page(doc, offsets)
+            chunks.extend(chunker.emit())
+            timings["chunk"] += time.perf_counter() - tokenized
+            pages += len(batch)
+            emitted += len(chunks)
+            if chunks:
+                yield chunks
+
+        if chunker is not None:
+            chunks = chunker.emit(final=True)
+            emitted += len(chunks)
+            if chunks:
+                yield chunks
+    finally:
+        record_span("chunker.tokenize", timings["tokenize"], pages=pages)
+        record_span("chunker.chunk", timings["chunk"], pages=pages, chunks=emitted)
+
+
+def chunk_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, tokenizer=None,
+                    model_name=None):
+    """
+    Split documents into chunks of at most `chunk_size` tokens.
+    See iter_chunks for the metadata each chunk carries.
+    """
+    chunks = iter_chunks(documents, chunk_size, chunk_overlap, tokenizer, model_name)
+    return [chunk for page_chunks in chunks for chunk in page_chunks]
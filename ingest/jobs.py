@@ -0,0 +1,373 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from .ledger import content_hash, file_hash
+from .pipeline import ingest_files
+
+# queued -> running -> indexed | skipped | failed | cancelled; indexed | skipped -> removed
+ACTIVE = ("queued", "running")
+FINISHED = ("indexed", "skipped", "failed", "cancelled", "removed")
+# Finished jobs that are only queued again when asked to.
+RETRYABLE = ("failed", "cancelled", "removed")
+
+JOB_BATCH_SIZE = 8
+
+
+@dataclass
+class Job:
+    """One PDF to ingest: an uploaded file spooled to disk, or a URL to download."""
+    id: str
+    kind: str  # "file" or "url"
+    name: str
+    source: str  # spool path or URL
+    status: str = "queued"
+    chunks: int = 0
+    embedded: int = 0
+    error: Optional[str] = None
+    created: float = 0.0
+    updated: float = 0.0
+
+    @property
+    def progress(self):
+        """Fraction done, from the embedded chunk count while running."""
+        if self.status in FINISHED:
+            return 1.0
+        return self.embedded / self.chunks if self.chunks else 0.0
+
+
+class IngestionJobQueue:
+    """
+    Background ingestion: PDFs are submitted as jobs and ingested by a pool of
+    worker threads, so the caller only polls for status.
+
+    Jobs live in a SQLite table next to the index; uploads are spooled to
+    `spool_dir` until they are ingested. Jobs that were running when the process
+    stopped go back to the queue on startup. A file job's id is its content hash
+    and a URL job's id is the hash of the URL, so submitting the same thing again
+    returns the existing job. A job that failed, was cancelled or whose document
+    was removed stays that way until it is retried, with `retry` or by submitting
+    it with `retry=True`; the upload of a failed or cancelled job is kept for that.
+
+    Each worker claims up to `batch_size` queued jobs and ingests them together
+    with `ingest_files` (parsing them in `parse_workers` processes), so a large
+    drop of papers is embedded in big batches. The URL jobs of a batch are
+    downloaded concurrently, through `fetch_cache` when given.
+    """
+
+    def __init__(self, vector_store, ledger=None, path=None, spool_dir=None, workers=1,
+                 batch_size=JOB_BATCH_SIZE, parse_workers=None, settings=None, model_name=None,
+                 fetch_cache=None):
+        self.vector_store = vector_store
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.parse_workers = parse_workers
+        self.settings = settings
+        self.model_name = model_name
+        self.fetch_cache = fetch_cache
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="ingest-spool-")
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._cancelled = set()
+        self._running_names = set()
+        self._closed = False
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, source TEXT NOT NULL, "
+            "status TEXT NOT NULL, chunks INTEGER NOT NULL DEFAULT 0, "
+            "embedded INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        # Interrupted by a restart; ingestion is idempotent, so run them again.
+        self._conn.execute("UPDATE jobs SET status = 'queued', chunks = 0, embedded = 0 WHERE status = 'running'")
+        self._conn.commit()
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # Submitting and polling
+
+    def submit_file(self, name, data, retry=False):
+        """
+        Queue PDF bytes for ingestion. Returns the job id. A failed, cancelled
+        or removed job for the same bytes is only queued again with `retry`.
+        """
+        job_id = content_hash(data, self.settings)
+        spool_path = os.path.join(self.spool_dir, f"{job_id}.pdf")
+        indexed = self.ledger is not None and self.ledger.is_indexed(job_id)
+        with self._lock:
+            existing = self._get(job_id)
+            if existing and (existing.status in ACTIVE or (existing.status in RETRYABLE and not retry)
+                             or (existing.status in ("indexed", "skipped") and indexed)):
+                return job_id
+            if not os.path.exists(spool_path):
+                tmp_path = f"{spool_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, spool_path)
+            status = "skipped" if indexed else "queued"
+            self._put(Job(job_id, "file", name, spool_path, status=status))
+            if status == "skipped":
+                os.remove(spool_path)
+            self._wake.notify()
+        return job_id
+
+    def submit_url(self, url, name=None, retry=False):
+        """
+        Queue a PDF URL to download and ingest. Returns the job id. A failed,
+        cancelled or removed job for the same URL is only queued again with `retry`.
+        """
+        job_id = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        with self._lock:
+            existing = self._get(job_id)
+            if existing and not (retry and existing.status in RETRYABLE):
+                return job_id
+            self._put(Job(job_id, "url", name or url.rstrip("/").split("/")[-1], url))
+            self._wake.notify()
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns False if it had already finished."""
+        with self._lock:
+            job = self._get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+            else:
+                self._cancelled.add(job_id)
+            return True
+
+    def retry(self, job_id):
+        """
+        Queue a failed, cancelled or removed job again. Returns False if it is
+        not one of those, or if it is a file job whose upload is gone.
+        """
+        with self._lock:
+            job = self._get(job_id)
+            if job is None or job.status not in RETRYABLE:
+                return False
+            if job.kind == "file" and not os.path.exists(job.source):
+                return False
+            self._update(job_id, status="queued", chunks=0, embedded=0, error=None)
+            self._wake.notify()
+            return True
+
+    def remove_document(self, name):
+        """
+        Delete an indexed document's chunks from the store and forget it in the
+        ledger, so it can be added again later; its jobs are marked removed so
+        that submitting it again does not bring it back. Returns the number of
+        chunks removed, or None while a job for the same document is running.
+        """
+        with self._lock:
+            if name in self._running_names:
+                return None
+            # Keeps a worker from claiming a new version of it meanwhile.
+            self._running_names.add(name)
+        try:
+            entry = self.ledger.forget(name) if self.ledger is not None else None
+            removed = self.vector_store.delete(entry["ids"]) if entry else 0
+            removed += self.vector_store.delete_source(name)
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'removed', updated = ? WHERE name = ? AND status IN ('indexed', 'skipped')",
+                    (time.time(), name)
+                )
+                self._conn.commit()
+            return removed
+        finally:
+            with self._lock:
+                self._running_names.discard(name)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._get(job_id)
+
+    def jobs(self, limit=50):
+        """Most recent jobs first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [Job(*row) for row in rows]
+
+    def active(self):
+        """Jobs that are queued or running, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status IN (?, ?) ORDER BY created", ACTIVE
+            ).fetchall()
+        return [Job(*row) for row in rows]
+
+    def clear_finished(self):
+        """Forget finished jobs, and the uploads kept for retrying them."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT source FROM jobs WHERE kind = 'file' AND status IN ({','.join('?' * len(RETRYABLE))})",
+                RETRYABLE
+            ).fetchall()
+            for (source,) in rows:
+                if os.path.exists(source):
+                    os.remove(source)
+            self._conn.execute(f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))})", FINISHED)
+            self._conn.commit()
+
+    def close(self):
+        """Stop the workers after their current batch."""
+        with self._lock:
+            self._closed = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    # Storage; callers hold self._lock
+
+    _COLUMNS = "id, kind, name, source, status, chunks, embedded, error, created, updated"
+
+    def _get(self, job_id):
+        row = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(*row) if row else None
+
+    def _put(self, job):
+        job.created = job.updated = time.time()
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO jobs ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.kind, job.name, job.source, job.status, job.chunks, job.embedded,
+             job.error, job.created, job.updated)
+        )
+        self._conn.commit()
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        self._conn.commit()
+
+    def _finish(self, job, status, error=None):
+        self._update(job.id, status=status, error=error)
+        self._cancelled.discard(job.id)
+        # The upload of a failed or cancelled job is kept so it can be retried.
+        if job.kind == "file" and status not in RETRYABLE and os.path.exists(job.source):
+            os.remove(job.source)
+
+    def _finish_running(self, job, status, error=None):
+        """Finish a claimed job and free its document name for removal or a newer version."""
+        self._finish(job, status, error)
+        self._running_names.discard(job.name)
+
+    # Workers
+
+    def _claim(self):
+        """Mark up to batch_size queued jobs as running, at most one per document name."""
+        rows = self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created"
+        ).fetchall()
+        claimed = []
+        for row in rows:
+            job = Job(*row)
+            # Two versions of one document must not replace each other's vectors concurrently.
+            if job.name in self._running_names:
+                continue
+            self._running_names.add(job.name)
+            self._update(job.id, status="running", chunks=0, embedded=0, error=None)
+            claimed.append(job)
+            if len(claimed) == self.batch_size:
+                break
+        return claimed
+
+    def _work(self):
+        while True:
+            with self._lock:
+                claimed = self._claim()
+                while not claimed and not self._closed:
+                    self._wake.wait(timeout=1.0)
+                    claimed = self._claim()
+                if not claimed:
+                    return
+            try:
+                self._run(claimed)
+            finally:
+                with self._lock:
+                    # Finished jobs released their names already, possibly to a newer job.
+                    for job in claimed:
+                        current = self._get(job.id)
+                        if current is not None and current.status == "running":
+                            self._running_names.discard(job.name)
+
+    def _download(self, jobs, download_dir):
+        """Fetch the PDFs of URL jobs concurrently. Returns {job id: (path, error)}."""
+        if not jobs:
+            return {}
+        from tools.arxiv_tool import download_pdfs
+        results = download_pdfs([job.source for job in jobs], save_dir=download_dir, cache=self.fetch_cache)
+        return {job.id: result for job, result in zip(jobs, results)}
+
+    def _run(self, claimed):
+        jobs = {job.name: job for job in claimed}
+        files = []
+        download_dir = tempfile.mkdtemp(dir=self.spool_dir)
+        try:
+            downloads = self._download([job for job in claimed if job.kind == "url"], download_dir)
+            for job in claimed:
+                try:
+                    path, error = downloads.get(job.id, (job.source, None))
+                    if error:
+                        raise RuntimeError(error)
+                    # A file job's id is already the content hash of its upload.
+                    digest = job.id if job.kind == "file" else file_hash(path, self.settings)
+                except Exception as e:
+                    with self._lock:
+                        self._finish_running(job, "failed", str(e))
+                    continue
+                # Parsed from disk; the chunks are labelled with the job name, not the path.
+                files.append((job.name, path, digest))
+
+            def on_progress(status):
+                job = jobs[status.name]
+                with self._lock:
+                    if status.status in FINISHED:
+                        self._finish_running(job, status.status, status.error)
+                    else:
+                        self._update(job.id, chunks=status.chunks, embedded=status.embedded)
+
+            def cancelled(name):
+                return jobs[name].id in self._cancelled
+
+            if files:
+                ingest_files(
+                    files,
+                    self.vector_store,
+                    self.ledger,
+                    workers=self.parse_workers,
+                    on_progress=on_progress,
+                    model_name=self.model_name,
+                    cancelled=cancelled
+                )
+        except Exception as e:
+            with self._lock:
+                for job in claimed:
+                    current = self._get(job.id)
+                    if current and current.status == "running":
+                        self._finish_running(job, "failed", str(e))
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+
+def content_hash(data, settings=None):
+    """
+    Hash the raw PDF bytes, optionally salted with the ingest settings.
+    Changing the chunker or embedder settings changes the hash, so the file is re-indexed.
+    """
+    digest = hashlib.sha256(data)
+    if settings:
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_hash(path, settings=None, block_size=1 << 20):
+    """`content_hash` of a file on disk, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    if settings:
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IngestionLedger:
+    """
+    Record of the PDFs that are already in the vector store.
+
+    Each entry maps a document name to its content hash and the vector ids written
+    for it. Lookups by hash are O(1), so unchanged files are skipped on every rerun,
+    and the stored ids let a changed file replace its old vectors instead of appending.
+
+    Entries live in a SQLite table (in memory without a path), one row per
+    document with its ids packed as int64, so recording a document writes only
+    that row; names and hashes are also kept in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._hashes = {}
+        self._by_hash = {}
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, hash TEXT NOT NULL, ids BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        for name, digest in self._conn.execute("SELECT name, hash FROM documents"):
+            self._hashes[name] = digest
+            self._by_hash[digest] = name
+
+    def is_indexed(self, digest):
+        """Return True if content with this hash is already in the index."""
+        return digest in self._by_hash
+
+    def get(self, name):
+        """Return the entry for a document name, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT hash, ids FROM documents WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return {"hash": row[0], "ids": np.frombuffer(row[1], dtype=np.int64).tolist()}
+
+    def record(self, name, digest, ids):
+        """Register a document as indexed under the given vector ids."""
+        self.record_many([(name, digest, ids)])
+
+    def record_many(self, entries):
+        """record() for several (name, digest, ids) entries in one transaction."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (name, hash, ids) VALUES (?, ?, ?)",
+                [(name, digest, np.asarray(ids, dtype=np.int64).tobytes()) for name, digest, ids in entries]
+            )
+            self._conn.commit()
+            for name, digest, _ in entries:
+                previous = self._hashes.get(name)
+                if previous:
+                    self._by_hash.pop(previous, None)
+                self._hashes[name] = digest
+                self._by_hash[digest] = name
+
+    def forget(self, name):
+        """Drop a document from the ledger and return its entry."""
+        entry = self.get(name)
+        if entry:
+            with self._lock:
+                self._conn.execute("DELETE FROM documents WHERE name = ?", (name,))
+                self._conn.commit()
+                self._hashes.pop(name, None)
+                self._by_hash.pop(entry["hash"], None)
+        return entry
+
+    def names(self):
+        return list(self._hashes)
+
+    def __len__(self):
+        return len(self._hashes)
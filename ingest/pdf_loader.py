@@ -1,9 +1,61 @@
-from langchain_community.document_loaders import PyMuPDFLoader
-
-def load_pdf(file_path):
-    """
-    Load a PDF file and return a list of Document objects with page content and metadata.
-    """
-    loader = PyMuPDFLoader(file_path)
-    documents = loader.load()
-    return documents
\ No newline at end of file
+import io
+import time
+from langchain_core.documents import Document
+from telemetry import record_span
+
+METADATA_KEYS = ("format", "title", "author", "subject", "keywords", "creator", "producer",
+                 "creationDate", "modDate", "trapped")
+
+
+def _open_pdf(source):
+    """Open a PDF from a path, raw bytes or a binary buffer such as an upload."""
+    import pymupdf  # imported on first use to keep app startup fast
+    if isinstance(source, (bytes, bytearray, memoryview, io.BytesIO)):
+        return pymupdf.open(stream=source, filetype="pdf")
+    if hasattr(source, "read"):
+        return pymupdf.open(stream=source.read(), filetype="pdf")
+    return pymupdf.open(source)
+
+
+def iter_pdf_pages(source, name=None):
+    """
+    Yield one Document per page, extracting text lazily so only the current
+    page is held in memory. `source` is a file path, bytes or a binary buffer;
+    `name` is used as the document source when there is no path.
+    Metadata matches PyMuPDFLoader (source, file_path, page, total_pages, ...).
+    """
+    # Only the time spent here counts, not the consumer's work between pages.
+    elapsed = 0.0
+    started = time.perf_counter()
+    pdf = _open_pdf(source)
+    label = name or (source if isinstance(source, str) else "unknown")
+    pages = 0
+    try:
+        info = {key: pdf.metadata.get(key, "") for key in METADATA_KEYS} if pdf.metadata else {}
+        for page_number in range(pdf.page_count):
+            page = pdf.load_page(page_number)
+            document = Document(
+                page_content=page.get_text(),
+                metadata={
+                    "source": label,
+                    "file_path": label,
+                    "page": page_number,
+                    "total_pages": pdf.page_count,
+                    **info,
+                }
+            )
+            del page
+            pages += 1
+            elapsed += time.perf_counter() - started
+            yield document
+            started = time.perf_counter()
+    finally:
+        pdf.close()
+        record_span("pdf.parse", elapsed, source=label, pages=pages)
+
+
+def load_pdf(file_path):
+    """
+    Load a PDF file and return a list of Document objects with page content and metadata.
+    """
+    return list(iter_pdf_pages(file_path))
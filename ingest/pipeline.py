@@ -0,0 +1,252 @@
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+import numpy as np
+from .pdf_loader import iter_pdf_pages
+from .chunker import iter_chunks
+from telemetry import span
+
+EMBED_BATCH_SIZE = 256
+
+
+@dataclass
+class FileStatus:
+    """Progress and outcome of one file in an ingestion run."""
+    name: str
+    source: Union[str, bytes]  # file path or the PDF bytes
+    digest: Optional[str] = None
+    status: str = "queued"  # queued, parsing, embedding, indexed, skipped, failed, cancelled
+    chunks: int = 0
+    embedded: int = 0
+    error: Optional[str] = None
+    ids: List[int] = field(default_factory=list)
+
+
+def _iter_parsed(source, name, model_name=None):
+    """
+    Stream one PDF page by page, yielding the chunks of each page as
+    (text, metadata) tuples, so only the current page is held in memory.
+    The chunks are labelled with `name`, whether `source` is a path or bytes.
+    Chunks are sized with the tokenizer of embedding model `model_name`.
+    """
+    pages = iter_pdf_pages(source, name)
+    found = False
+    for chunks in iter_chunks(pages, model_name=model_name):
+        found = True
+        yield [(chunk.page_content, chunk.metadata) for chunk in chunks]
+    if not found:
+        raise ValueError("No text content extracted")
+
+
+def _parse_pdf(source, name, model_name=None):
+    """Load and chunk one PDF. Runs in a worker process, so it returns plain tuples."""
+    return [chunk for chunks in _iter_parsed(source, name, model_name) for chunk in chunks]
+
+
+def _embed_worker(embedder, chunk_queue, events, batch_size, out):
+    """
+    Pull per-file chunk lists off the queue and embed them in fixed-size
+    batches that span file boundaries. Results land in `out[name]`.
+    """
+    pending = []  # (name, text) pairs waiting for a full batch
+
+    def flush(batch):
+        names = [name for name, _ in batch]
+        try:
+            vectors = np.asarray(embedder.embed_documents([text for _, text in batch]), dtype=np.float32)
+        except Exception as e:
+            for name in set(names):
+                events.put((name, "failed", str(e)))
+            return
+        for name, vector in zip(names, vectors):
+            out[name].append(vector)
+        for name in set(names):
+            events.put((name, "embedded", names.count(name)))
+
+    while True:
+        item = chunk_queue.get()
+        if item is None:
+            break
+        name, texts = item
+        pending.extend((name, text) for text in texts)
+        while len(pending) >= batch_size:
+            flush(pending[:batch_size])
+            del pending[:batch_size]
+    if pending:
+        flush(pending)
+    events.put((None, "done", None))
+
+
+def ingest_files(files, vector_store, ledger=None, workers=None,
+                 batch_size=EMBED_BATCH_SIZE, on_progress=None, model_name=None, cancelled=None):
+    """
+    Parse, chunk, embed and index several PDFs at once.
+
+    `files` is a list of (name, source, digest) tuples, where source is a file
+    path or the PDF bytes; files whose digest is already in the ledger are
+    skipped. With one worker, pages are streamed into the embedder as they are
+    read; otherwise PDFs are parsed in a process pool while a
+    background thread embeds the chunks in batches of `batch_size`, fed through a
+    bounded queue. All vectors are inserted into the store in one call at the end.
+    `on_progress(status)` is called on the calling thread after every change.
+    `model_name` is the embedding model whose tokenizer sizes the chunks.
+    `cancelled(name)` is polled between pages and before the insert; a file it
+    returns True for is dropped without touching the store or the ledger.
+    Returns the list of FileStatus objects.
+    """
+    with span("ingest.files", files=len(files)) as ingest_span:
+        results = _ingest_files(files, vector_store, ledger, workers, batch_size, on_progress,
+                                model_name, cancelled)
+        outcomes = {}
+        for status in results:
+            outcomes[status.status] = outcomes.get(status.status, 0) + 1
+        ingest_span.set(chunks=sum(status.chunks for status in results), **outcomes)
+    return results
+
+
+def _ingest_files(files, vector_store, ledger, workers, batch_size, on_progress, model_name, cancelled):
+    statuses = {name: FileStatus(name, source, digest) for name, source, digest in files}
+
+    def report(status):
+        if on_progress:
+            on_progress(status)
+
+    def check_cancelled(status):
+        if status.status == "cancelled":
+            return True
+        if cancelled is None or status.status == "failed" or not cancelled(status.name):
+            return False
+        status.status = "cancelled"
+        report(status)
+        return True
+
+    todo = []
+    for status in statuses.values():
+        if ledger is not None and status.digest and ledger.is_indexed(status.digest):
+            status.status = "skipped"
+            report(status)
+        else:
+            todo.append(status)
+    if not todo:
+        return list(statuses.values())
+
+    texts = {status.name: [] for status in todo}
+    metadatas = {status.name: [] for status in todo}
+    vectors = {status.name: [] for status in todo}
+    chunk_queue = queue.Queue(maxsize=8)
+    events = queue.Queue()
+    # Run in a copy of this context so the embedder's spans nest under ingest.files.
+    embed_thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_embed_worker, vector_store.embedder, chunk_queue, events, batch_size, vectors),
+        daemon=True
+    )
+    embed_thread.start()
+
+    def drain_events(block=False):
+        done = False
+        while True:
+            try:
+                name, kind, value = events.get(timeout=0.1) if block else events.get_nowait()
+            except queue.Empty:
+                return done
+            if kind == "done":
+                done = True
+                continue
+            status = statuses[name]
+            if status.status in ("failed", "cancelled"):
+                continue
+            if kind == "failed":
+                status.status = "failed"
+                status.error = value
+            else:
+                status.embedded += value
+            report(status)
+
+    def hand_off(status, parsed):
+        batch = [text for text, _ in parsed]
+        texts[status.name].extend(batch)
+        metadatas[status.name].extend(metadata for _, metadata in parsed)
+        status.chunks += len(parsed)
+        status.status = "embedding"
+        report(status)
+        while True:
+            try:
+                chunk_queue.put((status.name, batch), timeout=0.1)
+                return
+            except queue.Full:
+                drain_events()
+
+    def fail(status, error):
+        status.status = "failed"
+        status.error = str(error)
+        report(status)
+
+    for status in todo:
+        status.status = "parsing"
+        report(status)
+
+    workers = workers or min(len(todo), os.cpu_count() or 1)
+    if workers <= 1:
+        for status in todo:
+            try:
+                for parsed in _iter_parsed(status.source, status.name, model_name):
+                    if check_cancelled(status):
+                        break
+                    hand_off(status, parsed)
+            except Exception as e:
+                fail(status, e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {
+                pool.submit(_parse_pdf, status.source, status.name, model_name): status for status in todo
+            }
+            while pending:
+                finished, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future, status in list(pending.items()):
+                    if future not in finished and check_cancelled(status):
+                        future.cancel()
+                        del pending[future]
+                for future in finished:
+                    status = pending.pop(future)
+                    if check_cancelled(status):
+                        continue
+                    try:
+                        hand_off(status, future.result())
+                    except Exception as e:
+                        fail(status, e)
+                drain_events()
+
+    chunk_queue.put(None)
+    while not drain_events(block=True):
+        pass
+    embed_thread.join()
+
+    ready = [status for status in todo if status.status == "embedding" and not check_cancelled(status)]
+    if ready:
+        all_texts, all_metadatas, all_vectors, replaced = [], [], [], []
+        for status in ready:
+            all_texts.extend(texts[status.name])
+            all_metadatas.extend(metadatas[status.name])
+            all_vectors.extend(vectors[status.name])
+            previous = ledger.get(status.name) if ledger is not None and status.digest else None
+            if previous:
+                replaced.extend(previous["ids"])
+        # Older versions of these documents go out in the same write as the new ones come in.
+        ids = vector_store.add_embeddings(all_texts, np.vstack(all_vectors), all_metadatas, replace_ids=replaced)
+
+        offset = 0
+        for status in ready:
+            status.ids = ids[offset:offset + status.chunks]
+            offset += status.chunks
+        if ledger is not None:
+            ledger.record_many([(status.name, status.digest, status.ids) for status in ready if status.digest])
+        for status in ready:
+            status.status = "indexed"
+            report(status)
+
+    return list(statuses.values())
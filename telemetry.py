@@ -0,0 +1,232 @@
+"""
+Lightweight tracing and metrics for the ingest and answer paths.
+
+    with span("vector_store.search", k=k) as s:
+        ...
+        s.set(hits=len(hits))
+    count("embedding_cache.lookups", hits, result="hit")
+    observe("embedder.batch_size", len(batch))
+
+Spans nest per thread/task and record their duration and attributes; every
+finished span is also observed in the `span_seconds` histogram. Finished root
+spans (with their children) are kept in a small ring for the UI, appended to a
+JSONL log when one is configured, and handed to any active `capture()`.
+Counters and histograms are exported in the Prometheus text format, over HTTP
+when a port is configured.
+"""
+import bisect
+import contextlib
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the histogram buckets; span durations are in seconds, the
+# other histograms (tokens, batch sizes) share the same wide geometric range.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+RECENT_TRACES = 50
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_captures = contextvars.ContextVar("telemetry_captures", default=())
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_recent = deque(maxlen=RECENT_TRACES)
+_log_path = None
+_server = None
+
+
+class Span:
+    """One timed operation; children are the spans opened inside it."""
+
+    __slots__ = ("name", "attributes", "start", "seconds", "children")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.seconds = None
+        self.children = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "start": round(self.start, 6),
+            "ms": round(self.seconds * 1000, 3) if self.seconds is not None else None,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+    def flatten(self, depth=0):
+        """(depth, span) pairs of this span and its descendants, depth first."""
+        yield depth, self
+        for child in self.children:
+            yield from child.flatten(depth + 1)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """Add to a counter."""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record one value in a histogram."""
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+        histogram["buckets"][bisect.bisect_left(BUCKETS, value)] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def _finish(span, parent):
+    observe("span_seconds", span.seconds, span=span.name)
+    if parent is not None:
+        parent.children.append(span)
+        return
+    with _lock:
+        _recent.append(span)
+        log_path = _log_path
+    for captured in _captures.get():
+        captured.append(span)
+    if log_path:
+        line = json.dumps(span.to_dict(), default=str)
+        with _lock, open(log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a span, nested under the current one."""
+    current = Span(name, attributes)
+    parent = _current.get()
+    _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        # Not reset(token): a span left open inside a generator may be closed from another context.
+        _current.set(parent)
+        _finish(current, parent)
+
+
+def record_span(name, seconds, **attributes):
+    """
+    Record an already measured span under the current one, for work that is
+    not one contiguous block, such as the time spent inside a generator.
+    """
+    finished = Span(name, attributes)
+    finished.start = time.time() - seconds
+    finished.seconds = seconds
+    _finish(finished, _current.get())
+
+
+@contextlib.contextmanager
+def capture():
+    """Collect the root spans finished in the enclosed block (on this thread) into a list."""
+    spans = []
+    token = _captures.set(_captures.get() + (spans,))
+    try:
+        yield spans
+    finally:
+        _captures.reset(token)
+
+
+def recent_traces(limit=20):
+    """The most recently finished root spans, newest first."""
+    with _lock:
+        return list(itertools.islice(reversed(_recent), limit))
+
+
+def counter_value(name, **labels):
+    with _lock:
+        return _counters.get((name, _label_key(labels)), 0)
+
+
+def _metric_name(name):
+    return "doc_agent_" + name.replace(".", "_").replace("-", "_")
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+def render_prometheus():
+    """All counters and histograms in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, dict(h, buckets=list(h["buckets"]))) for key, h in _histograms.items())
+    typed = set()
+    for (name, labels), value in counters:
+        metric = _metric_name(name) + "_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in histograms:
+        metric = _metric_name(name)
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ("+Inf",), histogram["buckets"]):
+            cumulative += bucket
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def configure(log_path=None, prometheus_port=None, prometheus_host="127.0.0.1"):
+    """
+    Turn on the exporters: append finished root spans to `log_path` as JSON
+    lines, and serve /metrics on `prometheus_host`:`prometheus_port` from a
+    daemon thread (local only by default; "0.0.0.0" for every interface).
+    Safe to call more than once; the server is started only once per process.
+    """
+    global _log_path, _server
+    with _lock:
+        _log_path = log_path or None
+        start_server = prometheus_port and _server is None
+        if start_server:
+            _server = ThreadingHTTPServer((prometheus_host, int(prometheus_port)), _MetricsHandler)
+    if start_server:
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+TOPICS = {
+    "alpha.pdf": "transformer attention accuracy benchmark results",
+    "beta.pdf": "graph neural network citation dataset training",
+    "gamma.pdf": "reinforcement learning reward policy robot control",
+}
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    """Installs the offline RegexTokenizer as the embedding model's tokenizer."""
+    from benchmarks.pipeline_bench import RegexTokenizer
+    from embeddings import embedder
+    regex_tokenizer = RegexTokenizer()
+    monkeypatch.setitem(embedder._tokenizers, embedder.MODEL_NAME, regex_tokenizer)
+    return regex_tokenizer
+
+
+@pytest.fixture
+def embedder():
+    from benchmarks.pipeline_bench import HashEmbeddings
+    return HashEmbeddings(dim=32, buckets=1024)
+
+
+def add_documents(store, chunks_per_source=6, sources=TOPICS):
+    """Add a few pages of words per source; returns {source: ids}."""
+    ids = {}
+    for source, words in sources.items():
+        texts = [f"{words} section {i} page {i} {source}" for i in range(chunks_per_source)]
+        metadatas = [{"source": source, "page": i} for i in range(chunks_per_source)]
+        vectors = np.asarray(store.embedder.embed_documents(texts), dtype=np.float32)
+        ids[source] = store.add_embeddings(texts, vectors, metadatas)
+    return ids
@@ -0,0 +1,65 @@
+import numpy as np
+from agent import answer_cache
+from agent.answer_cache import AnswerCache, DocumentSummaryCache, RetrievalCache
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_answer_cache_matches_near_duplicate_questions():
+    cache = AnswerCache(threshold=0.95)
+    cache.put(unit(1, 0, 0), "factual", 1, "answer", scope=("a.pdf",))
+    assert cache.get(unit(1, 0.05, 0), "factual", 1, scope=("a.pdf",)) == "answer"
+    assert cache.get(unit(1, 1, 0), "factual", 1, scope=("a.pdf",)) is None
+    assert cache.get(unit(1, 0, 0), "summary", 1, scope=("a.pdf",)) is None
+    assert cache.get(unit(1, 0, 0), "factual", 1) is None
+    assert cache.stats() == {"hits": 1, "misses": 3, "hit_rate": 0.25, "entries": 1}
+
+
+def test_answer_cache_is_dropped_when_the_corpus_changes():
+    cache = AnswerCache()
+    cache.put(unit(1, 0), "factual", 1, "old")
+    assert cache.get(unit(1, 0), "factual", 2) is None
+    assert cache.stats()["entries"] == 0
+    cache.put(unit(1, 0), "factual", 1, "stale")  # generated before the change
+    assert cache.get(unit(1, 0), "factual", 2) is None
+
+
+def test_answer_cache_evicts_and_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    for i, vector in enumerate([unit(1, 0, 0), unit(0, 1, 0), unit(0, 0, 1)]):
+        cache.put(vector, "factual", 1, f"answer {i}")
+    assert cache.get(unit(1, 0, 0), "factual", 1) is None
+    assert cache.get(unit(0, 1, 0), "factual", 1) == "answer 1"
+    now[0] += 61
+    assert cache.get(unit(0, 0, 1), "factual", 1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_summary_cache_is_keyed_on_the_source_version():
+    cache = DocumentSummaryCache(max_entries=1)
+    cache.put("a.pdf", 3, "summary")
+    assert cache.get("a.pdf", 3) == "summary"
+    assert cache.get("a.pdf", 4) is None
+    cache.put("b.pdf", 1, "other")
+    assert cache.get("a.pdf", 3) is None
+
+
+def test_retrieval_cache_keeps_vectors_and_drops_plans_on_a_new_version():
+    cache = RetrievalCache()
+    cache.put_vector("What  is\nthe accuracy?", [1.0, 0.0])
+    assert cache.get_vector("What is the accuracy?") == [1.0, 0.0]
+
+    cache.put_plan("What is the accuracy?", "factual", 5, None, 1, "plan")
+    assert cache.get_plan(" What is the accuracy? ", "factual", 5, None, 1) == "plan"
+    assert cache.get_plan("What is the accuracy?", "factual", 8, None, 1) is None
+    assert cache.get_plan("What is the accuracy?", "factual", 5, ("a.pdf",), 1) is None
+
+    assert cache.get_plan("What is the accuracy?", "factual", 5, None, 2) is None
+    cache.put_plan("What is the accuracy?", "factual", 5, None, 1, "stale")
+    assert cache.get_plan("What is the accuracy?", "factual", 5, None, 2) is None
+    assert cache.get_vector("What is the accuracy?") == [1.0, 0.0]
@@ -0,0 +1,28 @@
+import time
+from tools.arxiv_tool import TokenBucket, _filename_for
+
+
+def test_filenames_are_unique_per_url():
+    urls = [
+        "https://arxiv.org/pdf/2301.00001v1",
+        "https://arxiv.org/pdf/2301.00001v2",
+        "https://example.com/download?id=1",
+        "https://example.com/download?id=2",
+        "https://example.com/papers/report.pdf",
+        "https://mirror.example.org/papers/report.pdf",
+    ]
+    names = [_filename_for(url) for url in urls]
+    assert len(set(names)) == len(urls)
+    assert all(name.endswith(".pdf") and "/" not in name for name in names)
+    assert names[0].startswith("2301.00001v1-") and names[1].startswith("2301.00001v2-")
+    assert names[4].startswith("report-")
+    assert _filename_for(urls[0]) == names[0]
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # The first request uses the initial token, the other three wait 1/50 s each.
+    assert time.monotonic() - started >= 3 / 50 * 0.9
@@ -0,0 +1,83 @@
+import random
+from langchain_core.documents import Document
+from benchmarks.pipeline_bench import RegexTokenizer
+from ingest import chunker
+from ingest.chunker import chunk_documents, iter_chunks
+
+TOKENIZER = RegexTokenizer()
+
+
+def pages(source="paper.pdf", count=5, seed=0):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(50)]
+    result = []
+    for page in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(1, 4)):
+            sentences = [" ".join(rng.choices(words, k=rng.randint(3, 15))) + "." for _ in range(rng.randint(1, 5))]
+            paragraphs.append(" ".join(sentences))
+        result.append(Document(page_content="\n\n".join(paragraphs), metadata={"source": source, "page": page}))
+    return result
+
+
+def token_spans(text):
+    return TOKENIZER([text])["offset_mapping"][0]
+
+
+def test_chunks_are_token_windows_with_document_offsets():
+    documents = pages(count=12)
+    text = "\n".join(doc.page_content for doc in documents)
+    page_starts = [0]
+    for doc in documents[:-1]:
+        page_starts.append(page_starts[-1] + len(doc.page_content) + 1)
+    tokens = token_spans(text)
+
+    chunks = chunk_documents(documents, chunk_size=40, chunk_overlap=8, tokenizer=TOKENIZER)
+    assert len(chunks) > 5
+    first_token = {token_start: i for i, (token_start, _) in enumerate(tokens)}
+    next_token = 0
+    for chunk in chunks:
+        start, end = chunk.metadata["start_index"], chunk.metadata["end_index"]
+        assert chunk.page_content == text[start:end]
+        assert len(token_spans(chunk.page_content)) == chunk.metadata["tokens"] <= 40
+        assert chunk.metadata["page"] == max(i for i, offset in enumerate(page_starts) if offset <= start)
+        assert chunk.metadata["page_end"] == max(i for i, offset in enumerate(page_starts) if offset < end)
+        assert chunk.metadata["source"] == "paper.pdf"
+        # Each window starts chunk_overlap tokens before the end of the previous one.
+        assert first_token[start] == max(0, next_token - 8)
+        next_token = first_token[start] + chunk.metadata["tokens"]
+    assert next_token == len(tokens)
+    assert any(chunk.metadata["page_end"] > chunk.metadata["page"] for chunk in chunks)
+
+
+def test_windows_end_at_paragraph_and_sentence_breaks():
+    chunks = chunk_documents(pages(count=12), chunk_size=40, chunk_overlap=8, tokenizer=TOKENIZER)
+    cut = [chunk for chunk in chunks[:-1] if chunk.metadata["tokens"] < 40]
+    assert cut
+    for chunk in cut:
+        assert chunk.page_content.endswith(".")
+
+
+def test_streaming_matches_one_batch(monkeypatch):
+    documents = pages(count=40) + pages(source="other.pdf", count=3, seed=1)
+    expected = chunk_documents(documents, chunk_size=30, chunk_overlap=5, tokenizer=TOKENIZER)
+    monkeypatch.setattr(chunker, "PAGE_BATCH", 1)
+    batches = list(iter_chunks(iter(documents), chunk_size=30, chunk_overlap=5, tokenizer=TOKENIZER))
+    assert len(batches) > 1
+    assert [chunk for batch in batches for chunk in batch] == expected
+    # Offsets restart for every document.
+    other = [chunk for chunk in expected if chunk.metadata["source"] == "other.pdf"]
+    assert other[0].metadata["start_index"] == 0 and other[0].metadata["page"] == 0
+
+
+def test_short_and_empty_pages(tokenizer):
+    documents = [
+        Document(page_content="", metadata={"source": "short.pdf", "page": 0}),
+        Document(page_content="Only a few words here.", metadata={"source": "short.pdf", "page": 1}),
+    ]
+    chunks = chunk_documents(documents)  # the embedding model's tokenizer, here RegexTokenizer
+    assert len(chunks) == 1
+    assert chunks[0].page_content == "Only a few words here."
+    assert chunks[0].metadata["page"] == chunks[0].metadata["page_end"] == 1
+    assert chunks[0].metadata["tokens"] == 6
+    assert chunk_documents([Document(page_content="  ", metadata={"source": "blank.pdf"})]) == []
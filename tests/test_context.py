@@ -0,0 +1,22 @@
+from langchain_core.documents import Document
+from agent.context import ContextPacker
+
+
+def chunk(text, start, end=None, page=0):
+    metadata = {"source": "paper.pdf", "page": page, "start_index": start}
+    if end is not None:
+        metadata["end_index"] = end
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_overlapping_chunks_are_dropped_by_their_document_offsets():
+    # The stored text can be shorter than the range it was cut from, e.g. after whitespace cleanup.
+    docs = [chunk("first window " * 2, 0, 100), chunk("second window " * 2, 40, 140), chunk("third window", 140, 200)]
+    packed = ContextPacker().pack("question", docs, "qa")
+    assert [doc.page_content for doc in packed] == [docs[0].page_content, "third window"]
+
+
+def test_chunks_without_an_end_offset_use_their_length():
+    docs = [chunk("a" * 100, 0, page=1), chunk("b" * 100, 40, page=1), chunk("c" * 100, 40, page=2)]
+    packed = ContextPacker().pack("question", docs, "qa")
+    assert [doc.page_content[0] for doc in packed] == ["a", "c"]
@@ -0,0 +1,68 @@
+import numpy as np
+from benchmarks.pipeline_bench import HashEmbeddings
+from embeddings.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self):
+        super().__init__(dim=16, buckets=256)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return super().embed_query(text)
+
+
+def test_cached_texts_skip_the_model(tmp_path):
+    model = CountingEmbeddings()
+    embedder = CachedEmbeddings(model, EmbeddingCache(str(tmp_path / "cache.sqlite")), "m")
+    first = embedder.embed_documents(["alpha beta", "gamma", "alpha beta"])
+    assert model.embedded == ["alpha beta", "gamma"]
+
+    second = embedder.embed_documents(["gamma", "alpha beta", "delta"])
+    assert model.embedded == ["alpha beta", "gamma", "delta"]
+    np.testing.assert_allclose(second[0], first[1], rtol=1e-6)
+    np.testing.assert_allclose(second[1], first[0], rtol=1e-6)
+    assert embedder.cache.stats()["hits"] == 2
+
+
+def test_keys_include_the_model_name(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, cache, "a").embed_documents(["text"])
+    CachedEmbeddings(model, cache, "b").embed_documents(["text"])
+    assert model.embedded == ["text", "text"]
+
+
+def test_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), EmbeddingCache(path), "m").embed_documents(["one", "two"])
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, EmbeddingCache(path), "m").embed_documents(["one", "two"])
+    assert model.embedded == []
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    keys = [EmbeddingCache.key("m", str(i)) for i in range(12)]
+    cache.put_many((key, np.zeros(4)) for key in keys[:10])
+    cache.get_many(keys[:1])  # now the most recently used
+    cache.put_many((key, np.zeros(4)) for key in keys[10:])
+    assert cache.stats()["entries"] <= 10
+    assert keys[0] in cache.get_many([keys[0]])
+    assert keys[1] not in cache.get_many([keys[1]])
+
+
+def test_queries_bypass_the_disk_cache(tmp_path):
+    model = CountingEmbeddings()
+    embedder = CachedEmbeddings(model, EmbeddingCache(str(tmp_path / "cache.sqlite")), "m")
+    embedder.embed_query("what is the f1 score?")
+    embedder.embed_query("what is the f1 score?")
+    vectors = embedder.embed_queries(["which dataset?", "what is the f1 score?"])
+    assert model.embedded == ["what is the f1 score?"] * 2 + ["which dataset?", "what is the f1 score?"]
+    np.testing.assert_allclose(vectors[1], embedder.embed_query("what is the f1 score?"), rtol=1e-6)
+    assert embedder.cache.stats()["entries"] == 0
@@ -0,0 +1,161 @@
+import os
+import shutil
+import threading
+import time
+import pytest
+from benchmarks.pipeline_bench import SyntheticCorpus
+from embeddings.vector_store import VectorStore
+from ingest.jobs import IngestionJobQueue, FINISHED
+from ingest.ledger import IngestionLedger
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    corpus = SyntheticCorpus(seed=1)
+    paths = []
+    for number in range(2):
+        path = str(tmp_path / f"paper{number}.pdf")
+        corpus.write_pdf(number, path)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def queue(tmp_path, embedder, tokenizer):
+    queue = IngestionJobQueue(
+        VectorStore(embedder), IngestionLedger(), path=str(tmp_path / "jobs.sqlite"),
+        spool_dir=str(tmp_path / "spool"), parse_workers=1
+    )
+    yield queue
+    queue.close()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def wait(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job.status in FINISHED:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job still {queue.get(job_id).status}")
+
+
+def test_file_job_is_indexed_under_its_name(queue, pdfs):
+    job_id = queue.submit_file("first.pdf", read(pdfs[0]))
+    job = wait(queue, job_id)
+    assert job.status == "indexed" and job.progress == 1.0
+    assert job.chunks and job.chunks == job.embedded
+    assert queue.vector_store.source_chunks() == {"first.pdf": job.chunks}
+    assert not os.path.exists(job.source)
+    assert queue.ledger.is_indexed(job_id)
+
+    # Submitting the same bytes again returns the finished job.
+    assert queue.submit_file("first.pdf", read(pdfs[0])) == job_id
+    assert queue.get(job_id).updated == job.updated
+    assert len(queue.vector_store) == job.chunks
+
+
+def test_url_job_is_downloaded_and_labelled_with_its_name(queue, pdfs, monkeypatch):
+    import tools.arxiv_tool
+
+    def download_pdfs(urls, save_dir, cache=None):
+        results = []
+        for url in urls:
+            path = os.path.join(save_dir, os.path.basename(url))
+            shutil.copy(pdfs[1], path)
+            results.append((path, None))
+        return results
+
+    monkeypatch.setattr(tools.arxiv_tool, "download_pdfs", download_pdfs)
+    job_id = queue.submit_url("https://arxiv.org/pdf/2401.00001v1", name="2401.00001v1.pdf")
+    job = wait(queue, job_id)
+    assert job.status == "indexed"
+    assert set(queue.vector_store.source_chunks()) == {"2401.00001v1.pdf"}
+
+    # The same content uploaded under another name is already in the ledger.
+    file_job = wait(queue, queue.submit_file("copy.pdf", read(pdfs[1])))
+    assert file_job.status == "skipped"
+
+
+def test_failed_job_stays_failed_until_retried(queue):
+    job_id = queue.submit_file("broken.pdf", b"not a pdf")
+    job = wait(queue, job_id)
+    assert job.status == "failed" and job.error
+    assert os.path.exists(job.source)
+
+    assert queue.submit_file("broken.pdf", b"not a pdf") == job_id
+    assert queue.get(job_id) == job
+
+    assert queue.retry(job_id)
+    retried = wait(queue, job_id)
+    assert retried.status == "failed" and retried.updated > job.updated
+
+    assert queue.submit_file("broken.pdf", b"not a pdf", retry=True) == job_id
+    assert wait(queue, job_id).updated > retried.updated
+
+    queue.clear_finished()
+    assert queue.get(job_id) is None
+    assert not os.path.exists(job.source)
+
+
+def test_cancelled_job_stays_cancelled_until_retried(queue, pdfs):
+    queue.close()  # no workers, so jobs stay queued
+    job_id = queue.submit_file("first.pdf", read(pdfs[0]))
+    url_id = queue.submit_url("https://example.com/paper.pdf")
+    assert [job.id for job in queue.active()] == [job_id, url_id]
+    assert queue.retry(job_id) is False
+
+    assert queue.cancel(job_id) and queue.cancel(url_id)
+    assert queue.cancel(job_id) is False
+    assert queue.submit_file("first.pdf", read(pdfs[0])) == job_id
+    assert queue.submit_url("https://example.com/paper.pdf") == url_id
+    assert queue.active() == []
+
+    assert queue.retry(job_id)
+    assert queue.submit_url("https://example.com/paper.pdf", retry=True) == url_id
+    assert [job.status for job in queue.active()] == ["queued", "queued"]
+
+
+def test_removed_document_stays_removed(queue, pdfs):
+    job_id = queue.submit_file("first.pdf", read(pdfs[0]))
+    chunks = wait(queue, job_id).chunks
+
+    assert queue.remove_document("first.pdf") == chunks
+    assert queue.get(job_id).status == "removed"
+    assert queue.vector_store.source_chunks() == {}
+    assert not queue.ledger.is_indexed(job_id)
+
+    # The uploader still holds the file; resubmitting it does not bring it back.
+    assert queue.submit_file("first.pdf", read(pdfs[0])) == job_id
+    assert queue.get(job_id).status == "removed"
+    assert queue.retry(job_id) is False  # the upload is gone
+
+    assert queue.submit_file("first.pdf", read(pdfs[0]), retry=True) == job_id
+    assert wait(queue, job_id).status == "indexed"
+    assert queue.vector_store.source_chunks() == {"first.pdf": chunks}
+    assert queue.remove_document("missing.pdf") == 0
+
+
+def test_remove_waits_for_the_running_job_only(queue, pdfs, monkeypatch):
+    import ingest.jobs
+    started, release = threading.Event(), threading.Event()
+    ingest_files = ingest.jobs.ingest_files
+
+    def blocked_ingest_files(*args, **kwargs):
+        started.set()
+        release.wait(10)
+        return ingest_files(*args, **kwargs)
+
+    monkeypatch.setattr(ingest.jobs, "ingest_files", blocked_ingest_files)
+    job_id = queue.submit_file("first.pdf", read(pdfs[0]))
+    assert started.wait(10)
+    assert queue.remove_document("first.pdf") is None
+    release.set()
+    # The name is freed together with the finished status, not after the batch.
+    chunks = wait(queue, job_id).chunks
+    assert queue.remove_document("first.pdf") == chunks
@@ -0,0 +1,41 @@
+from ingest.ledger import IngestionLedger, content_hash
+
+
+def test_content_hash_depends_on_settings():
+    assert content_hash(b"pdf") == content_hash(b"pdf")
+    assert content_hash(b"pdf", {"chunk_size": 1}) != content_hash(b"pdf", {"chunk_size": 2})
+
+
+def test_record_get_and_forget():
+    ledger = IngestionLedger()
+    ledger.record("a.pdf", "h1", [0, 1, 2])
+    assert ledger.is_indexed("h1")
+    assert ledger.get("a.pdf") == {"hash": "h1", "ids": [0, 1, 2]}
+    assert ledger.forget("a.pdf") == {"hash": "h1", "ids": [0, 1, 2]}
+    assert not ledger.is_indexed("h1")
+    assert ledger.get("a.pdf") is None
+    assert ledger.forget("a.pdf") is None
+
+
+def test_new_version_replaces_the_old_hash():
+    ledger = IngestionLedger()
+    ledger.record("a.pdf", "h1", [0, 1])
+    ledger.record_many([("a.pdf", "h2", [2, 3]), ("b.pdf", "h3", [4])])
+    assert not ledger.is_indexed("h1")
+    assert ledger.is_indexed("h2") and ledger.is_indexed("h3")
+    assert ledger.get("a.pdf")["ids"] == [2, 3]
+    assert sorted(ledger.names()) == ["a.pdf", "b.pdf"]
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    ledger = IngestionLedger(path)
+    ledger.record("a.pdf", "h1", [5, 6])
+    ledger.record("b.pdf", "h2", [7])
+    ledger.forget("b.pdf")
+
+    reopened = IngestionLedger(path)
+    assert len(reopened) == 1
+    assert reopened.is_indexed("h1") and not reopened.is_indexed("h2")
+    assert reopened.get("a.pdf") == {"hash": "h1", "ids": [5, 6]}
+
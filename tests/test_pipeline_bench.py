@@ -0,0 +1,12 @@
+from benchmarks.pipeline_bench import make_queries
+from embeddings.vector_store import VectorStore
+from conftest import TOPICS, add_documents
+
+
+def test_queries_cover_the_whole_corpus(embedder):
+    store = VectorStore(embedder)
+    add_documents(store, chunks_per_source=2)
+    queries = make_queries(store, 60, seed=1)
+    assert len(queries) == 60
+    sources = {source for query in queries for source in TOPICS if source in query}
+    assert sources == set(TOPICS)
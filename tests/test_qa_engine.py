@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from benchmarks.pipeline_bench import StubLLM
+from embeddings.vector_store import VectorStore
+from agent.answer_cache import AnswerCache
+from agent.qa_engine import QaEngine
+from conftest import add_documents
+
+ERROR_PREFIX = "Error generating answer: "
+
+
+class FailingLLM:
+    def __init__(self, error="API key not valid: bad key"):
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        raise RuntimeError(self.error)
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+    def stream(self, prompt):
+        self.calls += 1
+        raise RuntimeError(self.error)
+        yield
+
+
+@pytest.fixture
+def store(embedder):
+    store = VectorStore(embedder)
+    add_documents(store)
+    return store
+
+
+def test_empty_corpus(embedder):
+    engine = QaEngine(VectorStore(embedder), llm=FailingLLM())
+    assert engine.answer_question("What is the accuracy?").startswith("No documents loaded")
+
+
+@pytest.mark.parametrize("question", ["What is the accuracy?", "Give me a summary", "Compare both documents"])
+def test_llm_errors_become_answers(store, question):
+    engine = QaEngine(store, llm=FailingLLM())
+    assert engine.answer_question(question).startswith(ERROR_PREFIX)
+    assert "".join(engine.answer_question_stream(question)).startswith(ERROR_PREFIX)
+    assert asyncio.run(engine.aanswer_question(question)).startswith(ERROR_PREFIX)
+
+
+def test_map_reduce_summarizes_every_document(store):
+    llm = StubLLM()
+    engine = QaEngine(store, llm=llm)
+    answer = engine.answer_question("Compare both documents")
+    assert "3 document(s) referenced" in answer
+    assert llm.calls == 4  # one map call per document, one reduce call
+    engine.answer_question("Compare all documents")
+    assert llm.calls == 5  # map summaries are cached until a document changes
+
+
+def test_answer_cache_serves_repeated_questions(store):
+    llm = StubLLM()
+    engine = QaEngine(store, llm=llm, answer_cache=AnswerCache())
+    first = engine.answer_question("What is the accuracy?")
+    assert engine.answer_question("What is the accuracy?") == first
+    assert llm.calls == 1
+
+
+def test_batch_reports_errors_per_question(store):
+    engine = QaEngine(store, llm=FailingLLM(), max_concurrency=2)
+    results = engine.answer_batch([
+        {"id": 1, "question": "What is the accuracy?"},
+        {"id": 2, "question": "Compare both documents"},
+        {"id": 3, "question": "What is the accuracy?", "sources": ["beta.pdf"]},
+    ])
+    assert [result["id"] for result in results] == [1, 2, 3]
+    assert all(result["answer"] is None and "bad key" in result["error"] for result in results)
+
+
+def test_batch_answers_and_deduplicates(store):
+    llm = StubLLM()
+    engine = QaEngine(store, llm=llm)
+    results = engine.answer_batch(["What is the accuracy?", "Compare both documents", "What is the accuracy?"])
+    assert all(result["error"] is None for result in results)
+    assert results[0]["answer"] == results[2]["answer"]
+    assert results[1]["intent"] == "multi_doc_summary"
+    assert {ref["source"] for ref in results[1]["references"]} == {"alpha.pdf", "beta.pdf", "gamma.pdf"}
+    assert llm.calls == 5  # one qa answer, three map calls and one reduce
+
+
+def test_batch_questions_stay_out_of_the_embedding_cache(tmp_path, embedder):
+    from embeddings.embedding_cache import CachedEmbeddings, EmbeddingCache
+    cached = CachedEmbeddings(embedder, EmbeddingCache(str(tmp_path / "cache.sqlite")), "m")
+    store = VectorStore(cached)
+    add_documents(store)
+    entries = cached.cache.stats()["entries"]
+    results = QaEngine(store, llm=StubLLM()).answer_batch(["What is the accuracy?", "Which dataset is used?"])
+    assert all(result["error"] is None for result in results)
+    assert cached.cache.stats()["entries"] == entries
+
+
+class ApiError(Exception):
+    """Shaped like google.api_core's GoogleAPICallError: the HTTP status is in `code`."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def test_transient_errors_are_retried(store, monkeypatch):
+    class FlakyLLM(StubLLM):
+        failures = 2
+
+        async def ainvoke(self, prompt):
+            if self.failures:
+                self.failures -= 1
+                raise ApiError(429, "Resource has been exhausted")
+            return self.invoke(prompt)
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr("agent.qa_engine.asyncio.sleep", no_sleep)
+    engine = QaEngine(store, llm=FlakyLLM())
+    assert not asyncio.run(engine.aanswer_question("What is the accuracy?")).startswith(ERROR_PREFIX)
+
+
+def test_only_typed_transient_errors_are_retried(store, monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr("agent.qa_engine.asyncio.sleep", no_sleep)
+    # Status codes or timeout words in the message alone are not transient.
+    llm = FailingLLM("prompt exceeds 500 tokens; timeout settings ignored")
+    assert asyncio.run(QaEngine(store, llm=llm).aanswer_question("What is the accuracy?")).startswith(ERROR_PREFIX)
+    assert llm.calls == 1
+
+    class WrappingLLM(FailingLLM):
+        def invoke(self, prompt):
+            self.calls += 1
+            try:
+                raise ApiError(503, "The service is currently unavailable")
+            except ApiError as e:
+                raise RuntimeError("Error calling the model") from e
+
+    llm = WrappingLLM()
+    assert asyncio.run(QaEngine(store, llm=llm).aanswer_question("What is the accuracy?")).startswith(ERROR_PREFIX)
+    assert llm.calls == 5
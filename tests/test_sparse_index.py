@@ -0,0 +1,111 @@
+import math
+import random
+import numpy as np
+import pytest
+from embeddings.sparse_index import SparseIndex, tokenize
+
+
+def brute_force(documents, query, k, k1=1.2, b=0.75, skip=()):
+    """Reference BM25 over the documents not in `skip`."""
+    live = {doc_id: tokenize(text) for doc_id, text in documents.items() if doc_id not in skip and tokenize(text)}
+    average_length = sum(len(tokens) for tokens in live.values()) / len(live)
+    scores = {}
+    for term in set(tokenize(query)):
+        containing = [doc_id for doc_id, tokens in live.items() if term in tokens]
+        idf = math.log(1 + (len(live) - len(containing) + 0.5) / (len(containing) + 0.5))
+        for doc_id in containing:
+            tf = live[doc_id].count(term)
+            norm = k1 * (1 - b + b * len(live[doc_id]) / average_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(3)
+    vocabulary = [f"w{i}" for i in range(300)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    return {i: " ".join(rng.choices(vocabulary, weights, k=rng.randint(5, 60))) for i in range(2000)}
+
+
+def queries():
+    rng = random.Random(4)
+    vocabulary = [f"w{i}" for i in range(300)]
+    return [" ".join(rng.choices(vocabulary, k=rng.randint(1, 6))) for _ in range(50)]
+
+
+def assert_matches(hits, expected):
+    """Same scores in order and the same documents, up to the order of ties and the ties at the cut."""
+    np.testing.assert_allclose([score for score, _ in hits], [score for _, score in expected], rtol=1e-5)
+    cut = expected[-1][1] * (1 + 1e-5) if expected else 0
+    assert {doc_id for score, doc_id in hits if score > cut} == {doc_id for doc_id, score in expected if score > cut}
+
+
+def build(corpus):
+    index = SparseIndex()
+    for doc_id, text in corpus.items():
+        index.add(doc_id, text)
+    return index
+
+
+def test_pruned_search_is_exact(corpus):
+    index = build(corpus)
+    for query in queries():
+        assert_matches(index.search(query, k=10), brute_force(corpus, query, 10))
+
+
+def test_filters(corpus):
+    index = build(corpus)
+    allowed = np.arange(0, 2000, 3)
+    excluded = np.arange(0, 2000, 2)
+    for query in queries()[:10]:
+        hits = index.search(query, k=20, allowed=allowed, excluded=excluded)
+        assert hits and all(doc_id % 3 == 0 and doc_id % 2 for _, doc_id in hits)
+        scores = dict((doc_id, score) for score, doc_id in index.search(query, k=2000))
+        expected = sorted(((d, s) for d, s in scores.items() if d % 3 == 0 and d % 2), key=lambda item: -item[1])
+        assert_matches(hits, expected[:20])
+
+
+def test_removed_documents_leave_the_statistics(corpus):
+    index = build(corpus)
+    removed = list(range(0, 2000, 5))
+    index.remove(removed)
+    for query in queries()[:20]:
+        assert_matches(index.search(query, k=10), brute_force(corpus, query, 10, skip=set(removed)))
+
+
+def test_removal_planned_before_appends(corpus):
+    index = build(corpus)
+    removed = list(range(0, 2000, 7))
+    plan = index.plan_removal(removed, [corpus[doc_id] for doc_id in removed])
+    corpus = dict(corpus)
+    for doc_id in range(2000, 2050):
+        corpus[doc_id] = corpus[doc_id - 2000]
+        index.add(doc_id, corpus[doc_id])
+    index.apply_removal(plan)
+    assert not index.indexed(removed).any()
+    assert index.indexed(range(2000, 2050)).all()
+    for query in queries()[:20]:
+        assert_matches(index.search(query, k=10), brute_force(corpus, query, 10, skip=set(removed)))
+
+
+def test_appends_after_a_search_update_the_bounds(corpus):
+    index = build(corpus)
+    query = "w250 w3"
+    index.search(query, k=5)
+    corpus = dict(corpus)
+    corpus[2000] = "w250 " * 20
+    index.add(2000, corpus[2000])
+    assert index.search(query, k=1)[0][1] == 2000
+    assert_matches(index.search(query, k=5), brute_force(corpus, query, 5))
+
+
+def test_save_and_load(tmp_path, corpus):
+    index = build(corpus)
+    index.remove([1, 2, 3])
+    path = str(tmp_path / "sparse.npz")
+    index.save(path)
+    loaded = SparseIndex.load(path)
+    assert len(loaded) == len(index)
+    for query in queries()[:10]:
+        assert loaded.search(query, k=10) == index.search(query, k=10)
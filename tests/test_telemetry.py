@@ -0,0 +1,42 @@
+import pytest
+import telemetry
+
+
+def test_spans_nest_and_are_captured():
+    with telemetry.capture() as spans:
+        with telemetry.span("outer", k=5) as outer:
+            with telemetry.span("inner"):
+                pass
+            outer.set(hits=3)
+    assert [span.name for _, span in spans[0].flatten()] == ["outer", "inner"]
+    assert spans[0].attributes == {"k": 5, "hits": 3}
+    assert spans[0].seconds >= spans[0].children[0].seconds
+
+
+def test_errors_are_recorded_on_the_span():
+    with telemetry.capture() as spans:
+        with pytest.raises(ValueError):
+            with telemetry.span("failing"):
+                raise ValueError("bad")
+    assert spans[0].attributes["error"] == "ValueError"
+
+
+def test_prometheus_text():
+    telemetry.count("test.lookups", 2, result="hit")
+    telemetry.observe("test.batch_size", 7)
+    text = telemetry.render_prometheus()
+    assert 'doc_agent_test_lookups_total{result="hit"} ' in text
+    assert telemetry.counter_value("test.lookups", result="hit") >= 2
+    assert 'doc_agent_test_batch_size_bucket{le="10"} ' in text
+    assert "doc_agent_test_batch_size_count 1" in text
+
+
+def test_log_file(tmp_path):
+    log = tmp_path / "spans.jsonl"
+    telemetry.configure(log_path=str(log))
+    try:
+        with telemetry.span("logged"):
+            pass
+    finally:
+        telemetry.configure()
+    assert '"name": "logged"' in log.read_text()
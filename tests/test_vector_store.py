@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from embeddings.vector_store import VectorStore
+from conftest import TOPICS, add_documents
+
+QUERY = "transformer attention accuracy"
+
+
+def sources_found(store, query=QUERY, k=20):
+    dense = {doc.metadata["source"] for doc in store.similarity_search(query, k=k)}
+    hybrid = {doc.metadata["source"] for doc in store.hybrid_search(query, k=k)}
+    return dense, hybrid
+
+
+def wait_for_rebuild(store):
+    if store._rebuild_thread is not None:
+        store._rebuild_thread.join()
+
+
+def test_add_and_delete_in_memory(embedder):
+    store = VectorStore(embedder)
+    ids = add_documents(store)
+    assert len(store) == 18
+    assert store.source_chunks() == {source: 6 for source in TOPICS}
+    assert store.similarity_search(QUERY, k=1)[0].metadata["source"] == "alpha.pdf"
+
+    version = store.version
+    assert store.delete_source("alpha.pdf") == 6
+    assert store.version > version
+    assert store.delete_source("alpha.pdf") == 0
+    assert store.delete(ids["alpha.pdf"] + ids["beta.pdf"][:2]) == 2
+    assert len(store) == 10
+    assert store.source_chunks() == {"beta.pdf": 4, "gamma.pdf": 6}
+    dense, hybrid = sources_found(store)
+    assert "alpha.pdf" not in dense | hybrid
+    assert not store.similarity_search(QUERY, sources=["alpha.pdf"])
+
+
+def test_replace_ids_swap_a_document_in_one_write(embedder):
+    store = VectorStore(embedder)
+    ids = add_documents(store)
+    new_ids = add_documents(store, chunks_per_source=2, sources={"alpha.pdf": TOPICS["alpha.pdf"]})
+    assert store.source_chunks()["alpha.pdf"] == 8
+
+    texts = [f"{TOPICS['alpha.pdf']} revised {i}" for i in range(3)]
+    vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+    replaced = store.add_embeddings(texts, vectors, [{"source": "alpha.pdf", "page": i} for i in range(3)],
+                                    replace_ids=ids["alpha.pdf"] + new_ids["alpha.pdf"])
+    assert store.source_chunks()["alpha.pdf"] == 3
+    hits = store.similarity_search_with_score(QUERY, k=20, sources=["alpha.pdf"])
+    assert sorted(doc.page_content for doc, _ in hits) == sorted(texts)
+    assert replaced == list(range(20, 23))
+
+
+def test_persisted_store_reloads(tmp_path, embedder):
+    index_dir = str(tmp_path / "index")
+    store = VectorStore(embedder, index_dir=index_dir, compact_ratio=1.0)
+    ids = add_documents(store)
+    store.checkpoint()
+    add_documents(store, chunks_per_source=2, sources={"delta.pdf": "late arrival appended after the snapshot"})
+    assert store.delete(ids["alpha.pdf"][:3]) == 3
+    assert store.tombstone_ratio() == pytest.approx(3 / 18)
+
+    reopened = VectorStore(embedder, index_dir=index_dir, compact_ratio=1.0)
+    assert len(reopened) == len(store) == 17
+    assert reopened.source_chunks() == store.source_chunks()
+    assert reopened.tombstone_ratio() == store.tombstone_ratio()
+    hits = reopened.hybrid_search(QUERY, k=20, sources=["alpha.pdf"])
+    assert {doc.metadata["page"] for doc in hits} == {3, 4, 5}
+    # The keyword snapshot still holds the deleted rows; they stay filtered out.
+    assert sorted(reopened._sparse_dead.tolist()) == ids["alpha.pdf"][:3]
+    hits = reopened.hybrid_search("alpha.pdf section 0 page 0", k=30)
+    assert {doc.metadata["page"] for doc in hits if doc.metadata["source"] == "alpha.pdf"} == {3, 4, 5}
+
+    read_only = VectorStore(embedder, index_dir=index_dir, read_only=True)
+    assert read_only.source_chunks() == store.source_chunks()
+    with pytest.raises(RuntimeError):
+        read_only.delete_source("beta.pdf")
+    with pytest.raises(RuntimeError):
+        add_documents(read_only)
+
+
+def test_compaction_drops_deleted_rows(tmp_path, embedder):
+    index_dir = str(tmp_path / "index")
+    store = VectorStore(embedder, index_dir=index_dir, compact_ratio=0.2)
+    ids = add_documents(store)
+    store.checkpoint()
+    assert store._base.ntotal == 18
+
+    assert store.delete(ids["alpha.pdf"][:2]) == 2  # below the ratio
+    assert store.tombstone_ratio() == pytest.approx(2 / 18)
+    assert store.delete_source("alpha.pdf") == 4  # above it: rebuilt in the background
+    wait_for_rebuild(store)
+    assert store.tombstone_ratio() == 0.0
+    assert store._base.ntotal == len(store) == 12
+    assert not store._sparse.indexed(ids["alpha.pdf"]).any()
+    assert not len(store._sparse_dead)
+    dense, hybrid = sources_found(store)
+    assert "alpha.pdf" not in dense | hybrid
+
+    reopened = VectorStore(embedder, index_dir=index_dir)
+    assert len(reopened) == 12 and reopened.tombstone_ratio() == 0.0
+    assert not len(reopened._sparse_dead)
+    assert reopened.source_chunks() == {"beta.pdf": 6, "gamma.pdf": 6}
+
+    # Rows deleted after a compaction are still filtered out of the new snapshot.
+    assert reopened.delete(ids["beta.pdf"][:1]) == 1
+    assert reopened.tombstone_ratio() == pytest.approx(1 / 12)
+    reopened = VectorStore(embedder, index_dir=index_dir)
+    assert reopened.source_chunks() == {"beta.pdf": 5, "gamma.pdf": 6}
+    assert len(reopened) == 11
+
+
+def test_writes_during_a_rebuild_are_kept(tmp_path, embedder, monkeypatch):
+    import embeddings.vector_store
+    store = VectorStore(embedder, index_dir=str(tmp_path / "index"), compact_ratio=1.0)
+    ids = add_documents(store)
+    store.checkpoint()
+    store.delete_source("alpha.pdf")
+    build_index = embeddings.vector_store.build_index
+
+    def build_while_writing(*args, **kwargs):
+        store.delete(ids["beta.pdf"][:1])
+        add_documents(store, chunks_per_source=2, sources={"delta.pdf": "late arrival during the rebuild"})
+        return build_index(*args, **kwargs)
+
+    monkeypatch.setattr(embeddings.vector_store, "build_index", build_while_writing)
+    store.checkpoint()
+    assert store._base.ntotal == 12 and store._delta.ntotal == 2
+    assert store.tombstone_ratio() == pytest.approx(1 / 12)
+    assert store._sparse_dead.tolist() == ids["beta.pdf"][:1]
+    assert not store._sparse.indexed(ids["alpha.pdf"]).any()
+    assert store._sparse.indexed([18, 19]).all()
+    assert store.source_chunks() == {"beta.pdf": 5, "gamma.pdf": 6, "delta.pdf": 2}
+    hits = store.hybrid_search("beta.pdf section 0 page 0", k=30)
+    assert 0 not in {doc.metadata["page"] for doc in hits if doc.metadata["source"] == "beta.pdf"}
+
+
+def test_overviews_of_loaded_documents_are_picked_on_first_use(tmp_path, embedder):
+    from embeddings.vector_store import OVERVIEW_CHUNKS, OVERVIEW_QUERY
+    index_dir = str(tmp_path / "index")
+    store = VectorStore(embedder, index_dir=index_dir)
+    add_documents(store)
+    expected = {source: [doc.page_content for doc in docs] for source, docs in store.overview_chunks().items()}
+    assert set(expected) == set(TOPICS)
+    assert all(len(texts) == OVERVIEW_CHUNKS for texts in expected.values())
+
+    reopened = VectorStore(embedder, index_dir=index_dir)
+    assert not reopened._overviews
+    searched = reopened.similarity_search_by_source(OVERVIEW_QUERY, OVERVIEW_CHUNKS)
+    assert {source: [doc.page_content for doc in docs] for source, docs in searched.items()} == expected
+    overviews = reopened.overview_chunks(sources=["beta.pdf", "missing.pdf"])
+    assert [doc.page_content for doc in overviews["beta.pdf"]] == expected["beta.pdf"]
+    assert set(reopened._overviews) == {"beta.pdf"}
+    assert {source: len(docs) for source, docs in reopened.overview_chunks(k_per_doc=2).items()} == \
+        {source: 2 for source in TOPICS}
+
+
+def test_page_filter_matches_chunks_spanning_the_range(embedder):
+    store = VectorStore(embedder)
+    texts = [f"{TOPICS['alpha.pdf']} chunk {i}" for i in range(4)]
+    metadatas = [{"source": "alpha.pdf", "page": 0, "page_end": 0}, {"source": "alpha.pdf", "page": 1, "page_end": 3},
+                 {"source": "alpha.pdf", "page": 4}, {"source": "alpha.pdf"}]
+    store.add_embeddings(texts, np.asarray(embedder.embed_documents(texts), dtype=np.float32), metadatas)
+
+    def pages_found(first, last):
+        return sorted(doc.page_content[-1] for doc in store.similarity_search(QUERY, k=10, pages=(first, last)))
+
+    assert pages_found(2, 2) == ["1"]  # starts before the range, ends inside it
+    assert pages_found(0, 1) == ["0", "1"]
+    assert pages_found(3, 4) == ["1", "2"]
+    assert pages_found(5, 9) == []
@@ -1,151 +1,491 @@
-import arxiv
-import requests
-import os
-import tempfile
-import time
-from typing import List, Optional, Tuple
-import re
-
-def download_pdf_from_url(pdf_url: str, save_dir=None, timeout=30) -> Tuple[Optional[str], Optional[str]]:
-    """Download PDF directly from any URL (ArXiv or other)."""
-    try:
-        if save_dir is None:
-            save_dir = tempfile.gettempdir()
-        
-        filename = pdf_url.split('/')[-1]
-        if not filename.endswith('.pdf'):
-            arxiv_match = re.search(r'(\d{4}\.\d{4,5})', pdf_url)
-            if arxiv_match:
-                filename = f"{arxiv_match.group(1)}.pdf"
-            else:
-                filename = "downloaded_paper.pdf"
-        
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(pdf_url, timeout=timeout, stream=True)
-                response.raise_for_status()
-                break
-            except requests.RequestException as e:
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(2 ** attempt)
-        
-        filepath = os.path.join(save_dir, filename)
-        
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        
-        return filepath, None
-        
-    except requests.Timeout:
-        return None, "Download timed out. Check your internet connection."
-    except requests.RequestException as e:
-        return None, f"Download failed: {str(e)}"
-    except OSError as e:
-        return None, f"Failed to save file: {str(e)}"
-    except Exception as e:
-        return None, f"Unexpected error: {str(e)}"
-
-def search_arxiv(query, max_results=5, retry_delay=3) -> Tuple[Optional[List], Optional[str]]:
-    """Search ArXiv for papers and return metadata with aggressive rate limit protection."""
-    try:
-        client = arxiv.Client(
-            page_size=3,
-            delay_seconds=10.0,
-            num_retries=0
-        )
-        
-        search = arxiv.Search(
-            query=query,
-            max_results=min(max_results, 3),
-            sort_by=arxiv.SortCriterion.Relevance
-        )
-        
-        time.sleep(3)
-        
-        results = list(client.results(search))
-        
-        if not results:
-            return None, "No papers found matching your query. Try different keywords."
-        
-        return results, None
-        
-    except arxiv.HTTPError as e:
-        error_str = str(e)
-        if '429' in error_str or 'Too Many Requests' in error_str:
-            return None, (
-                "**ArXiv Rate Limit Hit**\n\n"
-                "ArXiv's API is very strict about rate limits. Your IP has been temporarily blocked.\n\n"
-                "**What happened:**\n"
-                "Multiple searches in a short time triggered ArXiv's protection.\n\n"
-                "**Solutions:**\n"
-                "1. **Wait 10-15 minutes** before trying again\n"
-                "2. **Use 'Add PDF by URL'** below instead (bypasses ArXiv search)\n"
-                "3. **Upload PDFs directly** from your computer\n"
-                "4. Search Google Scholar/ArXiv website, then use method #2\n\n"
-                "**Prevention:**\n"
-                "- Wait at least 15 seconds between searches\n"
-                "- Use specific queries to get results on first try\n\n"
-                f"_Error details: {error_str}_"
-            )
-        else:
-            return None, f"ArXiv API error: {error_str}. Please try again later."
-    
-    except Exception as e:
-        return None, f"Search failed: {str(e)}. Please check your internet connection."
-
-def download_pdf(result, save_dir=None, timeout=30) -> Tuple[Optional[str], Optional[str]]:
-    """
-    Download the PDF of an ArXiv result.
-    
-    Args:
-        result: ArXiv result object
-        save_dir: Directory to save PDF (default: temp directory)
-        timeout: Download timeout in seconds
-    
-    Returns:
-        Tuple of (filepath, error_message)
-        - On success: (filepath, None)
-        - On error: (None, error_message)
-    """
-    try:
-        if save_dir is None:
-            save_dir = tempfile.gettempdir()
-        
-        pdf_url = result.pdf_url
-        
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(pdf_url, timeout=timeout, stream=True)
-                response.raise_for_status()
-                break
-            except requests.RequestException as e:
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(2 ** attempt)
-        
-        filename = f"{result.get_short_id()}.pdf"
-        filepath = os.path.join(save_dir, filename)
-        
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        
-        return filepath, None
-        
-    except requests.Timeout:
-        return None, "Download timed out. The paper might be too large or network is slow."
-    
-    except requests.RequestException as e:
-        return None, f"Download failed: {str(e)}. Please try again."
-    
-    except OSError as e:
-        return None, f"Failed to save file: {str(e)}. Check disk space and permissions."
-    
-    except Exception as e:
-        return None, f"Unexpected error during download: {str(e)}"
\ No newline at end of file
+import requests
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from telemetry import span
+import re
+
+MAX_RESULTS = 10
+DOWNLOAD_WORKERS = 4
+MAX_RETRIES = 3
+CHUNK_BYTES = 64 * 1024
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter: `rate` requests per second on
+    average, with bursts of up to `capacity`. One bucket per remote service is
+    shared by every session in the process.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def back_off(self, seconds):
+        """Hold every caller for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def set_interval(self, seconds):
+        """One request per `seconds` on average."""
+        with self._lock:
+            self._refill()
+            self.rate = 1.0 / seconds
+
+
+# arXiv asks API clients for at most one request every 3 seconds; PDF
+# downloads come from a different host with a looser limit.
+API_LIMITER = TokenBucket(rate=1 / 3)
+DOWNLOAD_LIMITER = TokenBucket(rate=4, capacity=DOWNLOAD_WORKERS)
+
+_session = None
+_client = None
+_session_lock = threading.Lock()
+_search_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide requests.Session, so downloads reuse pooled keep-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_WORKERS * 2)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _retry_after(response, default=30.0):
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except ValueError:
+        return default
+
+
+@dataclass
+class Paper:
+    """The fields of an ArXiv search result the app uses; cached as JSON."""
+    short_id: str
+    title: str
+    published: datetime
+    pdf_url: str
+    summary: str = ""
+    authors: List[str] = field(default_factory=list)
+
+    def get_short_id(self):
+        return self.short_id
+
+    @classmethod
+    def from_result(cls, result):
+        return cls(
+            short_id=result.get_short_id(),
+            title=result.title,
+            published=result.published,
+            pdf_url=result.pdf_url,
+            summary=result.summary,
+            authors=[author.name for author in result.authors]
+        )
+
+    def to_dict(self):
+        return {**self.__dict__, "published": self.published.isoformat()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{**data, "published": datetime.fromisoformat(data["published"])})
+
+
+class FetchCache:
+    """
+    Local cache of downloaded PDFs and ArXiv search responses.
+
+    PDFs are stored once per content hash under `blobs/`; a SQLite table maps
+    each URL to its blob and the HTTP validators (ETag, Last-Modified) it came
+    with. Within `fresh_seconds` a cached URL is served without any request,
+    after that with a conditional one, so unchanged papers are not re-fetched.
+    Interrupted downloads stay under `partial/` and resume with a Range request.
+    Once the blobs exceed `max_bytes` the least recently used tenth is evicted.
+    Search responses are kept for `search_ttl` seconds.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, fresh_seconds=86400, search_ttl=86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.search_ttl = search_ttl
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "partial"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "cache.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "url TEXT PRIMARY KEY, digest TEXT NOT NULL, etag TEXT, last_modified TEXT, checked REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, body TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, "blobs", f"{digest}.pdf")
+
+    def partial_path(self, url):
+        return os.path.join(self.directory, "partial", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def lookup(self, url):
+        """Cached entry of a URL as a dict with its blob path, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, etag, last_modified, checked FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not os.path.exists(self._blob_path(row[0])):
+            return None
+        digest, etag, last_modified, checked = row
+        return {"path": self._blob_path(digest), "digest": digest, "etag": etag,
+                "last_modified": last_modified, "checked": checked}
+
+    def touch(self, url, revalidated=False):
+        """Mark a URL's blob as used, and as just revalidated with the server."""
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._conn.execute("UPDATE urls SET checked = ? WHERE url = ?", (now, url))
+            self._conn.execute(
+                "UPDATE blobs SET last_used = ? WHERE digest = (SELECT digest FROM urls WHERE url = ?)", (now, url)
+            )
+            self._conn.commit()
+
+    def store(self, url, path, etag=None, last_modified=None):
+        """Move a finished download into the cache. Returns the blob path."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        blob_path = self._blob_path(digest)
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            os.replace(path, blob_path)
+            before = self._conn.total_changes
+            self._conn.execute("INSERT OR IGNORE INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                               (digest, size, now))
+            if self._conn.total_changes > before:
+                self._size += size
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, digest, etag, last_modified, checked) VALUES (?, ?, ?, ?, ?)",
+                (url, digest, etag, last_modified, now)
+            )
+            self._evict(keep=digest)
+            self._conn.commit()
+        return blob_path
+
+    def _evict(self, keep):
+        if self._size <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT digest, size FROM blobs ORDER BY last_used").fetchall()
+        for digest, size in rows:
+            if self._size <= target:
+                break
+            if digest == keep:
+                continue
+            self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+            if os.path.exists(self._blob_path(digest)):
+                os.remove(self._blob_path(digest))
+            self._size -= size
+
+    def get_search(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT body, created FROM searches WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.search_ttl:
+            return None
+        return json.loads(row[0])
+
+    def put_search(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (key, body, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            self._conn.execute("DELETE FROM searches WHERE created < ?", (time.time() - self.search_ttl,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return {"urls": urls, "bytes": self._size}
+
+
+_caches = {}
+
+
+def get_fetch_cache(directory, max_bytes=2 * 1024 ** 3):
+    """Return the FetchCache of a directory, opened once per process."""
+    with _session_lock:
+        if directory not in _caches:
+            _caches[directory] = FetchCache(directory, max_bytes=max_bytes)
+        return _caches[directory]
+
+
+def _filename_for(pdf_url):
+    """
+    Local file name for a URL: a readable stem (the URL's file name, or its
+    arXiv id with the version) plus a hash of the whole URL, so two URLs, such
+    as two versions of one paper, never share a file or its .part download.
+    """
+    stem = pdf_url.split('?')[0].rstrip('/').split('/')[-1]
+    if stem.endswith('.pdf'):
+        stem = stem[:-len('.pdf')]
+    arxiv_match = re.search(r'(\d{4}\.\d{4,5}(v\d+)?)', pdf_url)
+    if arxiv_match:
+        stem = arxiv_match.group(1)
+    stem = re.sub(r'[^\w.\-]', '_', stem)[:80] or "paper"
+    digest = hashlib.sha256(pdf_url.encode("utf-8")).hexdigest()[:12]
+    return f"{stem}-{digest}.pdf"
+
+
+def _fetch(pdf_url, filepath, timeout, cache, fetch_span):
+    """
+    Download a PDF, resuming a partial download with Range/If-Range and
+    revalidating a cached copy with If-None-Match/If-Modified-Since.
+    Returns the path of the PDF: the cache blob with a cache, else `filepath`.
+    How the PDF was obtained is recorded on `fetch_span`.
+    """
+    entry = cache.lookup(pdf_url) if cache else None
+    if entry and time.time() - entry["checked"] < cache.fresh_seconds:
+        cache.touch(pdf_url)
+        fetch_span.set(outcome="cached")
+        return entry["path"]
+
+    part_path = cache.partial_path(pdf_url) if cache else f"{filepath}.part"
+    validator_path = f"{part_path}.validator"
+    session = get_session()
+    for attempt in range(MAX_RETRIES):
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and os.path.exists(validator_path):
+            with open(validator_path, "r", encoding="utf-8") as f:
+                headers["If-Range"] = f.read()
+            headers["Range"] = f"bytes={offset}-"
+
+        DOWNLOAD_LIMITER.acquire()
+        try:
+            with session.get(pdf_url, headers=headers, timeout=timeout, stream=True) as response:
+                if response.status_code == 304 and entry:
+                    cache.touch(pdf_url, revalidated=True)
+                    fetch_span.set(outcome="revalidated")
+                    return entry["path"]
+                if response.status_code == 429:
+                    DOWNLOAD_LIMITER.back_off(_retry_after(response))
+                if response.status_code == 416:
+                    # The partial file is not a prefix of the current PDF; start over.
+                    os.remove(part_path)
+                response.raise_for_status()
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                resumed = response.status_code == 206
+                if not resumed:
+                    # Weak ETags cannot be used with If-Range.
+                    validator = etag if etag and not etag.startswith("W/") else last_modified
+                    if validator:
+                        with open(validator_path, "w", encoding="utf-8") as f:
+                            f.write(validator)
+                    elif os.path.exists(validator_path):
+                        os.remove(validator_path)
+                received = 0
+                with open(part_path, "ab" if resumed else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+                        if chunk:
+                            f.write(chunk)
+                            received += len(chunk)
+                fetch_span.set(outcome="downloaded", resumed=resumed, bytes=received, attempts=attempt + 1)
+            break
+        except requests.RequestException:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+    with open(part_path, "rb") as f:
+        if f.read(5) != b"%PDF-":
+            os.remove(part_path)
+            raise ValueError("The URL did not return a PDF")
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    if cache:
+        return cache.store(pdf_url, part_path, etag, last_modified)
+    os.replace(part_path, filepath)
+    return filepath
+
+
+def download_pdf_from_url(pdf_url: str, save_dir=None, timeout=30, cache=None,
+                          filename=None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Download PDF directly from any URL (ArXiv or other).
+    With a FetchCache the returned path is the cached copy, which the caller must not delete.
+    """
+    try:
+        if save_dir is None:
+            save_dir = tempfile.gettempdir()
+        filepath = os.path.join(save_dir, filename or _filename_for(pdf_url))
+        with span("arxiv.download", url=pdf_url) as fetch_span:
+            return _fetch(pdf_url, filepath, timeout, cache, fetch_span), None
+
+    except requests.Timeout:
+        return None, "Download timed out. Check your internet connection."
+    except requests.RequestException as e:
+        return None, f"Download failed: {str(e)}"
+    except OSError as e:
+        return None, f"Failed to save file: {str(e)}"
+    except Exception as e:
+        return None, f"Unexpected error: {str(e)}"
+
+
+def download_pdfs(pdf_urls, save_dir=None, timeout=30, cache=None,
+                  max_workers=DOWNLOAD_WORKERS) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Download several PDFs concurrently over the shared session, still paced by
+    DOWNLOAD_LIMITER. Returns one (filepath, error_message) pair per URL, in order.
+    """
+    if not pdf_urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pdf_urls))) as pool:
+        return list(pool.map(
+            lambda url: download_pdf_from_url(url, save_dir=save_dir, timeout=timeout, cache=cache),
+            pdf_urls
+        ))
+
+
+def search_arxiv(query, max_results=MAX_RESULTS, cache=None) -> Tuple[Optional[List[Paper]], Optional[str]]:
+    """
+    Search ArXiv for papers and return their metadata as Paper objects.
+    Requests are paced by the process-wide API_LIMITER instead of fixed sleeps;
+    with a FetchCache, repeated searches are answered locally.
+    """
+    import arxiv  # only needed for searches; imported on first use to keep app startup fast
+    key = hashlib.sha256(json.dumps([query, max_results]).encode("utf-8")).hexdigest()
+    global _client
+    try:
+        with span("arxiv.search", max_results=max_results) as search_span:
+            cached = cache.get_search(key) if cache else None
+            search_span.set(cached=cached is not None)
+            if cached is not None:
+                results = [Paper.from_dict(data) for data in cached]
+            else:
+                search = arxiv.Search(
+                    query=query,
+                    max_results=max_results,
+                    sort_by=arxiv.SortCriterion.Relevance
+                )
+
+                with _search_lock:
+                    if _client is None:
+                        _client = arxiv.Client(num_retries=0)
+                    # One request for the whole result list when it fits in a page.
+                    _client.page_size = min(max_results, 100)
+                    _client.delay_seconds = 1 / API_LIMITER.rate
+                    API_LIMITER.acquire()
+                    results = [Paper.from_result(result) for result in _client.results(search)]
+
+                if cache:
+                    cache.put_search(key, [paper.to_dict() for paper in results])
+            search_span.set(results=len(results))
+
+        if not results:
+            return None, "No papers found matching your query. Try different keywords."
+
+        return results, None
+
+    except arxiv.HTTPError as e:
+        error_str = str(e)
+        if '429' in error_str or 'Too Many Requests' in error_str:
+            API_LIMITER.back_off(60)
+            return None, (
+                "**ArXiv Rate Limit Hit**\n\n"
+                "ArXiv's API is very strict about rate limits. Your IP has been temporarily blocked.\n\n"
+                "**What happened:**\n"
+                "Multiple searches in a short time triggered ArXiv's protection.\n\n"
+                "**Solutions:**\n"
+                "1. **Wait 10-15 minutes** before trying again\n"
+                "2. **Use 'Add PDF by URL'** below instead (bypasses ArXiv search)\n"
+                "3. **Upload PDFs directly** from your computer\n"
+                "4. Search Google Scholar/ArXiv website, then use method #2\n\n"
+                "**Prevention:**\n"
+                "- Repeated searches are answered from the local cache\n"
+                "- Use specific queries to get results on first try\n\n"
+                f"_Error details: {error_str}_"
+            )
+        else:
+            return None, f"ArXiv API error: {error_str}. Please try again later."
+
+    except Exception as e:
+        return None, f"Search failed: {str(e)}. Please check your internet connection."
+
+
+def download_pdf(result, save_dir=None, timeout=30, cache=None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Download the PDF of an ArXiv result.
+
+    Args:
+        result: ArXiv result object or Paper
+        save_dir: Directory to save PDF (default: temp directory)
+        timeout: Download timeout in seconds
+        cache: Optional FetchCache; the PDF is then served from / kept in the cache
+
+    Returns:
+        Tuple of (filepath, error_message)
+        - On success: (filepath, None)
+        - On error: (None, error_message)
+    """
+    path, error = download_pdf_from_url(
+        result.pdf_url, save_dir=save_dir, timeout=timeout, cache=cache,
+        filename=f"{result.get_short_id()}.pdf"
+    )
+    if error and error.startswith("Download timed out"):
+        error = "Download timed out. The paper might be too large or network is slow."
+    return path, error